@@ -0,0 +1,61 @@
+# api.py
+# --------------------------------------------
+# Punto de entrada del servicio HTTP local de verificación
+# --------------------------------------------
+# Uso:
+#   python api.py                           # 127.0.0.1:API_PORT
+#   python api.py --host 0.0.0.0 --port 9000 --device torno-1
+#
+# Endpoints y formato: ver core/http_api.py. Termina limpiamente con
+# SIGTERM (systemd, supervisord...).
+
+import argparse
+import signal
+import threading
+
+from config import API_HOST, API_PORT, API_TOKEN, DEVICE_NAME
+from core import (
+    ensure_schema,
+    iniciar_event_writer,
+    detener_event_writer,
+    cerrar_conexiones,
+)
+from core.http_api import AccessAPI, crear_servidor
+
+
+def parse_args():
+    """Argumentos de línea de comandos"""
+    parser = argparse.ArgumentParser(description="API HTTP local de verificación")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--device", default=DEVICE_NAME, help="Nombre del dispositivo en los eventos")
+    return parser.parse_args()
+
+
+def main():
+    """Función principal"""
+    args = parse_args()
+    ensure_schema()
+    iniciar_event_writer()
+
+    servidor = crear_servidor(AccessAPI(device=args.device), host=args.host, port=args.port)
+    # shutdown() espera a serve_forever(): se llama desde otro hilo
+    signal.signal(signal.SIGTERM,
+                  lambda signum, frame: threading.Thread(target=servidor.shutdown).start())
+    host, port = servidor.server_address[:2]
+    print(f"API escuchando en http://{host}:{port}")
+    if not API_TOKEN:
+        print("⚠️  Sin API_TOKEN: solo /salud responde (el resto devuelve 403)")
+
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        detener_event_writer()
+        cerrar_conexiones()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+# benchmarks/__init__.py
+# --------------------------------------------
+# Benchmarks de rendimiento del sistema
+# --------------------------------------------
+# Se ejecutan como módulos, p.ej.:
+#   python -m benchmarks.multi_door
+#   python -m benchmarks.scale
+#   python -m benchmarks.replay sesiones.json
@@ -0,0 +1,208 @@
+# benchmarks/api_load.py
+# --------------------------------------------
+# Prueba de carga de la API HTTP local
+# --------------------------------------------
+# Lanza N clientes concurrentes (conexiones persistentes) que envían un
+# JPEG a POST /verificar y mide latencia p50/p99 y peticiones por segundo
+# para cada nivel de concurrencia.
+#
+#   python -m benchmarks.api_load                         # servidor propio, modelo simulado
+#   python -m benchmarks.api_load --clientes 1 8 64 --duracion 20
+#   python -m benchmarks.api_load --sin-lotes             # lote máximo 1 (comparación)
+#   python -m benchmarks.api_load --imagen cara.jpg       # modelo real con una foto
+#   python -m benchmarks.api_load --url http://127.0.0.1:8765 --imagen cara.jpg
+#
+# Sin --imagen el modelo se sustituye por uno simulado cuya latencia por
+# llamada es --latencia-base + --latencia-imagen * tamaño del lote, como
+# una red que aprovecha el lote.
+
+import argparse
+import http.client
+import json
+import os
+import secrets
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+import config
+
+from benchmarks.multi_door import EMBEDDING_DIM, poblar_bd
+
+
+def percentil(valores, p):
+    """Percentil p (0-100) de una lista ya ordenada"""
+    if not valores:
+        return 0.0
+    k = min(len(valores) - 1, max(0, int(round(p / 100 * (len(valores) - 1)))))
+    return valores[k]
+
+
+def fake_embedder_lote(latencia_base, latencia_imagen):
+    """Modelo simulado por lotes; cuenta llamadas e imágenes"""
+    rng = np.random.default_rng(0)
+    lock = threading.Lock()
+    stats = {"llamadas": 0, "imagenes": 0}
+
+    def embed_lote(frames):
+        time.sleep(latencia_base + latencia_imagen * len(frames))
+        with lock:
+            stats["llamadas"] += 1
+            stats["imagenes"] += len(frames)
+            v = rng.standard_normal((len(frames), EMBEDDING_DIM))
+        v /= np.linalg.norm(v, axis=1, keepdims=True)
+        return [e.tolist() for e in v]
+    return embed_lote, stats
+
+
+def jpeg_sintetico():
+    """JPEG 640x480 de ruido (solo para el modelo simulado)"""
+    import cv2
+    img = np.random.default_rng(1).integers(0, 255, (480, 640, 3), dtype=np.uint8)
+    ok, datos = cv2.imencode(".jpg", img)
+    return datos.tobytes()
+
+
+def ejecutar_nivel(host, port, imagen, clientes, duracion, pin=None, token=None):
+    """Mide un nivel de concurrencia durante 'duracion' segundos"""
+    latencias = [[] for _ in range(clientes)]
+    errores = [0] * clientes
+    cabeceras = {"Content-Type": "image/jpeg"}
+    if pin:
+        cabeceras["X-PIN"] = pin
+    if token:
+        cabeceras["Authorization"] = f"Bearer {token}"
+    inicio_barrera = threading.Barrier(clientes + 1)
+    fin = [0.0]
+
+    def cliente(idx):
+        conn = http.client.HTTPConnection(host, port, timeout=60)
+        inicio_barrera.wait()
+        while time.monotonic() < fin[0]:
+            t0 = time.perf_counter()
+            try:
+                conn.request("POST", "/verificar?device=bench", body=imagen, headers=cabeceras)
+                respuesta = conn.getresponse()
+                respuesta.read()
+                if respuesta.status != 200:
+                    errores[idx] += 1
+                    continue
+            except (OSError, http.client.HTTPException):
+                errores[idx] += 1
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=60)
+                continue
+            latencias[idx].append((time.perf_counter() - t0) * 1000)
+        conn.close()
+
+    hilos = [threading.Thread(target=cliente, args=(i,)) for i in range(clientes)]
+    for h in hilos:
+        h.start()
+    fin[0] = time.monotonic() + duracion
+    inicio = time.monotonic()
+    inicio_barrera.wait()
+    for h in hilos:
+        h.join()
+    transcurrido = time.monotonic() - inicio
+
+    todas = sorted(l for lista in latencias for l in lista)
+    return {
+        "clientes": clientes,
+        "peticiones": len(todas),
+        "errores": sum(errores),
+        "por_segundo": round(len(todas) / transcurrido, 2),
+        "p50_ms": round(percentil(todas, 50), 2),
+        "p99_ms": round(percentil(todas, 99), 2),
+        "max_ms": round(todas[-1], 2) if todas else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API HTTP")
+    parser.add_argument("--clientes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--duracion", type=float, default=10.0, help="Segundos por nivel")
+    parser.add_argument("--url", default=None, help="Servidor ya en marcha (si no, se lanza uno)")
+    parser.add_argument("--imagen", default=None, help="Foto con cara (modelo real)")
+    parser.add_argument("--pin", default=None, help="Enviar también un PIN (incluye bcrypt)")
+    parser.add_argument("--token", default=None,
+                        help="API_TOKEN del servidor (--url); el servidor local genera uno")
+    parser.add_argument("--usuarios", type=int, default=200)
+    parser.add_argument("--rostros", type=int, default=5, help="Rostros por usuario")
+    parser.add_argument("--latencia-base", type=float, default=0.04,
+                        help="Segundos por llamada al modelo simulado")
+    parser.add_argument("--latencia-imagen", type=float, default=0.005,
+                        help="Segundos extra por imagen del lote (modelo simulado)")
+    parser.add_argument("--sin-lotes", action="store_true", help="Lote máximo 1")
+    parser.add_argument("--salida", default=None, help="Fichero JSON de resultados")
+    args = parser.parse_args()
+
+    if args.imagen:
+        with open(args.imagen, "rb") as f:
+            imagen = f.read()
+    else:
+        imagen = jpeg_sintetico()
+
+    servidor, stats_modelo = None, None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        tmpdir = tempfile.mkdtemp(prefix="bench_api_")
+        config.DB_PATH = os.path.join(tmpdir, "bench.db")   # Antes de importar core
+        poblar_bd(args.usuarios, args.rostros)
+
+        from core import iniciar_event_writer
+        from core.http_api import AccessAPI, BloqueoIntentos, crear_servidor
+        from core.inference_scheduler import InferenceScheduler
+        iniciar_event_writer()
+
+        if args.imagen:
+            from core.face_recognition import get_embeddings_deepface as embed_lote
+        else:
+            embed_lote, stats_modelo = fake_embedder_lote(args.latencia_base, args.latencia_imagen)
+        planificador = InferenceScheduler(
+            embed_lote,
+            max_lote=1 if args.sin_lotes else config.INFERENCE_MAX_BATCH
+        )
+        # La API exige token; sin bloqueo porque todos los clientes son esta máquina
+        if not args.token:
+            args.token = secrets.token_hex(16)
+        api = AccessAPI(embedder=planificador, bloqueos=BloqueoIntentos(max_fallos=sys.maxsize))
+        servidor = crear_servidor(api, host="127.0.0.1", port=0, token=args.token)
+        host, port = servidor.server_address[:2]
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+
+    resultados = []
+    for clientes in args.clientes:
+        antes = dict(stats_modelo) if stats_modelo else None
+        r = ejecutar_nivel(host, port, imagen, clientes, args.duracion, args.pin, args.token)
+        if stats_modelo:
+            llamadas = stats_modelo["llamadas"] - antes["llamadas"]
+            imagenes = stats_modelo["imagenes"] - antes["imagenes"]
+            r["lote_medio"] = round(imagenes / llamadas, 2) if llamadas else 0.0
+        resultados.append(r)
+        print(json.dumps(r))
+
+    if servidor:
+        servidor.shutdown()
+        servidor.server_close()
+        from core import detener_event_writer
+        detener_event_writer()
+
+    salida = {
+        "modelo": "real" if args.imagen else "simulado",
+        "lotes": not args.sin_lotes,
+        "resultados": resultados,
+    }
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(salida, f, indent=2)
+    return salida
+
+
+if __name__ == "__main__":
+    main()
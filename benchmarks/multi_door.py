@@ -0,0 +1,199 @@
+# benchmarks/multi_door.py
+# --------------------------------------------
+# Benchmark de varias puertas en un mismo proceso
+# --------------------------------------------
+# Simula 1, 4 y 8 puertas sobre una BD temporal con usuarios sintéticos y
+# mide identificaciones por segundo y memoria residente por puerta extra.
+#
+#   python -m benchmarks.multi_door
+#   python -m benchmarks.multi_door --puertas 1 2 4 8 --duracion 20
+#   python -m benchmarks.multi_door --mediapipe          # incluye un grafo de manos por puerta
+#   python -m benchmarks.multi_door --imagen cara.jpg    # modelo real con una foto
+#   python -m benchmarks.multi_door --sin-lotes          # modelo serializado, sin micro-lotes
+#
+# Sin --imagen el modelo se sustituye por un embedding aleatorio con una
+# latencia fija (--latencia-modelo, más --latencia-imagen por imagen del
+# lote), para aislar el coste del resto.
+
+import argparse
+import json
+import os
+import resource
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+import config
+
+EMBEDDING_DIM = 512
+
+
+def rss_mb():
+    """Memoria residente actual del proceso en MB"""
+    try:
+        with open("/proc/self/statm") as f:
+            paginas = int(f.read().split()[1])
+        return paginas * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class SyntheticCapture:
+    """Sustituto de cv2.VideoCapture que devuelve siempre el mismo frame"""
+
+    def __init__(self, frame):
+        self.frame = frame
+
+    def read(self):
+        return True, self.frame.copy()
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+
+def fake_embedder(latencia):
+    """Embedding aleatorio normalizado que tarda 'latencia' segundos"""
+    rng = np.random.default_rng(0)
+    lock = threading.Lock()
+
+    def embed(frame):
+        time.sleep(latencia)
+        with lock:
+            v = rng.standard_normal(EMBEDDING_DIM)
+        return (v / np.linalg.norm(v)).tolist()
+    return embed
+
+
+def poblar_bd(usuarios, rostros_por_usuario):
+    """Crea usuarios y embeddings sintéticos"""
+    from core import ensure_schema, insert_user, insert_face
+    ensure_schema()
+    rng = np.random.default_rng(42)
+    for i in range(usuarios):
+        uid = insert_user(f"Usuario {i}", "$2b$12$sintetico")
+        for _ in range(rostros_por_usuario):
+            insert_face(uid, rng.standard_normal(EMBEDDING_DIM).tolist())
+
+
+def ejecutar_escenario(num_puertas, args, frame, embed_fn, embed_lote_fn):
+    """Construye el runtime con N puertas y mide throughput y memoria"""
+    from core import log_event
+    from core.inference_scheduler import InferenceScheduler
+    from core.multi_door import MultiDoorRuntime, SharedEmbedder
+    from core.headless import StubDoorActuator, StdinPinSource
+
+    rss_inicial = rss_mb()
+    if args.sin_lotes:
+        embedder = SharedEmbedder(embed_fn)
+    else:
+        embedder = InferenceScheduler(embed_lote_fn)
+    doors = [{"device": f"sim-door-{i}", "camera_id": i} for i in range(num_puertas)]
+    runtime = MultiDoorRuntime(
+        doors=doors,
+        embedder=embedder,
+        cap_factory=lambda camera_id: SyntheticCapture(frame),
+        pin_source_factory=lambda door: StdinPinSource(),
+        actuator_factory=lambda door: StubDoorActuator()
+    )
+    if args.mediapipe:
+        for controller in runtime.controllers:
+            controller._manos()                             # Un grafo MediaPipe por puerta
+    runtime.gallery.obtener()                               # Carga inicial de la galería
+    rss_runtime = rss_mb()
+
+    contadores = [0] * num_puertas
+    fin = time.monotonic() + args.duracion
+
+    def bucle(idx, controller):
+        while time.monotonic() < fin:
+            ok, img = controller.cap.read()
+            users, faces = controller.gallery.obtener()
+            uid, score = controller.identificar(img, faces)
+            log_event(uid, "benchmark", f"score={score:.3f}", device=controller.device)
+            contadores[idx] += 1
+
+    hilos = [threading.Thread(target=bucle, args=(i, c)) for i, c in enumerate(runtime.controllers)]
+    inicio = time.monotonic()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    transcurrido = time.monotonic() - inicio
+    runtime.cerrar()
+
+    total = sum(contadores)
+    resultado = {
+        "puertas": num_puertas,
+        "identificaciones": total,
+        "por_segundo": round(total / transcurrido, 2),
+        "rss_runtime_mb": round(rss_runtime - rss_inicial, 2),
+        "rss_por_puerta_mb": round((rss_runtime - rss_inicial) / num_puertas, 2),
+        "recargas_galeria": runtime.gallery.recargas,
+    }
+    if not args.sin_lotes:
+        embedder.cerrar()
+        resultado["planificador"] = embedder.estadisticas()
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark multipuerta")
+    parser.add_argument("--puertas", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--duracion", type=float, default=10.0, help="Segundos por escenario")
+    parser.add_argument("--usuarios", type=int, default=200)
+    parser.add_argument("--rostros", type=int, default=5, help="Rostros por usuario")
+    parser.add_argument("--latencia-modelo", type=float, default=0.05)
+    parser.add_argument("--latencia-imagen", type=float, default=0.005,
+                        help="Segundos extra por imagen del lote (modelo simulado)")
+    parser.add_argument("--sin-lotes", action="store_true",
+                        help="Una inferencia por imagen, serializada (SharedEmbedder)")
+    parser.add_argument("--imagen", default=None, help="Foto con cara para usar el modelo real")
+    parser.add_argument("--mediapipe", action="store_true")
+    parser.add_argument("--salida", default=None, help="Fichero JSON de resultados")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="bench_multi_door_")
+    config.DB_PATH = os.path.join(tmpdir, "bench.db")       # Antes de importar core
+
+    poblar_bd(args.usuarios, args.rostros)
+
+    from core import iniciar_event_writer, detener_event_writer
+    writer = iniciar_event_writer()                         # Un único escritor para todas las puertas
+
+    if args.imagen:
+        import cv2
+        from core import get_embedding_deepface, get_embeddings_deepface
+        frame = cv2.imread(args.imagen)
+        embed_fn, embed_lote_fn = get_embedding_deepface, get_embeddings_deepface
+        rss_base = rss_mb()
+        embed_fn(frame)                                     # Carga del modelo fuera de la medida
+        print(f"Modelo residente: {rss_mb() - rss_base:.1f} MB")
+    else:
+        frame = np.zeros((config.CAMERA_HEIGHT, config.CAMERA_WIDTH, 3), dtype=np.uint8)
+        embed_fn = fake_embedder(args.latencia_modelo + args.latencia_imagen)
+        from benchmarks.api_load import fake_embedder_lote
+        embed_lote_fn, _ = fake_embedder_lote(args.latencia_modelo, args.latencia_imagen)
+
+    resultados = []
+    for n in args.puertas:
+        r = ejecutar_escenario(n, args, frame, embed_fn, embed_lote_fn)
+        resultados.append(r)
+        lote = f" | lote medio {r['planificador']['lote_medio']}" if "planificador" in r else ""
+        print(f"{r['puertas']:>2} puertas: {r['por_segundo']:>8} ident/s | "
+              f"+{r['rss_runtime_mb']} MB ({r['rss_por_puerta_mb']} MB/puerta){lote}")
+
+    detener_event_writer()
+    print(f"Escritor de eventos: {writer.estadisticas()}")
+
+    if args.salida:
+        with open(args.salida, "w") as f:
+            json.dump(resultados, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+# benchmarks/replay.py
+# --------------------------------------------
+# Benchmark de extremo a extremo: reproducción de sesiones grabadas
+# --------------------------------------------
+# Ejecuta el mismo pipeline de verificación que la ventana de acceso
+# (gesto -> rostro -> PIN -> registro, con sus ajustes) sin Tkinter:
+# los frames salen de clips de vídeo grabados, publicados al ritmo de
+# grabación como hace el bucle de cámara de la GUI, y el PIN de un guion.
+# Mide el tiempo hasta la decisión de cada intento y por etapa, la tasa de
+# gestos superados y los resultados del reconocimiento frente a lo
+# esperado.
+#
+#   python -m benchmarks.replay sesiones.json
+#   python -m benchmarks.replay sesiones.json --repeticiones 5 --salida replay.json
+#   python -m benchmarks.replay sesiones.json --bd copia_de_acceso.db
+#   python -m benchmarks.replay --grabar clips/ana_puno.avi --segundos 8   # grabar un clip
+#
+# Manifiesto (rutas relativas al propio fichero):
+#
+#   {
+#     "usuarios": [{"nombre": "Ana", "pin": "1234", "fotos": ["fotos/ana1.jpg"]}],
+#     "sesiones": [
+#       {"clip": "clips/ana_puno.avi", "gesto": "puno", "pin": "1234",
+#        "esperado": "permitido", "usuario": "Ana"},
+#       {"clip": "clips/intruso.avi", "gesto": "victoria", "pin": "0000",
+#        "esperado": "denegado"}
+#     ]
+#   }
+#
+# 'gesto' es el que aparece en el clip (si falta se pide uno al azar, como
+# en producción); "pin": null cancela el PIN. Los usuarios se dan de alta
+# en una BD temporal; con --bd se usa una copia de una BD existente.
+# Necesita los mismos modelos que la puerta (DeepFace y MediaPipe) pero no
+# pantalla, así que puede ejecutarse en un servidor Linux sin X.
+
+import argparse
+import json
+import os
+import pathlib
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import cv2
+
+import config
+
+from benchmarks.api_load import percentil
+
+
+# ==================== FUENTES ====================
+
+class ReproductorClip:
+    """
+    Publica los frames de un clip en un UltimoFrame al ritmo de grabación,
+    como el bucle de cámara de la ventana de acceso.
+    """
+
+    def __init__(self, ruta, destino):
+        self.ruta = ruta
+        self.destino = destino
+        self.publicados = 0
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._bucle, name="replay", daemon=True)
+
+    def iniciar(self):
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self._parar.set()
+        self._hilo.join(timeout=2)
+
+    def _bucle(self):
+        cap = cv2.VideoCapture(self.ruta)
+        periodo = 1.0 / (cap.get(cv2.CAP_PROP_FPS) or 30.0)
+        siguiente = time.perf_counter()
+        try:
+            while not self._parar.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    break                                   # Fin del clip: la cámara "se queda quieta"
+                self.destino.publicar(frame)
+                self.publicados += 1
+                siguiente += periodo
+                self._parar.wait(max(0.0, siguiente - time.perf_counter()))
+        finally:
+            cap.release()
+
+
+class PinGuionado:
+    """PIN del guion para el intento en curso, tecleado tras 'retardo' segundos"""
+
+    def __init__(self, retardo=0.0):
+        self.retardo = retardo
+        self.pin = None
+
+    def leer_pin(self, nombre):
+        time.sleep(self.retardo)
+        return self.pin
+
+
+# ==================== PREPARACIÓN ====================
+
+def cargar_manifiesto(ruta):
+    """Manifiesto con las rutas resueltas respecto a su directorio"""
+    base = os.path.dirname(os.path.abspath(ruta))
+    with open(ruta, encoding="utf-8") as f:
+        manifiesto = json.load(f)
+    for usuario in manifiesto.get("usuarios", []):
+        usuario["fotos"] = [os.path.join(base, f) for f in usuario.get("fotos", [])]
+    for sesion in manifiesto.get("sesiones", []):
+        sesion["clip"] = os.path.join(base, sesion["clip"])
+    return manifiesto
+
+
+def enrolar_usuarios(usuarios):
+    """Da de alta los usuarios del manifiesto (también carga el modelo)"""
+    from core import insert_user, insert_face, hash_pin_sync, get_inference_scheduler
+
+    for usuario in usuarios:
+        imagenes = [img for img in (cv2.imread(f) for f in usuario["fotos"]) if img is not None]
+        embeddings = []
+        for futuro in get_inference_scheduler().enviar_varios(imagenes):
+            try:
+                embeddings.append(futuro.result())
+            except ValueError:
+                pass
+        if not embeddings:
+            print(f"[replay] {usuario['nombre']}: ninguna foto con rostro, no se da de alta")
+            continue
+        user_id = insert_user(usuario["nombre"], hash_pin_sync(str(usuario["pin"])))
+        for embedding in embeddings:
+            insert_face(user_id, embedding)
+        print(f"[replay] {usuario['nombre']}: {len(embeddings)} rostros")
+
+
+def calentar(sesiones, pipeline):
+    """Carga DeepFace y MediaPipe antes de medir (el primer uso tarda segundos)"""
+    pipeline.manos()
+    cap = cv2.VideoCapture(sesiones[0]["clip"]) if sesiones else None
+    ret, frame = cap.read() if cap else (False, None)
+    if cap:
+        cap.release()
+    if ret:
+        try:
+            pipeline.embed_fn(frame)
+        except ValueError:
+            pass
+
+
+# ==================== EJECUCIÓN ====================
+
+def reproducir(sesiones, pipeline, pin_source, repeticiones):
+    """
+    Reproduce cada sesión 'repeticiones' veces.
+
+    Returns:
+        list: un dict por intento
+    """
+    from core import UltimoFrame
+
+    intentos = []
+    for repeticion in range(repeticiones):
+        for sesion in sesiones:
+            frames = UltimoFrame()
+            pipeline.frames = frames
+            pin_source.pin = sesion.get("pin")
+            reproductor = ReproductorClip(sesion["clip"], frames).iniciar()
+            t0 = time.perf_counter()
+            resultado = pipeline.ejecutar(gesto=sesion.get("gesto"))
+            total_ms = (time.perf_counter() - t0) * 1000
+            reproductor.detener()
+
+            esperado = sesion.get("esperado")
+            intento = {
+                "clip": os.path.basename(sesion["clip"]),
+                "repeticion": repeticion,
+                "gesto": sesion.get("gesto"),
+                "resultado": resultado.resultado,
+                "motivo": resultado.motivo,
+                "nombre": resultado.nombre,
+                "score": round(resultado.score, 4) if resultado.score is not None else None,
+                "esperado": esperado,
+                "usuario_esperado": sesion.get("usuario"),
+                "correcto": None if esperado is None else resultado.resultado == esperado,
+                "total_ms": round(total_ms, 3),
+                "tiempos": dict(resultado.tiempos),
+                "frames_publicados": reproductor.publicados,
+            }
+            intentos.append(intento)
+            print(f"[replay] {intento['clip']} #{repeticion}: {intento['resultado']}"
+                  f"{' (' + intento['motivo'] + ')' if intento['motivo'] else ''}"
+                  f" en {total_ms:.0f} ms")
+    return intentos
+
+
+def distribucion(valores):
+    ordenados = sorted(valores)
+    if not ordenados:
+        return {"n": 0}
+    return {
+        "n": len(ordenados),
+        "p50_ms": round(percentil(ordenados, 50), 3),
+        "p95_ms": round(percentil(ordenados, 95), 3),
+        "p99_ms": round(percentil(ordenados, 99), 3),
+        "max_ms": round(ordenados[-1], 3),
+    }
+
+
+def resumir(intentos):
+    """Distribuciones de latencia, tasa de gestos y resultados del reconocimiento"""
+    n = len(intentos)
+    # La etapa de captura solo empieza si el gesto se completó
+    con_gesto = [i for i in intentos if "captura" in i["tiempos"]]
+    reconocimiento = Counter()
+    for i in con_gesto:
+        if "pin" in i["tiempos"]:
+            if i["usuario_esperado"] is None:
+                reconocimiento["identificado"] += 1
+            elif i["nombre"] == i["usuario_esperado"]:
+                reconocimiento["identificado_correcto"] += 1
+            else:
+                reconocimiento["identificado_otro_usuario"] += 1
+        elif i["motivo"] == "Desconocido":
+            reconocimiento["desconocido"] += 1
+        elif i["motivo"] == "Sin rostro":
+            reconocimiento["sin_rostro"] += 1
+        else:
+            reconocimiento["sin_decision"] += 1             # Tiempo agotado, error...
+
+    etapas = {}
+    for i in intentos:
+        for etapa, ms in i["tiempos"].items():
+            etapas.setdefault(etapa, []).append(ms)
+    evaluados = [i for i in intentos if i["correcto"] is not None]
+
+    return {
+        "intentos": n,
+        "tasa_gesto": round(len(con_gesto) / n, 4) if n else 0.0,
+        "resultados": dict(Counter(
+            i["resultado"] + (f": {i['motivo']}" if i["motivo"] else "") for i in intentos
+        )),
+        "reconocimiento": dict(reconocimiento),
+        "acierto": round(sum(i["correcto"] for i in evaluados) / len(evaluados), 4) if evaluados else None,
+        "tiempo_hasta_decision": distribucion([i["total_ms"] for i in intentos]),
+        "tiempo_hasta_decision_permitidos": distribucion(
+            [i["total_ms"] for i in intentos if i["resultado"] == "permitido"]
+        ),
+        "etapas": {etapa: distribucion(v) for etapa, v in etapas.items()},
+    }
+
+
+def grabar_clip(ruta, camara=config.CAMERA_ID, segundos=8.0):
+    """Graba un clip de la cámara para usarlo como sesión"""
+    cap = cv2.VideoCapture(camara)
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, config.CAMERA_WIDTH)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, config.CAMERA_HEIGHT)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    escritor = None
+    fin = time.monotonic() + segundos
+    try:
+        while time.monotonic() < fin:
+            ret, frame = cap.read()
+            if not ret:
+                continue
+            if escritor is None:
+                alto, ancho = frame.shape[:2]
+                escritor = cv2.VideoWriter(ruta, cv2.VideoWriter_fourcc(*"MJPG"), fps, (ancho, alto))
+            escritor.write(frame)
+    finally:
+        cap.release()
+        if escritor is not None:
+            escritor.release()
+    print(f"Clip guardado en {ruta}")
+
+
+def copiar_bd(origen, destino):
+    """
+    Copia consistente de una BD en WAL con la API de backup de SQLite (un
+    copyfile del fichero principal perdería lo que aún está en -wal)
+    """
+    fuente = sqlite3.connect(f"{pathlib.Path(origen).resolve().as_uri()}?mode=ro", uri=True)
+    copia = sqlite3.connect(destino)
+    try:
+        fuente.backup(copia)
+    finally:
+        copia.close()
+        fuente.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproducción de sesiones de acceso grabadas")
+    parser.add_argument("manifiesto", nargs="?", help="JSON con usuarios y sesiones")
+    parser.add_argument("--repeticiones", type=int, default=1)
+    parser.add_argument("--retardo-pin", type=float, default=0.0,
+                        help="Segundos que 'tarda' el usuario en teclear el PIN")
+    parser.add_argument("--bd", default=None, help="Usar una copia de esta BD en lugar de enrolar")
+    parser.add_argument("--salida", default=None, help="Fichero JSON de resultados")
+    parser.add_argument("--grabar", default=None, metavar="CLIP", help="Grabar un clip y salir")
+    parser.add_argument("--camara", type=int, default=config.CAMERA_ID)
+    parser.add_argument("--segundos", type=float, default=8.0)
+    args = parser.parse_args()
+
+    if args.grabar:
+        grabar_clip(args.grabar, args.camara, args.segundos)
+        return None
+    if not args.manifiesto:
+        parser.error("falta el manifiesto de sesiones")
+
+    manifiesto = cargar_manifiesto(args.manifiesto)
+    tmpdir = tempfile.mkdtemp(prefix="bench_replay_")
+    config.DB_PATH = os.path.join(tmpdir, "replay.db")       # Antes de importar core
+    if args.bd:
+        copiar_bd(args.bd, config.DB_PATH)
+
+    from core import (
+        ensure_schema,
+        iniciar_event_writer,
+        detener_event_writer,
+        GalleryCache,
+        VerificationPipeline,
+        UltimoFrame,
+    )
+    ensure_schema()
+    iniciar_event_writer()
+    if not args.bd:
+        enrolar_usuarios(manifiesto.get("usuarios", []))
+
+    # Mismos ajustes que gui/access_window.py
+    pin_source = PinGuionado(args.retardo_pin)
+    pipeline = VerificationPipeline(
+        UltimoFrame(),
+        pin_source,
+        GalleryCache(refresh_seconds=0),
+        device="replay",
+        frames_necesarios=config.GESTURE_FRAMES_REQUIRED,
+        espejo_gestos=False,
+        espera_captura=config.FACE_CAPTURE_DELAY
+    )
+    sesiones = manifiesto.get("sesiones", [])
+    calentar(sesiones, pipeline)
+
+    intentos = reproducir(sesiones, pipeline, pin_source, args.repeticiones)
+    pipeline.cerrar()
+    detener_event_writer()
+
+    salida = {"resumen": resumir(intentos), "intentos": intentos}
+    print(json.dumps(salida["resumen"], indent=2, ensure_ascii=False))
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(salida, f, indent=2, ensure_ascii=False)
+    shutil.rmtree(tmpdir, ignore_errors=True)
+    return salida
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+# benchmarks/scale.py
+# --------------------------------------------
+# Benchmark de escala de las capas de coincidencia y BD
+# --------------------------------------------
+# Genera usuarios, embeddings con forma ArcFace (512 dimensiones,
+# normalizados) e historiales de eventos sintéticos en una BD temporal por
+# escala, y mide las funciones de core que dependen del tamaño de la BD:
+#
+#   fetch_active_users_and_faces, best_match_per_user (y, como referencia,
+#   la instantánea numpy), get_all_users, get_recent_events,
+#   get_user_stats y el rendimiento de log_event (síncrono y por lotes)
+#
+#   python -m benchmarks.scale                                  # 1k y 10k
+#   python -m benchmarks.scale --escalas 1000 10000 100000 1000000 --salida hoy.json
+#   python -m benchmarks.scale --comparar antes.json hoy.json   # regresiones
+#
+# Las operaciones que no caben en la memoria disponible (o escalas que no
+# caben en disco) se anotan como omitidas en lugar de tumbar el proceso:
+# también es un resultado. El JSON incluye el commit para poder comparar
+# ejecuciones con --comparar, que termina con código 1 si alguna mediana
+# empeora más que --umbral.
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+import config
+
+from benchmarks.api_load import percentil
+from benchmarks.multi_door import EMBEDDING_DIM
+
+DISPOSITIVOS = ("puerta-principal", "garaje", "torno-1", "torno-2")
+BYTES_POR_ROSTRO_JSON = EMBEDDING_DIM * 21                  # repr() de un float en JSON
+BYTES_POR_ROSTRO_PY = EMBEDDING_DIM * 32                    # float de Python + puntero de la lista
+BYTES_POR_EVENTO = 600                                      # events + fts + índices (aprox.)
+
+
+# ==================== ENTORNO ====================
+
+def memoria_disponible():
+    """Bytes de memoria disponibles (MemAvailable) o None si no se sabe"""
+    try:
+        with open("/proc/meminfo") as f:
+            for linea in f:
+                if linea.startswith("MemAvailable:"):
+                    return int(linea.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def commit_actual():
+    """Commit del árbol actual (para comparar resultados entre commits)"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+# ==================== DATOS SINTÉTICOS ====================
+
+def embeddings_usuario(rng, n):
+    """n embeddings de una misma persona: centro común más ruido, normalizados"""
+    centro = rng.standard_normal(EMBEDDING_DIM).astype(np.float32)
+    v = centro + 0.35 * rng.standard_normal((n, EMBEDDING_DIM)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def poblar(usuarios, rostros, eventos_por_usuario, lote=5000, semilla=42):
+    """
+    Crea usuarios, rostros y eventos con SQL por lotes (los triggers de
+    estadísticas, FTS, agregados y presencia se ejecutan como en producción).
+
+    Returns:
+        tuple: (matriz float32 de rostros o None, user_ids de cada fila)
+    """
+    from core import get_connection
+    conn = get_connection()
+    rng = np.random.default_rng(semilla)
+    guardar_matriz = usuarios * rostros * EMBEDDING_DIM * 4 < (memoria_disponible() or 0) / 4
+    matrices, ids = [], []
+
+    for inicio in range(0, usuarios, lote):
+        n = min(lote, usuarios - inicio)
+        with conn:
+            primero = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM users").fetchone()[0]
+            conn.executemany(
+                "INSERT INTO users(id, name, pin) VALUES(?, ?, ?)",
+                [(primero + i, f"Usuario {inicio + i}", "$2b$12$sintetico") for i in range(n)]
+            )
+            filas = []
+            for i in range(n):
+                embs = embeddings_usuario(rng, rostros)
+                filas.extend((primero + i, json.dumps(e.tolist())) for e in embs)
+                if guardar_matriz:
+                    matrices.append(embs)
+                    ids.extend([primero + i] * rostros)
+            conn.executemany("INSERT INTO faces(user_id, encoding_json) VALUES(?, ?)", filas)
+
+    total_eventos = usuarios * eventos_por_usuario
+    ahora = datetime.now(timezone.utc).replace(tzinfo=None)
+    inicio_historial = ahora - timedelta(days=90)
+    paso = timedelta(days=90) / max(total_eventos, 1)
+    for inicio in range(0, total_eventos, lote):
+        n = min(lote, total_eventos - inicio)
+        uids = rng.integers(1, usuarios + 1, n)
+        tipos = rng.random(n)
+        filas = []
+        for i in range(n):
+            ts = (inicio_historial + paso * (inicio + i)).strftime("%Y-%m-%d %H:%M:%S")
+            device = DISPOSITIVOS[(inicio + i) % len(DISPOSITIVOS)]
+            uid = int(uids[i])
+            if tipos[i] < 0.7:
+                filas.append((ts, device, uid, "Entrada Permitida",
+                              f"Acceso Permitido: Usuario {uid - 1} || score=0.8{i % 10}"))
+            elif tipos[i] < 0.85:
+                filas.append((ts, device, uid, "Entrada Denegada", "Pin Incorrecto"))
+            elif tipos[i] < 0.9:
+                filas.append((ts, device, None, "Entrada Denegada", "No reconocido: 0.412"))
+            else:
+                filas.append((ts, device, uid, "salida", "Salida"))
+        with conn:
+            conn.executemany(
+                "INSERT INTO events(ts, device, user_id, result, note) VALUES(?, ?, ?, ?, ?)",
+                filas
+            )
+
+    if not matrices:
+        return None, None
+    return np.concatenate(matrices), np.asarray(ids, dtype=np.int64)
+
+
+def consulta_de(rng, matriz, usuarios):
+    """Embedding de consulta: un rostro de la galería con ruido (o aleatorio)"""
+    if matriz is None:
+        return embeddings_usuario(rng, 1)[0].tolist()
+    fila = matriz[int(rng.integers(0, len(matriz)))]
+    q = fila + 0.2 * rng.standard_normal(EMBEDDING_DIM).astype(np.float32)
+    return (q / np.linalg.norm(q)).tolist()
+
+
+# ==================== MEDIDA ====================
+
+def medir(funcion, repeticiones, presupuesto_s):
+    """
+    Ejecuta funcion() hasta 'repeticiones' veces o hasta agotar el
+    presupuesto de tiempo (al menos una vez).
+
+    Returns:
+        tuple: (resumen de tiempos en ms, último resultado)
+    """
+    tiempos, resultado = [], None
+    limite = time.perf_counter() + presupuesto_s
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        resultado = funcion()
+        tiempos.append((time.perf_counter() - t0) * 1000)
+        if time.perf_counter() > limite:
+            break
+    return resumen(tiempos), resultado
+
+
+def resumen(tiempos):
+    ordenados = sorted(tiempos)
+    return {
+        "n": len(ordenados),
+        "min_ms": round(ordenados[0], 3),
+        "mediana_ms": round(percentil(ordenados, 50), 3),
+        "p95_ms": round(percentil(ordenados, 95), 3),
+        "max_ms": round(ordenados[-1], 3),
+    }
+
+
+def omitida(motivo):
+    return {"omitido": motivo}
+
+
+def rendimiento_log_event(n_sync, n_lote):
+    """Eventos/s de log_event síncrono y con el escritor por lotes"""
+    from core import log_event, iniciar_event_writer, detener_event_writer
+
+    t0 = time.perf_counter()
+    for i in range(n_sync):
+        log_event(1, "Entrada Permitida", f"bench {i}", device="bench")
+    sync_s = time.perf_counter() - t0
+
+    iniciar_event_writer()
+    t0 = time.perf_counter()
+    for i in range(n_lote):
+        log_event(1, "Entrada Permitida", f"bench {i}", device="bench")
+    encolado_s = time.perf_counter() - t0
+    detener_event_writer()                                  # Vacía la cola: hasta que todo está escrito
+    total_s = time.perf_counter() - t0
+    return {
+        "sincrono_eventos_s": round(n_sync / sync_s, 1),
+        "lotes_encolado_eventos_s": round(n_lote / encolado_s, 1),
+        "lotes_escritos_eventos_s": round(n_lote / total_s, 1),
+    }
+
+
+def ejecutar_escala(escala, args, directorio):
+    """Puebla una BD de 'escala' usuarios y mide cada operación"""
+    from core import (
+        ensure_schema,
+        fetch_active_users_and_faces,
+        best_match_per_user,
+        get_all_users,
+        get_recent_events,
+        get_user_stats,
+        invalidate_user_credentials,
+        GallerySnapshot,
+    )
+    from core.db_connection import configurar_ruta
+
+    rostros = escala * args.rostros
+    disco = rostros * BYTES_POR_ROSTRO_JSON + escala * args.eventos * BYTES_POR_EVENTO
+    libre = shutil.disk_usage(directorio).free
+    if disco > libre * 0.8:
+        return {"escala": escala, "omitido": f"disco: ~{disco / 1e9:.1f} GB necesarios, "
+                                             f"{libre / 1e9:.1f} GB libres"}
+
+    carpeta = os.path.join(directorio, f"escala_{escala}")
+    os.makedirs(carpeta, exist_ok=True)
+    configurar_ruta(os.path.join(carpeta, "bench.db"))
+    invalidate_user_credentials()
+    ensure_schema()
+
+    t0 = time.perf_counter()
+    matriz, ids = poblar(escala, args.rostros, args.eventos)
+    poblar_s = time.perf_counter() - t0
+    tamano = sum(os.path.getsize(os.path.join(carpeta, f)) for f in os.listdir(carpeta))
+    print(f"[{escala}] BD poblada en {poblar_s:.1f} s ({tamano / 1e6:.0f} MB)")
+
+    rng = np.random.default_rng(7)
+    ops = {}
+    memoria = memoria_disponible() or float("inf")
+    cabe_galeria = rostros * BYTES_POR_ROSTRO_PY < memoria * 0.6
+
+    if cabe_galeria:
+        ops["fetch_active_users_and_faces"], (users, faces) = medir(
+            fetch_active_users_and_faces, args.repeticiones, args.presupuesto)
+        consultas = [consulta_de(rng, matriz, escala) for _ in range(args.repeticiones)]
+        it = iter(consultas)
+        ops["best_match_per_user"], _ = medir(
+            lambda: best_match_per_user(next(it), faces), len(consultas), args.presupuesto)
+        del users, faces
+    else:
+        motivo = f"memoria: ~{rostros * BYTES_POR_ROSTRO_PY / 1e9:.2f} GB estimados"
+        ops["fetch_active_users_and_faces"] = omitida(motivo)
+        ops["best_match_per_user"] = omitida(motivo)
+
+    if matriz is not None:
+        instantanea = GallerySnapshot(matriz, ids)
+        consultas = [consulta_de(rng, matriz, escala) for _ in range(args.llamadas)]
+        it = iter(consultas)
+        ops["instantanea.mejor_coincidencia"], _ = medir(
+            lambda: instantanea.mejor_coincidencia(next(it)), len(consultas), args.presupuesto)
+        del instantanea, matriz
+    else:
+        ops["instantanea.mejor_coincidencia"] = omitida(
+            f"memoria: matriz de ~{rostros * EMBEDDING_DIM * 4 / 1e9:.2f} GB")
+
+    ops["get_all_users"], _ = medir(get_all_users, args.repeticiones, args.presupuesto)
+    ops["get_recent_events"], _ = medir(lambda: get_recent_events(50), args.llamadas,
+                                        args.presupuesto)
+    uids = iter(rng.integers(1, escala + 1, args.llamadas).tolist())
+    ops["get_user_stats"], _ = medir(lambda: get_user_stats(next(uids)), args.llamadas,
+                                     args.presupuesto)
+    ops["log_event"] = rendimiento_log_event(args.eventos_sync, args.eventos_lote)
+
+    resultado = {
+        "escala": escala,
+        "rostros": rostros,
+        "eventos": escala * args.eventos,
+        "poblar_s": round(poblar_s, 2),
+        "tamano_bd_mb": round(tamano / 1e6, 1),
+        "operaciones": ops,
+    }
+    configurar_ruta(None)
+    if not args.conservar:
+        shutil.rmtree(carpeta, ignore_errors=True)
+    return resultado
+
+
+# ==================== COMPARACIÓN ====================
+
+def comparar(antes, despues, umbral):
+    """
+    Compara medianas (y eventos/s) de dos ficheros de resultados.
+
+    Returns:
+        int: número de regresiones (peor que 'umbral' veces)
+    """
+    with open(antes, encoding="utf-8") as f:
+        a = json.load(f)
+    with open(despues, encoding="utf-8") as f:
+        d = json.load(f)
+    print(f"{a.get('commit') or antes} -> {d.get('commit') or despues}")
+
+    regresiones = 0
+    base = {r["escala"]: r for r in a["resultados"]}
+    for r in d["resultados"]:
+        previo = base.get(r["escala"])
+        if not previo or "operaciones" not in r or "operaciones" not in previo:
+            continue
+        for op, medida in r["operaciones"].items():
+            anterior = previo["operaciones"].get(op) or {}
+            for clave, valor in medida.items():
+                if clave not in ("mediana_ms",) and not clave.endswith("eventos_s"):
+                    continue
+                if not isinstance(valor, (int, float)) or not anterior.get(clave):
+                    continue
+                # Tiempos: más es peor; eventos/s: menos es peor
+                factor = valor / anterior[clave] if clave == "mediana_ms" else anterior[clave] / valor
+                marca = "  REGRESIÓN" if factor > umbral else ""
+                regresiones += bool(marca)
+                print(f"{r['escala']:>8} {op:<32} {clave:<26} "
+                      f"{anterior[clave]:>12} -> {valor:<12} x{factor:.2f}{marca}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de escala de BD y coincidencia")
+    parser.add_argument("--escalas", type=int, nargs="+", default=[1000, 10000],
+                        help="Usuarios por escala (p. ej. 1000 10000 100000 1000000)")
+    parser.add_argument("--rostros", type=int, default=1, help="Rostros por usuario")
+    parser.add_argument("--eventos", type=int, default=5, help="Eventos por usuario")
+    parser.add_argument("--repeticiones", type=int, default=5,
+                        help="Repeticiones de las operaciones de galería completa")
+    parser.add_argument("--llamadas", type=int, default=200,
+                        help="Llamadas a las operaciones puntuales")
+    parser.add_argument("--presupuesto", type=float, default=60.0,
+                        help="Segundos máximos por operación y escala")
+    parser.add_argument("--eventos-sync", type=int, default=500)
+    parser.add_argument("--eventos-lote", type=int, default=20000)
+    parser.add_argument("--directorio", default=None, help="Dónde crear las BDs temporales")
+    parser.add_argument("--conservar", action="store_true", help="No borrar las BDs al terminar")
+    parser.add_argument("--salida", default=None, help="Fichero JSON de resultados")
+    parser.add_argument("--comparar", nargs=2, metavar=("ANTES", "DESPUES"),
+                        help="Compara dos ficheros de resultados y sale")
+    parser.add_argument("--umbral", type=float, default=1.2,
+                        help="Factor a partir del cual se marca regresión")
+    args = parser.parse_args()
+
+    if args.comparar:
+        sys.exit(1 if comparar(*args.comparar, args.umbral) else 0)
+
+    directorio = args.directorio or tempfile.mkdtemp(prefix="bench_scale_")
+    config.DB_PATH = os.path.join(directorio, "bench.db")   # Antes de importar core
+
+    salida = {
+        "commit": commit_actual(),
+        "fecha": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "plataforma": platform.platform(),
+        "parametros": {k: v for k, v in vars(args).items() if k not in ("comparar", "salida")},
+        "resultados": [],
+    }
+    for escala in args.escalas:
+        r = ejecutar_escala(escala, args, directorio)
+        salida["resultados"].append(r)
+        print(json.dumps(r, ensure_ascii=False))
+        if args.salida:                                     # Parcial: una escala grande puede no acabar
+            with open(args.salida, "w", encoding="utf-8") as f:
+                json.dump(salida, f, indent=2, ensure_ascii=False)
+
+    if not args.directorio and not args.conservar:
+        shutil.rmtree(directorio, ignore_errors=True)
+    return salida
+
+
+if __name__ == "__main__":
+    main()
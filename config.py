@@ -6,20 +6,107 @@
 # Base de datos
 DB_PATH = "acceso.db"
 DEVICE_NAME = "demo-door-1"
+DB_SYNCHRONOUS = "NORMAL"    # seguro en modo WAL y sin fsync en cada commit
+DB_BUSY_TIMEOUT_MS = 5000    # espera ante bloqueos en lugar de fallar
+DB_STATEMENT_CACHE = 128     # sentencias preparadas cacheadas por conexión
+
+# Registro de eventos (escritura asíncrona por lotes)
+EVENT_BATCH_SIZE = 64              # eventos máximos por transacción
+EVENT_FLUSH_INTERVAL = 0.5         # segundos máximos que un evento espera en cola
+EVENT_SPOOL_PATH = "eventos_spool.jsonl"  # respaldo si SQLite no está disponible
+
+# Retención de eventos
+EVENT_HOT_DAYS = 90                    # días que permanecen en la tabla 'events'
+EVENT_ARCHIVE_PATH = "acceso_archivo.db"  # BD de archivo (relativa a DB_PATH)
+RETENTION_BATCH_SIZE = 5000            # eventos movidos por transacción
+INCREMENTAL_VACUUM_PAGES = 2000        # páginas liberadas por compactación
 
 # Cámara
 CAMERA_ID = 1
 CAMERA_WIDTH = 640
 CAMERA_HEIGHT = 480
 
+# Credenciales (bcrypt)
+BCRYPT_COST = 12             # coste de los hashes nuevos; los antiguos se rehacen al entrar
+CREDENTIAL_WORKERS = 2       # hilos que ejecutan bcrypt fuera de la interfaz
+CREDENTIAL_CACHE_SIZE = 256  # usuarios con nombre/hash en caché (0 = sin caché)
+CREDENTIAL_CACHE_TTL = 30    # segundos que vale una entrada (cambios desde otros procesos)
+
 # Reconocimiento facial
 FACE_THRESHOLD = 0.70  # Umbral de similitud
 FACE_MODEL = "ArcFace"
 FACE_DETECTOR = "opencv"
+INFERENCE_MAX_BATCH = 8      # embeddings por llamada al modelo (core/inference_scheduler.py)
+INFERENCE_MAX_WAIT_MS = 5    # espera máxima para completar un lote
+
+# Alta masiva de usuarios (enrolar.py)
+ENROLL_WORKERS = None        # procesos para calcular embeddings (None = núcleos disponibles)
+ENROLL_BATCH_SIZE = 20       # usuarios escritos por transacción
+ENROLL_IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
 
 # Gestos
 GESTURE_TIMEOUT = 15  # segundos
 GESTURE_FRAMES_REQUIRED = 30  # frames consecutivos
+FACE_CAPTURE_DELAY = 1.0  # segundos entre el gesto y la captura del rostro (ventana de acceso)
+
+# Verificación por etapas: segundos máximos de cada etapa (None = sin límite)
+VERIFICATION_TIMEOUTS = {
+    "gesto": GESTURE_TIMEOUT,
+    "captura": 5,
+    "embedding": 20,
+    "coincidencia": 5,
+    "pin": 60,
+    "decision": 10,
+}
+PIN_CHECK_MIN_SECONDS = 5     # margen propio de bcrypt tras recibir el PIN (no lo consume el tecleo)
+KEYPAD_PIN_TIMEOUT = 30       # segundos para teclear el PIN en un keypad (headless)
+
+# Detección de movimiento (evita inferencia cuando no hay nadie)
+MOTION_DOWNSCALE = (64, 48)      # tamaño de la imagen gris reducida
+MOTION_PIXEL_THRESHOLD = 12      # diferencia mínima de gris por píxel
+MOTION_MIN_AREA = 0.003          # fracción de píxeles cambiados para contar movimiento
+MOTION_HOLD_SECONDS = 2.0        # segundos activo tras el último movimiento
+PREVIEW_INTERVAL_MS = 30         # refresco con escena activa (~33 FPS)
+IDLE_PREVIEW_INTERVAL_MS = 200   # refresco con escena en reposo (~5 FPS)
+
+# Multipuerta (un solo proceso para varias cámaras/puertas)
+DOORS = [
+    # {"device": "demo-door-1", "camera_id": 0, "keypad": None},
+    # {"device": "demo-door-2", "camera_id": 1, "keypad": "/dev/ttyACM0"},
+]
+GALLERY_REFRESH_SECONDS = 5  # cada cuánto se comprueba si la galería cambió
+GALLERY_SNAPSHOT = "galeria_snapshot"  # prefijo de la instantánea .npy (relativo a DB_PATH)
+GALLERY_USE_SNAPSHOT = True            # comparar contra la instantánea mapeada en memoria
+GALLERY_SHM_NAME = "lanai_galeria"     # segmento de memoria compartida (python -m core.gallery_shm)
+
+# Servicio HTTP local (api.py)
+API_HOST = "127.0.0.1"       # solo local por defecto
+API_PORT = 8765
+API_TOKEN = None             # si se define, se exige 'Authorization: Bearer <token>'
+API_MAX_BODY_MB = 8          # tamaño máximo de una petición
+API_PIN_MAX_FAILURES = 5     # PINs fallidos (por usuario y por cliente) antes de bloquear
+API_PIN_LOCKOUT_SECONDS = 300  # ventana de los fallos; el bloqueo dura hasta que salen de ella
+
+# Trazas de latencia por etapa (core/tracing.py); se leen al importar 'core'
+TRACING_ENABLED = False      # histogramas en memoria por etapa (informe en el panel)
+TRACE_PERSIST = False        # además, una fila por intento en la tabla 'traces'
+
+# Telemetría de vídeo (core/telemetry.py)
+TELEMETRY_OVERLAY = False        # FPS y tiempos sobre la vista previa (F3 lo alterna en la puerta)
+TELEMETRY_CAMERA_FPS = 30        # FPS nominal de la cámara (referencia para contar frames perdidos)
+TELEMETRY_PROM_FILE = None       # p. ej. "/var/lib/node_exporter/acceso.prom" (formato Prometheus)
+TELEMETRY_PROM_PORT = None       # p. ej. 9108 para servir GET /metrics en 127.0.0.1
+TELEMETRY_EXPORT_SECONDS = 15    # cada cuánto se reescribe el fichero de métricas
+
+# Ocupación (quién está dentro)
+OCCUPANCY_REFRESH_SECONDS = 5  # recarga del índice en memoria (recoge eventos de otras puertas)
+
+# Panel de administración
+USERS_PAGE_SIZE = 100        # usuarios cargados por página en la pestaña Usuarios
+EVENTS_PAGE_SIZE = 200       # eventos cargados por página en la pestaña Historial
+EXPORT_CHUNK_SIZE = 1000     # filas leídas del cursor por bloque al exportar a CSV
+HISTORY_POLL_MS = 2000       # intervalo de consulta de eventos nuevos (historial en vivo)
+HISTORY_MAX_ROWS = 1000      # máximo de filas que conserva la tabla del historial
 
 # Administrador
 ADMIN_PIN_HASH = None  # Se configurará en primera ejecución
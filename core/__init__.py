@@ -3,38 +3,166 @@
 # Módulos core del sistema
 # --------------------------------------------
 
+from .db_connection import get_connection, cerrar_conexiones
+
+from .event_writer import (
+    iniciar_event_writer,
+    get_event_writer,
+    detener_event_writer
+)
+
 from .db_manager import (
     ensure_schema,
+    fetch_active_users,
     fetch_active_users_and_faces,
+    get_user_credentials,
+    invalidate_user_credentials,
     insert_user,
     insert_face,
     log_event,
     get_recent_events,
+    query_events,
+    search_events,
+    get_last_event_id,
+    get_events_since,
+    iter_events,
+    export_events_csv,
     get_all_users,
+    get_users_page,
     update_user_status,
-    delete_user
+    update_user_pin,
+    delete_user,
+    get_user_stats,
+    get_all_user_stats,
+    rebuild_user_stats,
+    rebuild_events_fts
+)
+
+from .retention import (
+    aplicar_retencion,
+    get_events_between
+)
+
+from .analytics import (
+    get_event_series,
+    get_event_devices,
+    rebuild_event_rollups
+)
+
+from .occupancy import (
+    OccupancyIndex,
+    get_occupancy_index,
+    get_occupants,
+    rebuild_presence
+)
+
+from .credentials import (
+    CredentialService,
+    get_credential_service,
+    hash_pin_sync
 )
 
 from .face_recognition import (
     get_embedding_deepface,
+    get_embeddings_deepface,
     cosine_similarity,
     best_match_per_user
 )
 
+from .inference_scheduler import InferenceScheduler, get_inference_scheduler
+
+from .telemetry import (
+    VideoTelemetry,
+    get_video_telemetry,
+    alternar_overlay,
+    texto_prometheus,
+    iniciar_exportador_metricas,
+    detener_exportador_metricas
+)
+
+from .gallery import GalleryCache
+from .gallery_snapshot import GallerySnapshot
+
 from .gesture_detection import GestureDetector
+from .motion_gate import MotionGate
+
+from .verification_pipeline import (
+    VerificationPipeline,
+    UltimoFrame,
+    CamaraFrames,
+    BuzonPin,
+    EtapaIniciada,
+    EtapaTerminada,
+    ProgresoGesto,
+    PinSolicitado,
+    VerificacionTerminada
+)
 
 __all__ = [
+    'get_connection',
+    'cerrar_conexiones',
+    'iniciar_event_writer',
+    'get_event_writer',
+    'detener_event_writer',
     'ensure_schema',
+    'fetch_active_users',
     'fetch_active_users_and_faces',
+    'get_user_credentials',
+    'invalidate_user_credentials',
     'insert_user',
     'insert_face',
     'log_event',
     'get_recent_events',
+    'query_events',
+    'search_events',
+    'get_last_event_id',
+    'get_events_since',
+    'iter_events',
+    'export_events_csv',
     'get_all_users',
+    'get_users_page',
     'update_user_status',
+    'update_user_pin',
     'delete_user',
+    'get_user_stats',
+    'get_all_user_stats',
+    'rebuild_user_stats',
+    'rebuild_events_fts',
+    'aplicar_retencion',
+    'get_events_between',
+    'get_event_series',
+    'get_event_devices',
+    'rebuild_event_rollups',
+    'OccupancyIndex',
+    'get_occupancy_index',
+    'get_occupants',
+    'rebuild_presence',
+    'CredentialService',
+    'get_credential_service',
+    'hash_pin_sync',
     'get_embedding_deepface',
+    'get_embeddings_deepface',
+    'InferenceScheduler',
+    'get_inference_scheduler',
     'cosine_similarity',
     'best_match_per_user',
-    'GestureDetector'
+    'VideoTelemetry',
+    'get_video_telemetry',
+    'alternar_overlay',
+    'texto_prometheus',
+    'iniciar_exportador_metricas',
+    'detener_exportador_metricas',
+    'GalleryCache',
+    'GallerySnapshot',
+    'GestureDetector',
+    'MotionGate',
+    'VerificationPipeline',
+    'UltimoFrame',
+    'CamaraFrames',
+    'BuzonPin',
+    'EtapaIniciada',
+    'EtapaTerminada',
+    'ProgresoGesto',
+    'PinSolicitado',
+    'VerificacionTerminada'
 ]
\ No newline at end of file
@@ -0,0 +1,149 @@
+# core/analytics.py
+# --------------------------------------------
+# Agregados de tráfico por hora y por día
+# --------------------------------------------
+# 'events_hourly' y 'events_daily' cuentan eventos por franja, puerta y
+# resultado. Un trigger los actualiza con cada inserción en 'events' (con
+# o sin el escritor asíncrono), así que las consultas del panel leen unas
+# pocas filas por franja sin importar cuántos años de historial haya. Al
+# archivar eventos los agregados se conservan.
+
+from datetime import datetime, timedelta
+
+from .db_connection import get_connection
+from .retention import fuente_eventos
+
+FORMATO_HORA = "%Y-%m-%d %H:00:00"
+FORMATO_DIA = "%Y-%m-%d"
+
+# granularidad -> (tabla, formato de franja, paso)
+GRANULARIDADES = {
+    "hora": ("events_hourly", FORMATO_HORA, timedelta(hours=1)),
+    "dia": ("events_daily", FORMATO_DIA, timedelta(days=1)),
+}
+
+
+def crear_rollups(c):
+    """
+    Crea las tablas y el trigger de agregados.
+
+    Returns:
+        bool: True si las tablas no existían (hay que rellenarlas)
+    """
+    nuevas = c.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='events_hourly'"
+    ).fetchone() is None
+
+    for tabla, columna in (("events_hourly", "hour"), ("events_daily", "day")):
+        c.execute(f"""
+        CREATE TABLE IF NOT EXISTS {tabla}(
+          {columna} TEXT NOT NULL,
+          device TEXT NOT NULL,
+          result TEXT NOT NULL,
+          count INTEGER NOT NULL DEFAULT 0,
+          PRIMARY KEY({columna}, device, result)
+        ) WITHOUT ROWID;
+        """)
+
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_events_rollups
+    AFTER INSERT ON events
+    BEGIN
+      INSERT INTO events_hourly(hour, device, result, count)
+      VALUES(strftime('%Y-%m-%d %H:00:00', NEW.ts), COALESCE(NEW.device, ''),
+             COALESCE(NEW.result, ''), 1)
+      ON CONFLICT(hour, device, result) DO UPDATE SET count = count + 1;
+      INSERT INTO events_daily(day, device, result, count)
+      VALUES(date(NEW.ts), COALESCE(NEW.device, ''), COALESCE(NEW.result, ''), 1)
+      ON CONFLICT(day, device, result) DO UPDATE SET count = count + 1;
+    END;
+    """)
+    return nuevas
+
+
+def rebuild_event_rollups():
+    """Recalcula los agregados desde cero (eventos calientes y archivados)"""
+    conn = get_connection()
+    fuente = fuente_eventos(conn)
+    with conn:
+        conn.execute("DELETE FROM events_hourly")
+        conn.execute("DELETE FROM events_daily")
+        conn.execute(f"""
+            INSERT INTO events_hourly(hour, device, result, count)
+            SELECT strftime('%Y-%m-%d %H:00:00', ts), COALESCE(device, ''),
+                   COALESCE(result, ''), COUNT(*)
+            FROM {fuente}
+            WHERE ts IS NOT NULL
+            GROUP BY 1, 2, 3
+        """)
+        conn.execute("""
+            INSERT INTO events_daily(day, device, result, count)
+            SELECT substr(hour, 1, 10), device, result, SUM(count)
+            FROM events_hourly
+            GROUP BY 1, 2, 3
+        """)
+
+
+def _franjas(desde, hasta, formato, paso):
+    """Etiquetas de todas las franjas entre desde y hasta (inclusive)"""
+    actual = datetime.strptime(desde.strftime(formato), formato)
+    etiquetas = []
+    while actual <= hasta:
+        etiquetas.append(actual.strftime(formato))
+        actual += paso
+    return etiquetas
+
+
+def get_event_series(desde, hasta, granularidad="hora", por="result", device=None):
+    """
+    Series de eventos por franja en una ventana de tiempo (UTC).
+
+    Args:
+        desde, hasta: datetime de inicio y fin de la ventana
+        granularidad: 'hora' o 'dia'
+        por: 'result' o 'device' (clave de cada serie)
+        device: Limitar a una puerta
+
+    Returns:
+        dict: {"franjas": [etiqueta, ...],
+               "series": {clave: [conteo por franja, ...]}}
+               Las franjas sin eventos valen 0.
+    """
+    if granularidad not in GRANULARIDADES:
+        raise ValueError(f"Granularidad no válida: {granularidad}")
+    if por not in ("result", "device"):
+        raise ValueError(f"Agrupación no válida: {por}")
+    tabla, formato, paso = GRANULARIDADES[granularidad]
+    columna = "hour" if granularidad == "hora" else "day"
+
+    franjas = _franjas(desde, hasta, formato, paso)
+    if not franjas:
+        return {"franjas": [], "series": {}}
+
+    condiciones = [f"{columna} >= ?", f"{columna} <= ?"]
+    params = [franjas[0], franjas[-1]]
+    if device is not None:
+        condiciones.append("device = ?")
+        params.append(device)
+
+    filas = get_connection().execute(f"""
+        SELECT {columna}, {por}, SUM(count)
+        FROM {tabla}
+        WHERE {' AND '.join(condiciones)}
+        GROUP BY 1, 2
+    """, params).fetchall()
+
+    indice = {f: i for i, f in enumerate(franjas)}
+    series = {}
+    for franja, clave, total in filas:
+        serie = series.setdefault(clave, [0] * len(franjas))
+        serie[indice[franja]] = total
+    return {"franjas": franjas, "series": series}
+
+
+def get_event_devices():
+    """Puertas con eventos registrados"""
+    filas = get_connection().execute(
+        "SELECT DISTINCT device FROM events_daily ORDER BY device"
+    ).fetchall()
+    return [f[0] for f in filas]
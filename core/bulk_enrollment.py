@@ -0,0 +1,282 @@
+# core/bulk_enrollment.py
+# --------------------------------------------
+# Alta masiva de usuarios a partir de fotos
+# --------------------------------------------
+# Los embeddings se calculan en un pool de procesos (un modelo DeepFace por
+# proceso) y los usuarios se escriben por lotes en una sola transacción.
+# Cada persona completada queda anotada en 'enrollment_progress' dentro de
+# la misma transacción, de modo que un alta interrumpida se puede reanudar
+# sin duplicar usuarios.
+#
+# Entrada:
+#   - Directorio con una subcarpeta por persona:  fotos/Ana Pérez/1.jpg ...
+#   - Manifiesto CSV con columnas nombre,pin,foto (una fila por foto; las
+#     rutas relativas se resuelven respecto al manifiesto)
+#
+# Si una persona no trae PIN se genera uno aleatorio y se devuelve en el
+# resultado para poder entregarlo. Con 'pines' se añade además al CSV (con
+# fsync) justo después de confirmar cada lote: si el alta se interrumpe,
+# los usuarios ya creados no se quedan con un PIN que nadie conoce.
+
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+
+from config import (
+    FACE_MODEL,
+    ENROLL_WORKERS,
+    ENROLL_BATCH_SIZE,
+    ENROLL_IMAGE_EXTENSIONS,
+    INFERENCE_MAX_BATCH,
+)
+from .db_connection import get_connection
+
+
+# ==================== ORIGEN DE LAS FOTOS ====================
+
+def personas_desde_directorio(directorio):
+    """
+    Personas de un directorio con una subcarpeta por persona.
+
+    Returns:
+        list: [(clave, nombre, pin, [rutas])] con pin None
+    """
+    personas = []
+    for nombre in sorted(os.listdir(directorio)):
+        carpeta = os.path.join(directorio, nombre)
+        if not os.path.isdir(carpeta):
+            continue
+        rutas = [
+            os.path.join(carpeta, f) for f in sorted(os.listdir(carpeta))
+            if f.lower().endswith(ENROLL_IMAGE_EXTENSIONS)
+        ]
+        personas.append((os.path.abspath(carpeta), nombre, None, rutas))
+    return personas
+
+
+def personas_desde_manifiesto(manifiesto):
+    """
+    Personas de un manifiesto CSV (nombre,pin,foto), agrupadas por nombre.
+
+    Returns:
+        list: [(clave, nombre, pin, [rutas])]
+    """
+    base = os.path.dirname(os.path.abspath(manifiesto))
+    agrupadas = {}
+    with open(manifiesto, newline="", encoding="utf-8") as f:
+        for fila in csv.DictReader(f):
+            nombre = (fila.get("nombre") or "").strip()
+            if not nombre:
+                continue
+            pin = (fila.get("pin") or "").strip() or None
+            foto = (fila.get("foto") or "").strip()
+            clave = f"{os.path.abspath(manifiesto)}#{nombre}"
+            persona = agrupadas.setdefault(clave, [clave, nombre, pin, []])
+            persona[2] = persona[2] or pin
+            if foto:
+                persona[3].append(os.path.join(base, foto))
+    return [tuple(p) for p in agrupadas.values()]
+
+
+# ==================== PROCESOS DE TRABAJO ====================
+
+def _iniciar_worker():
+    """Carga el modelo una vez por proceso"""
+    from deepface import DeepFace
+    DeepFace.build_model(FACE_MODEL)
+
+
+def _embeddings_fotos(rutas):
+    """
+    Embeddings de un trozo de fotos con una pasada del modelo (se ejecuta
+    en un proceso del pool).
+
+    Returns:
+        list: [(ruta, embedding o None, error o None)] en el orden de entrada
+    """
+    import cv2
+    from .face_recognition import get_embeddings_deepface
+    resultados, leidas, imagenes = [None] * len(rutas), [], []
+    for i, ruta in enumerate(rutas):
+        img = cv2.imread(ruta)
+        if img is None:
+            resultados[i] = (ruta, None, "No se pudo leer la imagen")
+        else:
+            leidas.append(i)
+            imagenes.append(img)
+    try:
+        embeddings = get_embeddings_deepface(imagenes) if imagenes else []
+    except Exception as e:
+        embeddings = [e] * len(imagenes)
+    for i, emb in zip(leidas, embeddings):
+        if isinstance(emb, Exception):
+            resultados[i] = (rutas[i], None, str(emb) or type(emb).__name__)
+        else:
+            resultados[i] = (rutas[i], emb, None)
+    return resultados
+
+
+def _hash_pin(pin):
+    """Hash bcrypt del PIN (se ejecuta en un proceso del pool)"""
+    from .credentials import hash_pin_sync
+    return hash_pin_sync(pin)
+
+
+# ==================== ESCRITURA ====================
+
+def _asegurar_tabla_progreso(conn):
+    with conn:
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS enrollment_progress(
+          persona TEXT PRIMARY KEY,
+          user_id INTEGER,
+          ts DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        """)
+
+
+def _personas_completadas(conn):
+    return {fila[0] for fila in conn.execute("SELECT persona FROM enrollment_progress")}
+
+
+def _guardar_lote(conn, lote):
+    """
+    Inserta usuarios, rostros y progreso de un lote en una transacción.
+
+    Args:
+        lote: [(clave, nombre, pin_hash, [embeddings])]
+
+    Returns:
+        list: IDs de los usuarios creados
+    """
+    ids = []
+    with conn:
+        for clave, nombre, pin_hash, embeddings in lote:
+            user_id = conn.execute(
+                "INSERT INTO users(name, pin) VALUES(?, ?)", (nombre, pin_hash)
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO faces(user_id, encoding_json) VALUES(?, ?)",
+                [(user_id, json.dumps(list(e))) for e in embeddings]
+            )
+            conn.execute(
+                "INSERT INTO enrollment_progress(persona, user_id) VALUES(?, ?)",
+                (clave, user_id)
+            )
+            ids.append(user_id)
+    return ids
+
+
+def generar_pin():
+    """PIN aleatorio de 4 dígitos"""
+    return f"{secrets.randbelow(10000):04d}"
+
+
+# ==================== ALTA MASIVA ====================
+
+def enrolar(personas, workers=ENROLL_WORKERS, batch_size=ENROLL_BATCH_SIZE,
+            informe=None, pines=None, progreso=None):
+    """
+    Da de alta a las personas indicadas, saltando las ya completadas.
+
+    Args:
+        personas: Salida de personas_desde_directorio()/personas_desde_manifiesto()
+        workers: Procesos del pool (None = núcleos disponibles)
+        batch_size: Personas escritas por transacción
+        informe: Ruta del CSV de errores por foto (ruta, persona, error)
+        pines: Ruta del CSV (nombre, user_id, pin) al que se añaden los
+               PINs generados de cada lote confirmado
+        progreso: Callback opcional progreso(hechas, total)
+
+    Returns:
+        dict: resumen con 'usuarios', 'rostros', 'fotos_con_error',
+              'personas_sin_rostro', 'omitidas' y 'pines_generados'
+              (lista de (nombre, user_id, pin) para entregar)
+    """
+    conn = get_connection()
+    _asegurar_tabla_progreso(conn)
+    completadas = _personas_completadas(conn)
+    pendientes = [p for p in personas if p[0] not in completadas]
+
+    resumen = {
+        "usuarios": 0,
+        "rostros": 0,
+        "fotos_con_error": 0,
+        "personas_sin_rostro": 0,
+        "omitidas": len(personas) - len(pendientes),
+        "pines_generados": [],
+    }
+    f_informe = open(informe, "w", newline="", encoding="utf-8") if informe else None
+    writer = csv.writer(f_informe) if f_informe else None
+    if writer:
+        writer.writerow(["ruta", "persona", "error"])
+    f_pines = _abrir_csv_pines(pines) if pines else None
+
+    # spawn: TensorFlow no es seguro tras fork()
+    contexto = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=contexto,
+                                 initializer=_iniciar_worker) as pool:
+            pines = [pin or generar_pin() for _, _, pin, _ in pendientes]
+            hashes = [pool.submit(_hash_pin, pin) for pin in pines]
+            rutas = [r for _, _, _, fotos in pendientes for r in fotos]
+            # Trozos de INFERENCE_MAX_BATCH fotos: una pasada del modelo por trozo.
+            # map conserva el orden: las fotos de cada persona llegan seguidas
+            trozos = [rutas[i:i + INFERENCE_MAX_BATCH]
+                      for i in range(0, len(rutas), INFERENCE_MAX_BATCH)]
+            resultados = itertools.chain.from_iterable(pool.map(_embeddings_fotos, trozos))
+
+            lote, generados = [], []
+            for i, (clave, nombre, pin, fotos) in enumerate(pendientes):
+                embeddings = []
+                for _ in fotos:
+                    ruta, emb, error = next(resultados)
+                    if emb is not None:
+                        embeddings.append(emb)
+                    else:
+                        resumen["fotos_con_error"] += 1
+                        if writer:
+                            writer.writerow([ruta, nombre, error])
+
+                if not embeddings:
+                    # Sin rostros no se crea; se reintentará al reanudar
+                    resumen["personas_sin_rostro"] += 1
+                    if writer:
+                        writer.writerow(["", nombre, "Ninguna foto válida"])
+                else:
+                    lote.append((clave, nombre, hashes[i].result(), embeddings))
+                    generados.append(None if pin else (nombre, pines[i]))
+                    resumen["rostros"] += len(embeddings)
+
+                if len(lote) >= batch_size or (lote and i == len(pendientes) - 1):
+                    ids = _guardar_lote(conn, lote)
+                    resumen["usuarios"] += len(ids)
+                    nuevos = [(g[0], uid, g[1]) for g, uid in zip(generados, ids) if g]
+                    if f_pines and nuevos:
+                        csv.writer(f_pines).writerows(nuevos)
+                        f_pines.flush()
+                        os.fsync(f_pines.fileno())
+                    resumen["pines_generados"].extend(nuevos)
+                    lote, generados = [], []
+                if progreso:
+                    progreso(i + 1, len(pendientes))
+    finally:
+        if f_informe:
+            f_informe.close()
+        if f_pines:
+            f_pines.close()
+    return resumen
+
+
+def _abrir_csv_pines(ruta):
+    """CSV de PINs en modo 'a' (conserva los de ejecuciones anteriores)"""
+    nuevo = not os.path.exists(ruta) or os.path.getsize(ruta) == 0
+    f = open(ruta, "a", newline="", encoding="utf-8")
+    if nuevo:
+        csv.writer(f).writerow(["nombre", "user_id", "pin"])
+        f.flush()
+    return f
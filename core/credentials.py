@@ -0,0 +1,115 @@
+# core/credentials.py
+# --------------------------------------------
+# Verificación y hash de PINs fuera del hilo de la interfaz
+# --------------------------------------------
+# bcrypt es lento a propósito (cientos de ms con coste 12). Las
+# comprobaciones se ejecutan en un pequeño pool de hilos (bcrypt libera el
+# GIL) y devuelven Futures, de modo que la GUI puede seguir refrescando
+# la ventana mientras tanto.
+#
+# Si un PIN correcto tiene un hash con coste distinto de BCRYPT_COST, se
+# recalcula en segundo plano con el coste configurado y se guarda
+# (rehash al iniciar sesión), así los hashes antiguos se actualizan solos.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from config import BCRYPT_COST, CREDENTIAL_WORKERS
+from .tracing import trazado
+
+
+def coste_hash(pin_hash):
+    """Factor de coste de un hash bcrypt ('$2b$12$...' -> 12)"""
+    try:
+        return int(pin_hash.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+@trazado("bcrypt.hash")
+def hash_pin_sync(pin, coste=BCRYPT_COST):
+    """Hash bcrypt del PIN en el hilo actual"""
+    return bcrypt.hashpw(pin.encode(), bcrypt.gensalt(coste)).decode()
+
+
+class CredentialService:
+    """Pool de hilos para bcrypt"""
+
+    def __init__(self, workers=CREDENTIAL_WORKERS, coste=BCRYPT_COST):
+        self.coste = coste
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._stats_lock = threading.Lock()
+        self.verificaciones = 0
+        self.rehashes = 0
+
+    def hash_pin(self, pin):
+        """Future con el hash del PIN al coste configurado"""
+        return self._pool.submit(hash_pin_sync, pin, self.coste)
+
+    def verificar(self, pin, pin_hash, al_actualizar=None):
+        """
+        Comprueba el PIN contra su hash.
+
+        Args:
+            al_actualizar: Callback al_actualizar(nuevo_hash) para guardar el
+                           hash recalculado cuando el coste no es el actual
+
+        Returns:
+            Future[bool]
+        """
+        return self._pool.submit(self._verificar, pin, pin_hash, al_actualizar)
+
+    def verificar_usuario(self, user_id, pin, pin_hash, al_actualizar=None):
+        """
+        Como verificar(), guardando el hash recalculado en users.pin.
+        'al_actualizar' se llama después de guardar (p. ej. para invalidar
+        una caché de galería).
+        """
+        from .db_manager import update_user_pin
+
+        def guardar(nuevo_hash):
+            update_user_pin(user_id, nuevo_hash)
+            if al_actualizar:
+                al_actualizar(nuevo_hash)
+        return self.verificar(pin, pin_hash, guardar)
+
+    @trazado("bcrypt.verificar")
+    def _verificar(self, pin, pin_hash, al_actualizar):
+        try:
+            correcto = bcrypt.checkpw(pin.encode(), pin_hash.encode())
+        except ValueError:
+            correcto = False                                # Hash corrupto
+        with self._stats_lock:
+            self.verificaciones += 1
+        if correcto and al_actualizar and coste_hash(pin_hash) != self.coste:
+            self._pool.submit(self._rehash, pin, al_actualizar)
+        return correcto
+
+    def _rehash(self, pin, al_actualizar):
+        try:
+            al_actualizar(hash_pin_sync(pin, self.coste))
+        except Exception as e:
+            print(f"[credenciales] no se pudo actualizar el hash: {e}")
+            return
+        with self._stats_lock:
+            self.rehashes += 1
+
+    def cerrar(self):
+        self._pool.shutdown(wait=True)
+
+
+# ==================== INSTANCIA GLOBAL ====================
+
+_servicio = None
+_servicio_lock = threading.Lock()
+
+
+def get_credential_service():
+    """Servicio global (se crea en el primer uso)"""
+    global _servicio
+    with _servicio_lock:
+        if _servicio is None:
+            _servicio = CredentialService()
+        return _servicio
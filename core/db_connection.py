@@ -0,0 +1,77 @@
+# core/db_connection.py
+# --------------------------------------------
+# Conexiones persistentes a SQLite
+# --------------------------------------------
+# Una conexión por hilo, reutilizada entre llamadas, en modo WAL para que
+# el panel de administración y la puerta puedan escribir a la vez sin
+# errores "database is locked". sqlite3 cachea las sentencias preparadas
+# de cada conexión (cached_statements).
+
+import sqlite3
+import threading
+import weakref
+
+import config
+
+_local = threading.local()
+_registro_lock = threading.Lock()
+_conexiones = weakref.WeakSet()                             # Conexiones vivas (se liberan con su hilo)
+_ruta = None                                                # Ruta forzada (benchmarks, pruebas)
+_generacion = 0                                             # Se incrementa al cerrar todas
+
+
+def configurar_ruta(path):
+    """Cambia la BD usada por las conexiones nuevas y cierra las actuales"""
+    global _ruta
+    cerrar_conexiones()
+    _ruta = path
+
+
+def ruta_actual():
+    """Ruta de la BD en uso"""
+    return _ruta or config.DB_PATH
+
+
+class _Conexion(sqlite3.Connection):
+    """Conexión con soporte de weakref para el registro"""
+
+
+def _abrir(path):
+    """Abre y configura una conexión"""
+    conn = sqlite3.connect(
+        path,
+        timeout=config.DB_BUSY_TIMEOUT_MS / 1000,
+        cached_statements=config.DB_STATEMENT_CACHE,
+        check_same_thread=False,                            # Solo para poder cerrarla al salir
+        factory=_Conexion
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={config.DB_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA busy_timeout={int(config.DB_BUSY_TIMEOUT_MS)}")
+    conn.execute("PRAGMA foreign_keys=ON")
+    with _registro_lock:
+        _conexiones.add(conn)
+    return conn
+
+
+def get_connection():
+    """Devuelve la conexión del hilo actual (la crea si no existe)"""
+    path = ruta_actual()
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != path or _local.generacion != _generacion:
+        conn = _abrir(path)
+        _local.conn = conn
+        _local.path = path
+        _local.generacion = _generacion
+    return conn
+
+
+def cerrar_conexiones():
+    """Cierra todas las conexiones (al salir de la aplicación)"""
+    global _generacion
+    with _registro_lock:
+        conexiones = list(_conexiones)
+        _conexiones.clear()
+        _generacion += 1                                    # Los hilos reabrirán si siguen vivos
+    for conn in conexiones:
+        conn.close()
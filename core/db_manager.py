@@ -3,68 +3,276 @@
 # Gestión de base de datos
 # --------------------------------------------
 
-import sqlite3
+import csv
 import json
-from collections import defaultdict
-from config import DB_PATH, DEVICE_NAME
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from config import (
+    DEVICE_NAME,
+    CREDENTIAL_CACHE_SIZE,
+    CREDENTIAL_CACHE_TTL,
+    USERS_PAGE_SIZE,
+    EVENTS_PAGE_SIZE,
+    EXPORT_CHUNK_SIZE,
+    HISTORY_MAX_ROWS
+)
+from .db_connection import get_connection
+from .event_writer import get_event_writer, notificar_eventos, timestamp_utc
+from .retention import ARCHIVO, adjuntar_archivo, fuente_eventos
+from .analytics import crear_rollups, rebuild_event_rollups
+from .tracing import trazado, crear_tabla_trazas
+
+# Valores de events.result agrupados por tipo ('granted'/'denied' son los
+# valores antiguos que aún aparecen en BDs previas)
+RESULTADOS_PERMITIDOS = ("Entrada Permitida", "granted")
+RESULTADOS_DENEGADOS = ("Entrada Denegada", "denied")
+RESULTADO_SALIDA = "salida"
+
+
+# Caché de credenciales: user_id -> (instante, fila o None), en orden LRU
+_credenciales = OrderedDict()
+_credenciales_lock = threading.Lock()
+
+
+def _sql_en(valores):
+    """Lista SQL literal para IN (...) a partir de constantes internas"""
+    return "(" + ", ".join(f"'{v}'" for v in valores) + ")"
 
 
 def ensure_schema():
     """Crea tablas si no existen"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    conn = get_connection()
 
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS users(
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      name TEXT NOT NULL,
-      pin TEXT NOT NULL,
-      active INTEGER DEFAULT 1,
-      created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-    );
-    """)
+    # auto_vacuum incremental para poder compactar tras archivar eventos
+    # (en BDs ya existentes requiere un VACUUM único)
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
 
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS faces(
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      user_id INTEGER NOT NULL,
-      encoding_json TEXT NOT NULL,
-      created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-      FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
-    );
-    """)
+    with conn:
+        c = conn.cursor()
 
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS events(
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      ts DATETIME DEFAULT CURRENT_TIMESTAMP,
-      device TEXT,
-      user_id INTEGER,
-      result TEXT,
-      note TEXT
-    );
-    """)
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS users(
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          name TEXT NOT NULL,
+          pin TEXT NOT NULL,
+          active INTEGER DEFAULT 1,
+          created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        """)
+
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS faces(
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          user_id INTEGER NOT NULL,
+          encoding_json TEXT NOT NULL,
+          created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+          FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+        );
+        """)
+
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS events(
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          ts DATETIME DEFAULT CURRENT_TIMESTAMP,
+          device TEXT,
+          user_id INTEGER,
+          result TEXT,
+          note TEXT
+        );
+        """)
+
+        c.execute("CREATE INDEX IF NOT EXISTS idx_faces_user ON faces(user_id);")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_events_ts ON events(ts);")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_users_created ON users(created_at, id);")
+        c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_events_user_result_ts
+        ON events(user_id, result, ts);
+        """)
+
+        # Estadísticas por usuario mantenidas por triggers
+        nueva_tabla = c.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='user_stats'"
+        ).fetchone() is None
 
-    c.execute("CREATE INDEX IF NOT EXISTS idx_faces_user ON faces(user_id);")
-    c.execute("CREATE INDEX IF NOT EXISTS idx_events_ts ON events(ts);")
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS user_stats(
+          user_id INTEGER PRIMARY KEY,
+          granted INTEGER NOT NULL DEFAULT 0,
+          denied INTEGER NOT NULL DEFAULT 0,
+          exits INTEGER NOT NULL DEFAULT 0,
+          last_access DATETIME
+        );
+        """)
 
-    conn.commit()
-    conn.close()
+        permitidos = _sql_en(RESULTADOS_PERMITIDOS)
+        denegados = _sql_en(RESULTADOS_DENEGADOS)
+        c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_events_user_stats
+        AFTER INSERT ON events
+        WHEN NEW.user_id IS NOT NULL
+        BEGIN
+          INSERT INTO user_stats(user_id, granted, denied, exits, last_access)
+          VALUES(
+            NEW.user_id,
+            NEW.result IN {permitidos},
+            NEW.result IN {denegados},
+            NEW.result = '{RESULTADO_SALIDA}',
+            CASE WHEN NEW.result IN {permitidos} THEN NEW.ts END
+          )
+          ON CONFLICT(user_id) DO UPDATE SET
+            granted = granted + excluded.granted,
+            denied = denied + excluded.denied,
+            exits = exits + excluded.exits,
+            last_access = CASE
+              WHEN excluded.last_access > COALESCE(last_access, '') THEN excluded.last_access
+              ELSE last_access
+            END;
+        END;
+        """)
+        c.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_users_delete_stats
+        AFTER DELETE ON users
+        BEGIN
+          DELETE FROM user_stats WHERE user_id = OLD.id;
+        END;
+        """)
 
+        # Contador de cambios de la galería: altas, bajas y cambios de las
+        # columnas de las que depende la galería lo incrementan en la misma
+        # transacción, así que las cachés solo tienen que compararlo. El
+        # rehash del PIN al entrar no lo cambia (no regenera instantáneas
+        # ni republica la galería compartida)
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS gallery_version(
+          id INTEGER PRIMARY KEY CHECK (id = 1),
+          version INTEGER NOT NULL
+        );
+        """)
+        c.execute("INSERT OR IGNORE INTO gallery_version(id, version) VALUES(1, 1)")
+        # Versiones anteriores contaban cualquier UPDATE
+        c.execute("DROP TRIGGER IF EXISTS trg_users_update_gallery_version")
+        c.execute("DROP TRIGGER IF EXISTS trg_faces_update_gallery_version")
+        disparadores = {
+            "users_insert": "INSERT ON users",
+            "users_update_of": "UPDATE OF name, active ON users",
+            "users_delete": "DELETE ON users",
+            "faces_insert": "INSERT ON faces",
+            "faces_update_of": "UPDATE OF user_id, encoding_json ON faces",
+            "faces_delete": "DELETE ON faces",
+        }
+        for nombre, evento in disparadores.items():
+            c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{nombre}_gallery_version
+            AFTER {evento}
+            BEGIN
+              UPDATE gallery_version SET version = version + 1 WHERE id = 1;
+            END;
+            """)
 
+        # Agregados de tráfico por hora y día (core/analytics.py)
+        nuevos_rollups = crear_rollups(c)
+
+        # Trazas de latencia por intento (core/tracing.py)
+        crear_tabla_trazas(c)
+
+        # Quién está dentro (core/occupancy.py)
+        from .occupancy import crear_presencia, rebuild_presence
+        nueva_presencia = crear_presencia(c)
+
+        # Búsqueda de texto completo sobre notas y nombres (rowid = events.id).
+        # Las entradas se conservan al archivar para poder buscar también en
+        # el archivo; las búsquedas cruzan con fuente_eventos().
+        nuevo_fts = c.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='events_fts'"
+        ).fetchone() is None
+        c.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(
+          note,
+          user_name,
+          tokenize = 'unicode61 remove_diacritics 2'
+        );
+        """)
+        c.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_events_fts
+        AFTER INSERT ON events
+        BEGIN
+          INSERT INTO events_fts(rowid, note, user_name)
+          VALUES(NEW.id, NEW.note, (SELECT name FROM users WHERE id = NEW.user_id));
+        END;
+        """)
+        c.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_users_name_fts
+        AFTER UPDATE OF name ON users
+        BEGIN
+          UPDATE events_fts SET user_name = NEW.name
+          WHERE rowid IN (SELECT id FROM events WHERE user_id = NEW.id);
+        END;
+        """)
+
+    if nueva_tabla:
+        rebuild_user_stats()
+    if nuevo_fts:
+        rebuild_events_fts()
+    if nuevos_rollups:
+        rebuild_event_rollups()
+    if nueva_presencia:
+        rebuild_presence()
+
+
+def rebuild_user_stats():
+    """Recalcula user_stats desde cero (eventos calientes y archivados)"""
+    conn = get_connection()
+    permitidos = _sql_en(RESULTADOS_PERMITIDOS)
+    denegados = _sql_en(RESULTADOS_DENEGADOS)
+    with conn:
+        conn.execute("DELETE FROM user_stats")
+        conn.execute(f"""
+            INSERT INTO user_stats(user_id, granted, denied, exits, last_access)
+            SELECT user_id,
+                   SUM(result IN {permitidos}),
+                   SUM(result IN {denegados}),
+                   SUM(result = '{RESULTADO_SALIDA}'),
+                   MAX(CASE WHEN result IN {permitidos} THEN ts END)
+            FROM {fuente_eventos(conn)}
+            WHERE user_id IS NOT NULL
+            GROUP BY user_id
+        """)
+
+
+def rebuild_events_fts():
+    """Reconstruye el índice de texto completo (eventos calientes y archivados)"""
+    conn = get_connection()
+    with conn:
+        conn.execute("DELETE FROM events_fts")
+        conn.execute(f"""
+            INSERT INTO events_fts(rowid, note, user_name)
+            SELECT e.id, e.note, u.name
+            FROM {fuente_eventos(conn)} e
+            LEFT JOIN users u ON e.user_id = u.id
+        """)
+
+
+@trazado("db.fetch_active_users")
+def fetch_active_users():
+    """Devuelve dict user_id -> {"name": str, "pin": str} de los usuarios activos"""
+    c = get_connection().cursor()
+    c.execute("SELECT id, name, pin FROM users WHERE active=1")
+    return {uid: {"name": name, "pin": pin} for uid, name, pin in c.fetchall()}
+
+
+@trazado("db.fetch_active_users_and_faces")
 def fetch_active_users_and_faces():
     """
     Devuelve:
       users: dict user_id -> {"name": str, "pin": str}
       faces: dict user_id -> [embedding_list, ...]
     """
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-
-    c.execute("SELECT id, name, pin FROM users WHERE active=1")
-    users_rows = c.fetchall()
-    users = {uid: {"name": name, "pin": pin} for uid, name, pin in users_rows}
+    users = fetch_active_users()
 
+    c = get_connection().cursor()
     c.execute("SELECT user_id, encoding_json FROM faces")
     faces_rows = c.fetchall()
     faces = defaultdict(list)
@@ -75,133 +283,456 @@ def fetch_active_users_and_faces():
         except Exception:
             continue
 
-    conn.close()
     return users, faces
 
 
+@trazado("db.get_user_credentials")
+def get_user_credentials(user_id, active_only=True, use_cache=True):
+    """
+    Nombre y hash del PIN de un usuario con una búsqueda por clave primaria,
+    sin cargar la galería.
+
+    Returns:
+        dict: {"name": str, "pin": str, "active": bool} o None si no existe
+              (o está inactivo con active_only)
+    """
+    usar_cache = use_cache and CREDENTIAL_CACHE_SIZE
+    ahora = time.monotonic()
+    entrada = None
+    if usar_cache:
+        with _credenciales_lock:
+            entrada = _credenciales.get(user_id)
+            if entrada and ahora - entrada[0] < CREDENTIAL_CACHE_TTL:
+                _credenciales.move_to_end(user_id)
+            else:
+                entrada = None
+
+    if entrada is not None:
+        fila = entrada[1]
+    else:
+        c = get_connection().cursor()
+        c.execute("SELECT name, pin, active FROM users WHERE id=?", (user_id,))
+        fila = c.fetchone()
+        if usar_cache:
+            with _credenciales_lock:
+                _credenciales[user_id] = (ahora, fila)
+                _credenciales.move_to_end(user_id)
+                while len(_credenciales) > CREDENTIAL_CACHE_SIZE:
+                    _credenciales.popitem(last=False)
+
+    if fila is None or (active_only and not fila[2]):
+        return None
+    name, pin, active = fila
+    return {"name": name, "pin": pin, "active": bool(active)}
+
+
+def invalidate_user_credentials(user_id=None):
+    """Descarta de la caché un usuario (o todos si user_id es None)"""
+    with _credenciales_lock:
+        if user_id is None:
+            _credenciales.clear()
+        else:
+            _credenciales.pop(user_id, None)
+
+
+@trazado("db.get_gallery_signature")
+def get_gallery_signature():
+    """
+    Versión de la galería: la incrementan los triggers de 'users' y 'faces'
+    en altas, bajas, cambios de nombre, activar/desactivar y cambios de
+    rostros; no en los cambios de PIN. Se devuelve como tupla para
+    compararla y guardarla en las instantáneas.
+    """
+    fila = get_connection().execute("SELECT version FROM gallery_version WHERE id = 1").fetchone()
+    return (fila[0] if fila else 0,)
+
+
+@trazado("db.get_all_users")
 def get_all_users():
     """Obtiene todos los usuarios (activos e inactivos)"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    c = get_connection().cursor()
     c.execute("""
         SELECT id, name, active, created_at,
                (SELECT COUNT(*) FROM faces WHERE user_id = users.id) as face_count
         FROM users
         ORDER BY created_at DESC
     """)
-    users = c.fetchall()
-    conn.close()
-    return users
+    return c.fetchall()
 
 
+@trazado("db.get_users_page")
+def get_users_page(limit=USERS_PAGE_SIZE, after=None, name_filter=None):
+    """
+    Página de usuarios ordenada por (created_at, id) descendente usando
+    paginación por clave (keyset), con filtro opcional por nombre.
+
+    Args:
+        limit: Tamaño de página
+        after: Cursor (created_at, id) devuelto por la página anterior
+        name_filter: Texto a buscar dentro del nombre
+
+    Returns:
+        tuple: (rows, next_cursor). rows tiene el formato de get_all_users();
+               next_cursor es None si no hay más páginas.
+    """
+    condiciones, params = [], []
+    if after is not None:
+        condiciones.append("(created_at, id) < (?, ?)")
+        params.extend(after)
+    if name_filter:
+        condiciones.append("name LIKE ?")
+        params.append(f"%{name_filter}%")
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    params.append(limit)
+
+    c = get_connection().cursor()
+    c.execute(f"""
+        SELECT p.id, p.name, p.active, p.created_at, COUNT(f.id) AS face_count
+        FROM (
+            SELECT id, name, active, created_at FROM users
+            {where}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        ) p
+        LEFT JOIN faces f ON f.user_id = p.id
+        GROUP BY p.id
+        ORDER BY p.created_at DESC, p.id DESC
+    """, params)
+    rows = c.fetchall()
+    next_cursor = (rows[-1][3], rows[-1][0]) if len(rows) == limit else None
+    return rows, next_cursor
+
+
+@trazado("db.insert_user")
 def insert_user(name: str, pinhash: str) -> int:
     """Inserta un nuevo usuario y retorna su ID"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("INSERT INTO users(name, pin) VALUES(?, ?)", (name, pinhash))
-    user_id = c.lastrowid
-    conn.commit()
-    conn.close()
-    return user_id
+    conn = get_connection()
+    with conn:
+        c = conn.execute("INSERT INTO users(name, pin) VALUES(?, ?)", (name, pinhash))
+    invalidate_user_credentials(c.lastrowid)  # Por si se cacheó un 'no existe'
+    return c.lastrowid
 
 
+@trazado("db.insert_face")
 def insert_face(user_id: int, embedding) -> None:
     """Inserta un embedding facial para un usuario"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute(
-        "INSERT INTO faces(user_id, encoding_json) VALUES(?, ?)",
-        (user_id, json.dumps(list(embedding)))
-    )
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "INSERT INTO faces(user_id, encoding_json) VALUES(?, ?)",
+            (user_id, json.dumps(list(embedding)))
+        )
 
 
+@trazado("db.update_user_status")
 def update_user_status(user_id: int, active: bool):
     """Activa o desactiva un usuario"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("UPDATE users SET active=? WHERE id=?", (1 if active else 0, user_id))
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    with conn:
+        conn.execute("UPDATE users SET active=? WHERE id=?", (1 if active else 0, user_id))
+    invalidate_user_credentials(user_id)
+
 
+@trazado("db.update_user_pin")
+def update_user_pin(user_id: int, pin_hash: str):
+    """Sustituye el hash del PIN de un usuario"""
+    conn = get_connection()
+    with conn:
+        conn.execute("UPDATE users SET pin=? WHERE id=?", (pin_hash, user_id))
+    invalidate_user_credentials(user_id)
 
+
+@trazado("db.delete_user")
 def delete_user(user_id: int):
     """Elimina un usuario y todos sus rostros"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("DELETE FROM users WHERE id=?", (user_id,))
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    with conn:
+        conn.execute("DELETE FROM users WHERE id=?", (user_id,))
+    invalidate_user_credentials(user_id)
 
 
-def log_event(user_id, result, note=""):
-    """Registra un evento de acceso"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute(
-        "INSERT INTO events(device, user_id, result, note) VALUES(?,?,?,?)",
-        (DEVICE_NAME, user_id, result, note)
-    )
-    conn.commit()
-    conn.close()
+@trazado("db.log_event")
+def log_event(user_id, result, note="", device=None):
+    """
+    Registra un evento de acceso (device por defecto: DEVICE_NAME).
+    Si el escritor asíncrono está activo solo se encola.
+    """
+    writer = get_event_writer()
+    if writer is not None:
+        writer.encolar(user_id, result, note, device or DEVICE_NAME)
+        return
+    fila = (timestamp_utc(), device or DEVICE_NAME, user_id, result, note)
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "INSERT INTO events(ts, device, user_id, result, note) VALUES(?,?,?,?,?)",
+            fila
+        )
+    notificar_eventos([fila])
 
 
+@trazado("db.get_recent_events")
 def get_recent_events(limit=50):
     """Obtiene los eventos más recientes"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    c = get_connection().cursor()
     c.execute("""
-        SELECT e.id, e.ts, e.device, u.name, e.result, e.note 
+        SELECT e.id, e.ts, e.device, u.name, e.result, e.note
         FROM events e
         LEFT JOIN users u ON e.user_id = u.id
         ORDER BY e.ts DESC
         LIMIT ?
     """, (limit,))
-    events = c.fetchall()
-    conn.close()
-    return events
+    return c.fetchall()
+
 
+def _filtros_eventos(desde=None, hasta=None, user_id=None, device=None, result=None):
+    """Condiciones WHERE y parámetros comunes a las consultas de eventos"""
+    condiciones, params = [], []
+    if desde:
+        condiciones.append("e.ts >= ?")
+        params.append(desde)
+    if hasta:
+        condiciones.append("e.ts <= ?")
+        params.append(hasta)
+    if user_id is not None:
+        condiciones.append("e.user_id = ?")
+        params.append(user_id)
+    if device:
+        condiciones.append("e.device = ?")
+        params.append(device)
+    if result:
+        # Un valor o una colección (p. ej. RESULTADOS_PERMITIDOS)
+        valores = [result] if isinstance(result, str) else list(result)
+        condiciones.append(f"e.result IN ({', '.join('?' * len(valores))})")
+        params.extend(valores)
+    return condiciones, params
+
+
+@trazado("db.query_events")
+def query_events(desde=None, hasta=None, user_id=None, device=None, result=None,
+                 limit=EVENTS_PAGE_SIZE, before=None):
+    """
+    Página de eventos filtrada, más recientes primero, con paginación por
+    clave sobre (ts, id). Incluye los eventos archivados.
 
+    Args:
+        desde, hasta: Rango de fechas 'YYYY-MM-DD[ HH:MM:SS]' (inclusive)
+        user_id: Solo eventos de este usuario
+        device: Solo eventos de este dispositivo
+        result: Valor o colección de valores de result
+        limit: Tamaño de página
+        before: Cursor (ts, id) devuelto por la página anterior
+
+    Returns:
+        tuple: (rows, next_cursor). rows tiene el formato de get_recent_events();
+               next_cursor es None si no hay más páginas.
+    """
+    conn = get_connection()
+    condiciones, params = _filtros_eventos(desde, hasta, user_id, device, result)
+    if before is not None:
+        condiciones.append("(e.ts, e.id) < (?, ?)")
+        params.extend(before)
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    params.append(limit)
+
+    rows = conn.execute(f"""
+        SELECT e.id, e.ts, e.device, u.name, e.result, e.note
+        FROM {fuente_eventos(conn)} e
+        LEFT JOIN users u ON e.user_id = u.id
+        {where}
+        ORDER BY e.ts DESC, e.id DESC
+        LIMIT ?
+    """, params).fetchall()
+    next_cursor = (rows[-1][1], rows[-1][0]) if len(rows) == limit else None
+    return rows, next_cursor
+
+
+def _consulta_fts(texto):
+    """
+    Convierte el texto del usuario en una consulta FTS5 segura: cada
+    palabra se busca como frase literal y la última también como prefijo.
+    """
+    trozos = [t.replace('"', '""') for t in texto.split()]
+    if not trozos:
+        return None
+    return " ".join(f'"{t}"' for t in trozos) + "*"
+
+
+@trazado("db.search_events")
+def search_events(texto, limit=EVENTS_PAGE_SIZE, **filtros):
+    """
+    Busca eventos por texto en las notas y el nombre de usuario, ordenados
+    por relevancia (bm25). Admite los mismos filtros que query_events().
+
+    Returns:
+        list: filas con el formato de get_recent_events()
+    """
+    consulta = _consulta_fts(texto)
+    if consulta is None:
+        return []
+    conn = get_connection()
+    # Una rama por tabla para que cada una busque por clave primaria
+    # (unir con fuente_eventos() materializaría la unión completa)
+    tablas = ["main.events"]
+    if adjuntar_archivo(conn, crear=False):
+        tablas.append(f"{ARCHIVO}.events")
+    ramas = " UNION ALL ".join(f"""
+        SELECT x.id, x.ts, x.device, x.user_id, x.result, x.note, events_fts.rank AS rango
+        FROM events_fts JOIN {tabla} x ON x.id = events_fts.rowid
+        WHERE events_fts MATCH ?""" for tabla in tablas)
+
+    condiciones, params = _filtros_eventos(**filtros)
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    return conn.execute(f"""
+        SELECT e.id, e.ts, e.device, u.name, e.result, e.note
+        FROM ({ramas}) e
+        LEFT JOIN users u ON e.user_id = u.id
+        {where}
+        ORDER BY e.rango
+        LIMIT ?
+    """, [consulta] * len(tablas) + params + [limit]).fetchall()
+
+
+@trazado("db.get_last_event_id")
+def get_last_event_id():
+    """ID del último evento insertado (0 si no hay eventos)"""
+    c = get_connection().cursor()
+    c.execute("SELECT COALESCE(MAX(id), 0) FROM events")
+    return c.fetchone()[0]
+
+
+@trazado("db.get_events_since")
+def get_events_since(last_id, limit=HISTORY_MAX_ROWS, upto_id=None, **filtros):
+    """
+    Eventos con id mayor que 'last_id' (y hasta 'upto_id' si se indica),
+    en orden de inserción, con los mismos filtros que query_events().
+    Pensado para refrescar el historial en vivo: recorre solo la cola de
+    la clave primaria.
+
+    Returns:
+        list: filas con el formato de get_recent_events()
+    """
+    condiciones, params = _filtros_eventos(**filtros)
+    condiciones.insert(0, "e.id > ?")
+    params.insert(0, last_id)
+    if upto_id is not None:
+        condiciones.append("e.id <= ?")
+        params.append(upto_id)
+    params.append(limit)
+    c = get_connection().cursor()
+    c.execute(f"""
+        SELECT e.id, e.ts, e.device, u.name, e.result, e.note
+        FROM events e
+        LEFT JOIN users u ON e.user_id = u.id
+        WHERE {' AND '.join(condiciones)}
+        ORDER BY e.id
+        LIMIT ?
+    """, params)
+    return c.fetchall()
+
+
+def iter_events(desde=None, hasta=None, user_id=None, device=None, result=None,
+                chunk=EXPORT_CHUNK_SIZE):
+    """
+    Generador de eventos filtrados en orden cronológico. Lee del cursor en
+    bloques de 'chunk' filas, sin cargar el resultado completo en memoria.
+
+    Yields:
+        tuple: (id, ts, device, user_id, user_name, result, note)
+    """
+    conn = get_connection()
+    condiciones, params = _filtros_eventos(desde, hasta, user_id, device, result)
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    cursor = conn.execute(f"""
+        SELECT e.id, e.ts, e.device, e.user_id, u.name, e.result, e.note
+        FROM {fuente_eventos(conn)} e
+        LEFT JOIN users u ON e.user_id = u.id
+        {where}
+        ORDER BY e.ts, e.id
+    """, params)
+    try:
+        while True:
+            filas = cursor.fetchmany(chunk)
+            if not filas:
+                return
+            yield from filas
+    finally:
+        cursor.close()
+
+
+@trazado("db.export_events_csv")
+def export_events_csv(destino, **filtros):
+    """
+    Exporta a CSV todos los eventos que cumplan los filtros de iter_events().
+
+    Args:
+        destino: Ruta del fichero o fichero de texto ya abierto
+
+    Returns:
+        int: número de eventos exportados
+    """
+    if isinstance(destino, str):
+        with open(destino, "w", newline="", encoding="utf-8") as f:
+            return export_events_csv(f, **filtros)
+
+    writer = csv.writer(destino)
+    writer.writerow(["ID", "Fecha/Hora", "Dispositivo", "Usuario ID", "Usuario", "Resultado", "Notas"])
+    total = 0
+    for event_id, ts, device, user_id, nombre, result, note in iter_events(**filtros):
+        writer.writerow([event_id, ts, device, user_id, nombre or "", result, note or ""])
+        total += 1
+    return total
+
+
+@trazado("db.get_user_stats")
 def get_user_stats(user_id: int):
-    """Obtiene estadísticas de un usuario"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    # Total de accesos
-    c.execute("""
-        SELECT COUNT(*) FROM events 
-        WHERE user_id = ? AND result = 'granted'
-    """, (user_id,))
-    total_accesos = c.fetchone()[0]
-    
-    # Accesos denegados
-    c.execute("""
-        SELECT COUNT(*) FROM events 
-        WHERE user_id = ? AND result = 'denied'
-    """, (user_id,))
-    accesos_denegados = c.fetchone()[0]
-    
-    # Último acceso
+    """Obtiene estadísticas de un usuario (una sola consulta sobre user_stats)"""
+    c = get_connection().cursor()
     c.execute("""
-        SELECT ts FROM events 
-        WHERE user_id = ? AND result = 'granted' 
-        ORDER BY ts DESC LIMIT 1
+        SELECT COALESCE(s.granted, 0), COALESCE(s.denied, 0), COALESCE(s.exits, 0),
+               s.last_access,
+               (SELECT COUNT(*) FROM faces WHERE user_id = q.uid)
+        FROM (SELECT ? AS uid) q
+        LEFT JOIN user_stats s ON s.user_id = q.uid
     """, (user_id,))
-    row = c.fetchone()
-    ultimo_acceso = row[0] if row else "Nunca"
-    
-    # Número de rostros registrados
-    c.execute("""
-        SELECT COUNT(*) FROM faces WHERE user_id = ?
-    """, (user_id,))
-    num_rostros = c.fetchone()[0]
-    
-    conn.close()
-    
+    total_accesos, accesos_denegados, salidas, ultimo_acceso, num_rostros = c.fetchone()
+
     return {
         'total_accesos': total_accesos,
         'accesos_denegados': accesos_denegados,
-        'ultimo_acceso': ultimo_acceso,
+        'salidas': salidas,
+        'ultimo_acceso': ultimo_acceso or "Nunca",
         'num_rostros': num_rostros
-    }
\ No newline at end of file
+    }
+
+
+@trazado("db.get_all_user_stats")
+def get_all_user_stats():
+    """
+    Estadísticas de todos los usuarios en una sola consulta.
+
+    Returns:
+        dict: user_id -> {'nombre', 'total_accesos', 'accesos_denegados',
+                          'salidas', 'ultimo_acceso', 'num_rostros'}
+    """
+    c = get_connection().cursor()
+    c.execute("""
+        SELECT u.id, u.name,
+               COALESCE(s.granted, 0), COALESCE(s.denied, 0), COALESCE(s.exits, 0),
+               s.last_access, COALESCE(f.num, 0)
+        FROM users u
+        LEFT JOIN user_stats s ON s.user_id = u.id
+        LEFT JOIN (SELECT user_id, COUNT(*) AS num FROM faces GROUP BY user_id) f
+               ON f.user_id = u.id
+    """)
+    return {
+        uid: {
+            'nombre': nombre,
+            'total_accesos': granted,
+            'accesos_denegados': denied,
+            'salidas': exits,
+            'ultimo_acceso': last_access or "Nunca",
+            'num_rostros': num_rostros
+        }
+        for uid, nombre, granted, denied, exits, last_access, num_rostros in c.fetchall()
+    }
@@ -0,0 +1,329 @@
+# core/event_writer.py
+# --------------------------------------------
+# Escritura asíncrona de eventos por lotes
+# --------------------------------------------
+# log_event() solo encola el evento; un único hilo escritor lo inserta en
+# SQLite agrupando varios eventos por transacción (group commit) según
+# tamaño de lote o tiempo. Si SQLite no está disponible, los eventos se
+# guardan en un fichero de spool (JSON lines) y se reinsertan después.
+#
+# Para reinsertar, el spool se renombra antes (spool.<token>.reenvio) y el
+# token se anota en 'event_spool_replays' en la misma transacción que los
+# eventos: si el proceso muere antes de borrar el fichero, al volver se ve
+# que ese token ya está en la BD y no se duplican eventos. Las filas que
+# SQLite rechaza por sí mismas (tipos no válidos...) se apartan en
+# spool.rechazados para no bloquear al resto.
+#
+# Los oyentes registrados con registrar_oyente() reciben cada lote después
+# de confirmarse en la BD (p. ej. el índice de ocupación en memoria).
+
+import glob
+import json
+import os
+import queue
+import secrets
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from config import EVENT_BATCH_SIZE, EVENT_FLUSH_INTERVAL, EVENT_SPOOL_PATH
+from .db_connection import get_connection
+
+INSERT_EVENT_SQL = (
+    "INSERT INTO events(ts, device, user_id, result, note) VALUES(?,?,?,?,?)"
+)
+
+_FIN = object()                                             # Marca de parada de la cola
+
+# Errores de una fila concreta (no de disponibilidad de la BD)
+_ERRORES_FILA = (
+    sqlite3.IntegrityError,
+    sqlite3.InterfaceError,
+    sqlite3.ProgrammingError,
+    sqlite3.DataError,
+    OverflowError,
+    ValueError,
+    TypeError,
+)
+
+_oyentes = []                                               # Callbacks oyente(filas)
+
+
+def timestamp_utc():
+    """Marca de tiempo con el mismo formato que CURRENT_TIMESTAMP"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def registrar_oyente(oyente):
+    """
+    Registra oyente(filas), llamado con cada grupo de eventos confirmado en
+    la BD por este proceso. filas: [(ts, device, user_id, result, note)]
+    """
+    if oyente not in _oyentes:
+        _oyentes.append(oyente)
+
+
+def notificar_eventos(filas):
+    """Avisa a los oyentes; un oyente con errores no afecta a la escritura"""
+    for oyente in list(_oyentes):
+        try:
+            oyente(filas)
+        except Exception as e:
+            print(f"[event-writer] error en oyente: {e}")
+
+
+class EventWriter:
+    """Cola de eventos con un hilo escritor"""
+
+    def __init__(self, batch_size=EVENT_BATCH_SIZE, flush_interval=EVENT_FLUSH_INTERVAL,
+                 spool_path=EVENT_SPOOL_PATH):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_path = spool_path
+        self._cola = queue.Queue()
+        self._hilo = None
+        self._stats_lock = threading.Lock()
+        self.eventos_escritos = 0
+        self.lotes = 0
+        self.eventos_spool = 0
+        self.ultima_latencia_ms = 0.0
+        self.max_latencia_ms = 0.0
+        self._total_latencia_ms = 0.0
+
+    # ---------- API pública ----------
+
+    def iniciar(self):
+        """Arranca el hilo escritor"""
+        if self._hilo is None or not self._hilo.is_alive():
+            self._hilo = threading.Thread(target=self._bucle, name="event-writer", daemon=True)
+            self._hilo.start()
+
+    def activo(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def encolar(self, user_id, result, note="", device=None):
+        """Encola un evento; la hora se toma en el momento de la llamada"""
+        self._cola.put((timestamp_utc(), device, user_id, result, note))
+
+    def detener(self, timeout=10):
+        """Vacía la cola pendiente y para el hilo escritor"""
+        if self.activo():
+            self._cola.put(_FIN)
+            self._hilo.join(timeout)
+
+    def estadisticas(self):
+        """Profundidad de cola y latencias de volcado"""
+        with self._stats_lock:
+            return {
+                "pendientes": self._cola.qsize(),
+                "eventos_escritos": self.eventos_escritos,
+                "lotes": self.lotes,
+                "eventos_spool": self.eventos_spool,
+                "ultima_latencia_ms": round(self.ultima_latencia_ms, 3),
+                "media_latencia_ms": round(self._total_latencia_ms / self.lotes, 3) if self.lotes else 0.0,
+                "max_latencia_ms": round(self.max_latencia_ms, 3),
+            }
+
+    # ---------- Hilo escritor ----------
+
+    def _bucle(self):
+        """Agrupa eventos en lotes y los vuelca"""
+        self._reintentar_spool_seguro()
+        terminar = False
+        while not terminar:
+            item = self._cola.get()
+            if item is _FIN:
+                break
+            lote = [item]
+            limite = time.monotonic() + self.flush_interval
+            while len(lote) < self.batch_size:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    item = self._cola.get(timeout=restante)
+                except queue.Empty:
+                    break
+                if item is _FIN:
+                    terminar = True
+                    break
+                lote.append(item)
+            self._volcar_seguro(lote)
+
+        # Drenado final: lo que quede en cola se vuelca de una vez
+        resto = []
+        while True:
+            try:
+                item = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _FIN:
+                resto.append(item)
+        if resto:
+            self._volcar_seguro(resto)
+
+    def _volcar_seguro(self, lote):
+        """_volcar() sin dejar que un error inesperado pare el hilo"""
+        try:
+            self._volcar(lote)
+        except Exception as e:
+            print(f"[event-writer] error al volcar {len(lote)} eventos (perdidos): {e!r}")
+
+    def _insertar(self, filas, token=None):
+        """
+        Inserta un lote en una sola transacción (y el token de reenvío del
+        spool, si lo hay). Si alguna fila no es válida se insertan una a una
+        y las rechazadas se apartan.
+
+        Returns:
+            list: filas insertadas
+
+        Raises:
+            sqlite3.Error: Si la BD no está disponible (nada insertado)
+        """
+        conn = get_connection()
+        if token:
+            conn.execute("CREATE TABLE IF NOT EXISTS event_spool_replays(token TEXT PRIMARY KEY)")
+        try:
+            with conn:
+                conn.executemany(INSERT_EVENT_SQL, filas)
+                if token:
+                    conn.execute("INSERT INTO event_spool_replays(token) VALUES(?)", (token,))
+            return list(filas)
+        except _ERRORES_FILA:
+            pass
+
+        insertadas, rechazadas = [], []
+        with conn:
+            for fila in filas:
+                try:
+                    conn.execute(INSERT_EVENT_SQL, fila)
+                    insertadas.append(fila)
+                except _ERRORES_FILA as e:
+                    rechazadas.append((fila, repr(e)))
+            if token:
+                conn.execute("INSERT INTO event_spool_replays(token) VALUES(?)", (token,))
+        self._apartar(rechazadas)
+        return insertadas
+
+    def _apartar(self, rechazadas):
+        """Guarda en spool.rechazados las filas que SQLite no acepta"""
+        if not rechazadas:
+            return
+        print(f"[event-writer] {len(rechazadas)} eventos no válidos apartados en {self.spool_path}.rechazados")
+        with open(f"{self.spool_path}.rechazados", "a", encoding="utf-8") as f:
+            for fila, error in rechazadas:
+                f.write(json.dumps({"fila": fila, "error": error}, default=str) + "\n")
+
+    def _volcar(self, lote):
+        """Escribe un lote en SQLite o, si falla, en el spool"""
+        inicio = time.perf_counter()
+        try:
+            escritas = self._insertar(lote)
+        except sqlite3.Error as e:
+            print(f"[event-writer] SQLite no disponible ({e}); {len(lote)} eventos a spool")
+            self._escribir_spool(lote)
+            return
+        latencia = (time.perf_counter() - inicio) * 1000
+        with self._stats_lock:
+            self.eventos_escritos += len(escritas)
+            self.lotes += 1
+            self.ultima_latencia_ms = latencia
+            self.max_latencia_ms = max(self.max_latencia_ms, latencia)
+            self._total_latencia_ms += latencia
+        if escritas:
+            notificar_eventos(escritas)
+        self._reintentar_spool_seguro()
+
+    def _escribir_spool(self, lote):
+        """Añade eventos al fichero de spool"""
+        with open(self.spool_path, "a", encoding="utf-8") as f:
+            for fila in lote:
+                f.write(json.dumps(fila, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        with self._stats_lock:
+            self.eventos_spool += len(lote)
+
+    def _reintentar_spool_seguro(self):
+        try:
+            self._reintentar_spool()
+        except Exception as e:
+            print(f"[event-writer] error al reinsertar el spool (se reintentará): {e!r}")
+
+    def _reintentar_spool(self):
+        """Reinserta los eventos del spool si SQLite vuelve a estar disponible"""
+        if os.path.exists(self.spool_path):
+            # Renombrado atómico: lo que se encole a spool desde aquí va a un
+            # fichero nuevo y este queda ligado a su token
+            token = secrets.token_hex(8)
+            os.replace(self.spool_path, f"{self.spool_path}.{token}.reenvio")
+
+        patron = glob.escape(self.spool_path) + ".*.reenvio"
+        for ruta in sorted(glob.glob(patron), key=os.path.getmtime):
+            token = ruta[len(self.spool_path) + 1:-len(".reenvio")]
+            if not self._reenviar(ruta, token):
+                return                                      # Se reintentará en el próximo lote
+
+    def _reenviar(self, ruta, token):
+        """Inserta un fichero de reenvío; False si la BD sigue sin estar disponible"""
+        conn = get_connection()
+        try:
+            ya_insertado = conn.execute(
+                "SELECT 1 FROM event_spool_replays WHERE token = ?", (token,)
+            ).fetchone() is not None
+        except sqlite3.OperationalError:
+            ya_insertado = False                            # Tabla aún sin crear (o BD caída)
+        if ya_insertado:
+            os.remove(ruta)                                 # Se cortó entre el commit y el borrado
+            return True
+
+        filas, rechazadas = [], []
+        with open(ruta, "r", encoding="utf-8") as f:
+            for linea in f:
+                if not linea.strip():
+                    continue
+                try:
+                    filas.append(tuple(json.loads(linea)))
+                except ValueError as e:                     # Línea cortada por una caída
+                    rechazadas.append((linea.rstrip("\n"), repr(e)))
+        try:
+            escritas = self._insertar(filas, token) if filas else []
+        except sqlite3.Error:
+            return False
+        self._apartar(rechazadas)
+        os.remove(ruta)
+        with self._stats_lock:
+            self.eventos_escritos += len(escritas)
+            self.eventos_spool = max(0, self.eventos_spool - len(filas))
+        if escritas:
+            notificar_eventos(escritas)
+        return True
+
+
+# ==================== INSTANCIA GLOBAL ====================
+
+_writer = None
+
+
+def iniciar_event_writer(**kwargs):
+    """Crea (si hace falta) y arranca el escritor global"""
+    global _writer
+    if _writer is None:
+        _writer = EventWriter(**kwargs)
+    _writer.iniciar()
+    return _writer
+
+
+def get_event_writer():
+    """Escritor global activo, o None si log_event debe escribir directamente"""
+    if _writer is not None and _writer.activo():
+        return _writer
+    return None
+
+
+def detener_event_writer(timeout=10):
+    """Vacía y detiene el escritor global"""
+    if _writer is not None:
+        _writer.detener(timeout)
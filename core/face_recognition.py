@@ -12,10 +12,13 @@ warnings.filterwarnings('ignore', category=DeprecationWarning)
 warnings.filterwarnings('ignore', category=FutureWarning)
 
 import math
+import numpy as np
 from deepface import DeepFace
 from config import FACE_MODEL, FACE_DETECTOR
+from .tracing import trazado
 
 
+@trazado("deepface.embedding")
 def get_embedding_deepface(frame_bgr):
     """
     Obtiene el embedding facial con DeepFace.
@@ -40,6 +43,62 @@ def get_embedding_deepface(frame_bgr):
     return reps[0]["embedding"]
 
 
+@trazado("deepface.lote")
+def get_embeddings_deepface(frames_bgr):
+    """
+    Embeddings de varios frames con una sola pasada del modelo. La
+    detección y el alineado de cada cara siguen siendo por imagen; lo que
+    se agrupa es la inferencia de la red, que es la parte cara.
+    
+    Args:
+        frames_bgr: Lista de frames BGR de OpenCV
+        
+    Returns:
+        list: Por cada frame, su embedding o la excepción ValueError si no
+              se detectó rostro (mismo orden que la entrada)
+    """
+    try:
+        from deepface.commons import functions
+        modelo = DeepFace.build_model(FACE_MODEL)
+        tamano = functions.find_target_size(model_name=FACE_MODEL)
+    except (ImportError, AttributeError):
+        # DeepFace sin estas utilidades: una pasada por imagen
+        resultados = []
+        for frame in frames_bgr:
+            try:
+                resultados.append(get_embedding_deepface(frame))
+            except ValueError as e:
+                resultados.append(e)
+        return resultados
+    
+    resultados = [None] * len(frames_bgr)
+    caras, indices = [], []
+    for i, frame in enumerate(frames_bgr):
+        try:
+            objs = functions.extract_faces(
+                img=frame,
+                target_size=tamano,
+                detector_backend=FACE_DETECTOR,
+                grayscale=False,
+                enforce_detection=True,
+                align=True
+            )
+        except ValueError as e:
+            resultados[i] = e
+            continue
+        if not objs:
+            resultados[i] = ValueError("No se detectó rostro en la imagen")
+            continue
+        caras.append(functions.normalize_input(img=objs[0][0], normalization="base"))
+        indices.append(i)
+    
+    if caras:
+        embeddings = modelo.predict(np.concatenate(caras), verbose=0)
+        for i, emb in zip(indices, embeddings):
+            resultados[i] = emb.tolist()
+    return resultados
+
+
 def cosine_similarity(a, b):
     """Similitud coseno entre dos embeddings"""
     num = sum(x * y for x, y in zip(a, b))
@@ -47,6 +106,7 @@ def cosine_similarity(a, b):
     return (num / den) if den else 0.0
 
 
+@trazado("coincidencia.best_match")
 def best_match_per_user(query_emb, faces_by_user):
     """
     Encuentra el mejor match entre usuarios.
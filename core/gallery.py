@@ -0,0 +1,60 @@
+# core/gallery.py
+# --------------------------------------------
+# Caché compartida de la galería de rostros
+# --------------------------------------------
+# Mantiene en memoria usuarios activos y embeddings para que varias
+# puertas del mismo proceso no relean SQLite en cada intento. Con
+# GALLERY_USE_SNAPSHOT los embeddings se sirven desde la instantánea
+# .npy mapeada en memoria en lugar de parsear el JSON de cada rostro.
+
+import threading
+import time
+
+from config import GALLERY_REFRESH_SECONDS, GALLERY_USE_SNAPSHOT
+from .db_manager import fetch_active_users, fetch_active_users_and_faces, get_gallery_signature
+from .gallery_snapshot import cargar_o_regenerar
+
+
+class GalleryCache:
+    """Galería (users, faces) compartida entre hilos"""
+
+    def __init__(self, refresh_seconds=GALLERY_REFRESH_SECONDS, snapshot=GALLERY_USE_SNAPSHOT):
+        self.refresh_seconds = refresh_seconds
+        self.snapshot = snapshot
+        self._lock = threading.Lock()
+        self._users = {}
+        self._faces = {}
+        self._firma = None
+        self._ultima_comprobacion = 0.0
+        self.recargas = 0                                   # Estadística: nº de recargas
+
+    def invalidar(self):
+        """Fuerza la recarga en la próxima consulta"""
+        with self._lock:
+            self._firma = None
+            self._ultima_comprobacion = 0.0
+
+    def obtener(self):
+        """
+        Devuelve (users, faces) recargando solo si la BD cambió. 'faces'
+        tiene el formato de fetch_active_users_and_faces() o, con
+        instantánea, es un GallerySnapshot.
+        """
+        with self._lock:
+            ahora = time.monotonic()
+            if self._firma is None or ahora - self._ultima_comprobacion >= self.refresh_seconds:
+                firma = get_gallery_signature()
+                if firma != self._firma:
+                    faces = cargar_o_regenerar(firma) if self.snapshot else None
+                    if faces is not None:
+                        self._users, self._faces = fetch_active_users(), faces
+                        self._firma = firma
+                    else:
+                        # Sin instantánea (o no se pudo abrir): desde SQLite.
+                        # Si la instantánea falló no se guarda la firma, para
+                        # reintentarla en la próxima consulta
+                        self._users, self._faces = fetch_active_users_and_faces()
+                        self._firma = None if self.snapshot else firma
+                    self.recargas += 1
+                self._ultima_comprobacion = ahora
+            return self._users, self._faces
@@ -0,0 +1,329 @@
+# core/gallery_shm.py
+# --------------------------------------------
+# Galería publicada en memoria compartida para varias puertas
+# --------------------------------------------
+# Un proceso publicador vuelca la matriz de embeddings normalizados, los
+# user_id y los usuarios activos (solo id y nombre) en un segmento de
+# multiprocessing.shared_memory. Los procesos de puerta de la misma
+# máquina se adjuntan sin copiar nada: la memoria no crece al añadir
+# puertas y ninguna puerta vuelve a leer SQLite para la galería.
+#
+# Los hashes de PIN no se publican: el segmento queda fuera de los
+# permisos del fichero de la BD. Las puertas los piden con
+# get_user_credentials() al comprobar un PIN.
+#
+# Cada actualización crea un segmento nuevo (generación) y después cambia
+# el segmento de control, protegido por un contador de secuencia
+# (seqlock): una puerta ve la galería anterior o la nueva, nunca una
+# mezcla. La generación anterior se conserva hasta la siguiente para que
+# los lectores que la estén usando no pierdan el mapeo.
+#
+# El control lleva además la época del publicador (aleatoria en cada
+# arranque). Los lectores vuelven a abrir el control por nombre cada
+# GALLERY_REFRESH_SECONDS y, si la época cambió (el publicador se
+# reinició y creó un control nuevo), se adjuntan al nuevo. Un publicador
+# que arranca tras un SIGKILL borra el control y la generación que dejó el
+# anterior y los vuelve a crear.
+#
+#   python -m core.gallery_shm          # publicador (déjalo corriendo)
+#   python headless.py --galeria-compartida
+
+import json
+import secrets
+import struct
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from config import GALLERY_SHM_NAME, GALLERY_REFRESH_SECONDS
+from .db_manager import fetch_active_users, get_gallery_signature
+from .gallery_snapshot import GallerySnapshot, construir_matriz
+
+MAGIC = b"LANAIGAL"
+
+# Control: magic, secuencia (impar = escribiendo), época, generación, nombre del segmento
+CONTROL = struct.Struct("<8sQQQ64s")
+# Datos: magic, generación, filas, dimensión, tamaño del bloque JSON de usuarios
+CABECERA = struct.Struct("<8sQQQQ")
+ALINEACION = 64
+
+
+def _alinear(n):
+    return (n + ALINEACION - 1) // ALINEACION * ALINEACION
+
+
+def _adjuntar(nombre):
+    """
+    Se adjunta a un segmento existente sin registrarlo en el
+    resource_tracker, que lo borraría al salir este proceso (Python < 3.13).
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=nombre, track=False)
+    segmento = shared_memory.SharedMemory(name=nombre)
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(segmento._name, "shared_memory")
+    except Exception:
+        pass
+    return segmento
+
+
+def _vistas(buf, filas, dim, desplazamiento):
+    """Vistas numpy de solo lectura sobre la matriz y los user_id"""
+    tam_matriz = filas * dim * 4
+    matriz = np.ndarray((filas, dim), dtype=np.float32, buffer=buf, offset=desplazamiento)
+    inicio_ids = _alinear(desplazamiento + tam_matriz)
+    user_ids = np.ndarray((filas,), dtype=np.int64, buffer=buf, offset=inicio_ids)
+    matriz.flags.writeable = False
+    user_ids.flags.writeable = False
+    return matriz, user_ids, _alinear(inicio_ids + filas * 8)
+
+
+# ==================== PUBLICADOR ====================
+
+class GalleryPublisher:
+    """Publica la galería de la BD en memoria compartida"""
+
+    def __init__(self, nombre=GALLERY_SHM_NAME, refresh_seconds=GALLERY_REFRESH_SECONDS):
+        self.nombre = nombre
+        self.refresh_seconds = refresh_seconds
+        self.generacion = 0
+        self.epoca = secrets.randbits(32)                   # Distingue este arranque de los anteriores
+        self._firma = None
+        self._segmentos = []                                # [anterior, actual]
+        try:
+            self._control = self._crear_control()
+        except FileExistsError:
+            self._borrar_restos()                           # Publicador anterior terminado sin cerrar()
+            self._control = self._crear_control()
+        CONTROL.pack_into(self._control.buf, 0, MAGIC, 0, self.epoca, 0, b"")
+        self._activo = True
+
+    def _crear_control(self):
+        return shared_memory.SharedMemory(name=self.nombre, create=True, size=CONTROL.size)
+
+    def _borrar_restos(self):
+        """Borra el control huérfano y la última generación que publicaba"""
+        control = shared_memory.SharedMemory(name=self.nombre)
+        try:
+            magic, _, _, _, nombre = CONTROL.unpack_from(control.buf, 0)
+            nombre = nombre.rstrip(b"\0").decode() if magic == MAGIC else ""
+        except (struct.error, UnicodeDecodeError):
+            nombre = ""
+        control.close()
+        control.unlink()
+        if nombre:
+            try:
+                huerfano = shared_memory.SharedMemory(name=nombre)
+                huerfano.close()
+                huerfano.unlink()
+            except FileNotFoundError:
+                pass
+
+    def publicar(self):
+        """Crea una nueva generación con el estado actual de la BD"""
+        firma = get_gallery_signature()
+        matriz, user_ids = construir_matriz()
+        users = fetch_active_users()
+        bloque = json.dumps({
+            "version": list(firma),
+            "users": {str(uid): {"name": u["name"]} for uid, u in users.items()},
+        }).encode("utf-8")
+
+        filas, dim = matriz.shape
+        inicio = _alinear(CABECERA.size)
+        fin_ids = _alinear(_alinear(inicio + filas * dim * 4) + filas * 8)
+        generacion = self.generacion + 1
+        segmento = shared_memory.SharedMemory(
+            name=f"{self.nombre}_{self.epoca:08x}_{generacion}",
+            create=True,
+            size=max(fin_ids + len(bloque), 1)
+        )
+        CABECERA.pack_into(segmento.buf, 0, MAGIC, generacion, filas, dim, len(bloque))
+        destino_matriz, destino_ids, fin = _vistas(segmento.buf, filas, dim, inicio)
+        destino_matriz.flags.writeable = True
+        destino_ids.flags.writeable = True
+        destino_matriz[:] = matriz
+        destino_ids[:] = user_ids
+        segmento.buf[fin:fin + len(bloque)] = bloque
+        del destino_matriz, destino_ids
+
+        # Cambio de generación (seqlock)
+        secuencia = CONTROL.unpack_from(self._control.buf, 0)[1]
+        struct.pack_into("<Q", self._control.buf, 8, secuencia + 1)
+        CONTROL.pack_into(self._control.buf, 0, MAGIC, secuencia + 1, self.epoca, generacion,
+                          segmento.name.encode())
+        struct.pack_into("<Q", self._control.buf, 8, secuencia + 2)
+
+        self.generacion = generacion
+        self._firma = firma
+        self._segmentos.append(segmento)
+        while len(self._segmentos) > 2:
+            viejo = self._segmentos.pop(0)
+            viejo.close()
+            viejo.unlink()
+        return generacion
+
+    def actualizar(self):
+        """Publica solo si la galería cambió; devuelve True si publicó"""
+        if get_gallery_signature() == self._firma:
+            return False
+        self.publicar()
+        return True
+
+    def ejecutar(self):
+        """Bucle del publicador hasta detener()"""
+        while self._activo:
+            try:
+                if self.actualizar():
+                    print(f"[galeria] generación {self.generacion} publicada")
+            except Exception as e:
+                print(f"[galeria] error al publicar: {e}")
+            time.sleep(self.refresh_seconds)
+
+    def detener(self):
+        self._activo = False
+
+    def cerrar(self):
+        """Libera todos los segmentos"""
+        for segmento in self._segmentos + [self._control]:
+            segmento.close()
+            try:
+                segmento.unlink()
+            except FileNotFoundError:
+                pass
+        self._segmentos = []
+
+
+# ==================== LECTOR (PUERTAS) ====================
+
+class SharedGalleryReader:
+    """
+    Galería adjunta a la memoria compartida. Tiene la misma interfaz que
+    GalleryCache (obtener() -> (users, GallerySnapshot)) para poder pasarse
+    a HeadlessController o MultiDoorRuntime.
+
+    Raises:
+        FileNotFoundError: Si no hay publicador en marcha
+        ValueError: Si el segmento no es una galería
+    """
+
+    def __init__(self, nombre=GALLERY_SHM_NAME, refresh_seconds=GALLERY_REFRESH_SECONDS):
+        self.nombre = nombre
+        self.refresh_seconds = refresh_seconds
+        self._control, self.epoca = self._abrir_control()
+        self._ultima_reconexion = time.monotonic()
+        self._lock = threading.Lock()
+        self._users = {}
+        self._snapshot = None
+        self.generacion = 0
+        self.recargas = 0                                   # Estadística: nº de generaciones leídas
+        self.reconexiones = 0                               # Estadística: publicadores nuevos detectados
+
+    def _abrir_control(self):
+        """(segmento de control, época) del publicador actual"""
+        control = _adjuntar(self.nombre)
+        try:
+            magic, _, epoca, _, _ = CONTROL.unpack_from(control.buf, 0)
+        except struct.error:
+            magic = None
+        if magic != MAGIC:
+            control.close()
+            raise ValueError(f"El segmento '{self.nombre}' no es una galería")
+        return control, epoca
+
+    def _comprobar_publicador(self):
+        """Se adjunta al control nuevo si el publicador se reinició"""
+        ahora = time.monotonic()
+        if ahora - self._ultima_reconexion < self.refresh_seconds:
+            return
+        self._ultima_reconexion = ahora
+        try:
+            control, epoca = self._abrir_control()
+        except (FileNotFoundError, ValueError):
+            return                                          # Sin publicador: se sirve lo último leído
+        if epoca == self.epoca:
+            control.close()
+            return
+        self._control.close()
+        self._control, self.epoca = control, epoca
+        self.generacion = 0                                 # Fuerza la carga de la generación nueva
+        self.reconexiones += 1
+
+    def _leer_control(self):
+        """(generación, nombre del segmento) leídos de forma consistente"""
+        while True:
+            _, antes, _, generacion, nombre = CONTROL.unpack_from(self._control.buf, 0)
+            if antes % 2:
+                time.sleep(0)
+                continue
+            despues = struct.unpack_from("<Q", self._control.buf, 8)[0]
+            if antes == despues:
+                return generacion, nombre.rstrip(b"\0").decode()
+
+    def _cargar(self, generacion, nombre):
+        segmento = _adjuntar(nombre)
+        magic, gen, filas, dim, tam_bloque = CABECERA.unpack_from(segmento.buf, 0)
+        if magic != MAGIC or gen != generacion:
+            segmento.close()
+            raise FileNotFoundError(nombre)
+        matriz, user_ids, fin = _vistas(segmento.buf, filas, dim, _alinear(CABECERA.size))
+        bloque = json.loads(bytes(segmento.buf[fin:fin + tam_bloque]))
+
+        # El segmento vive lo mismo que la instantánea: otros hilos pueden
+        # seguir usando la generación anterior mientras tanto
+        snapshot = GallerySnapshot(matriz, user_ids, bloque["version"], segmento=segmento)
+        del matriz, user_ids
+        self._users = {int(uid): u for uid, u in bloque["users"].items()}
+        self._snapshot = snapshot
+        self.generacion = generacion
+        self.recargas += 1
+
+    def invalidar(self):
+        """Sin efecto: cada consulta comprueba la generación publicada"""
+
+    def cerrar(self):
+        """Se desadjunta de la generación actual y del control"""
+        with self._lock:
+            if self._snapshot is not None:
+                self._snapshot.cerrar()
+                self._snapshot = None
+            self._users = {}
+            self.generacion = 0
+            self._control.close()
+
+    def obtener(self):
+        """(users, GallerySnapshot) de la última generación publicada"""
+        with self._lock:
+            self._comprobar_publicador()
+            for _ in range(3):
+                generacion, nombre = self._leer_control()
+                if generacion == 0:
+                    if self._snapshot is not None:
+                        break                               # Publicador nuevo sin publicar aún
+                    return {}, GallerySnapshot(np.zeros((0, 0), np.float32), np.zeros(0, np.int64))
+                if generacion == self.generacion:
+                    break
+                try:
+                    self._cargar(generacion, nombre)
+                    break
+                except FileNotFoundError:
+                    continue                                # Se publicó otra mientras tanto
+            return self._users, self._snapshot
+
+
+if __name__ == "__main__":
+    from .db_manager import ensure_schema
+    import signal
+    ensure_schema()
+    publicador = GalleryPublisher()
+    signal.signal(signal.SIGTERM, lambda signum, frame: publicador.detener())
+    try:
+        publicador.ejecutar()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        publicador.cerrar()
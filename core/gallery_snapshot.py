@@ -0,0 +1,229 @@
+# core/gallery_snapshot.py
+# --------------------------------------------
+# Instantánea de la galería en disco (.npy con memory-mapping)
+# --------------------------------------------
+# Los embeddings de los usuarios activos se guardan normalizados en una
+# matriz float32 contigua (N x D) junto a un vector con el user_id de cada
+# fila. Al arrancar se abren con np.load(mmap_mode='r'): no hay que
+# parsear JSON ni copiar datos, y varios procesos de puerta en la misma
+# máquina comparten las páginas a través de la caché del sistema.
+#
+# Ficheros (junto a DB_PATH):
+#   galeria_snapshot.json            índice: versión y nombres de los .npy
+#   galeria_snapshot-<token>.npy     matriz de embeddings
+#   galeria_snapshot-<token>-ids.npy user_id de cada fila
+#
+# El índice se reemplaza de forma atómica después de escribir los .npy,
+# así un lector nunca combina una matriz nueva con unos ids antiguos.
+
+import glob
+import json
+import os
+import secrets
+import time
+
+import numpy as np
+
+from config import GALLERY_SNAPSHOT
+from .db_connection import get_connection, ruta_actual
+from .tracing import trazado
+
+_GENERACIONES_CONSERVADAS = 3                               # Generaciones de .npy que no se borran
+_GRACIA_S = 60                                              # Ni las escritas hace menos de esto
+_INTENTOS = 3                                               # Regeneraciones antes de rendirse
+
+
+def ruta_snapshot():
+    """Prefijo de los ficheros de la instantánea (junto a la BD principal)"""
+    if os.path.isabs(GALLERY_SNAPSHOT):
+        return GALLERY_SNAPSHOT
+    return os.path.join(os.path.dirname(os.path.abspath(ruta_actual())), GALLERY_SNAPSHOT)
+
+
+class GallerySnapshot:
+    """Matriz de embeddings normalizados y el user_id de cada fila"""
+
+    def __init__(self, matriz, user_ids, version=None, segmento=None):
+        self.matriz = matriz
+        self.user_ids = user_ids
+        self.version = version
+        # SharedMemory que respalda las vistas (core/gallery_shm.py). Se
+        # declara después de ellas: al liberarse la instantánea caen antes
+        # las vistas y el segmento puede cerrarse sin BufferError
+        self._segmento = segmento
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    @classmethod
+    def abrir(cls, prefijo=None):
+        """
+        Abre la instantánea con memory-mapping.
+
+        Returns:
+            GallerySnapshot o None si no existe o está incompleta
+        """
+        prefijo = prefijo or ruta_snapshot()
+        try:
+            with open(prefijo + ".json", encoding="utf-8") as f:
+                indice = json.load(f)
+            base = os.path.dirname(prefijo)
+            matriz = np.load(os.path.join(base, indice["matriz"]), mmap_mode="r")
+            user_ids = np.load(os.path.join(base, indice["ids"]), mmap_mode="r")
+        except (OSError, ValueError, KeyError):
+            return None
+        if matriz.shape[0] != user_ids.shape[0]:
+            return None
+        return cls(matriz, user_ids, indice.get("version"))
+
+    def cerrar(self):
+        """
+        Suelta las vistas y cierra el segmento de memoria compartida, si lo
+        hay. Solo cuando nadie más usa la instantánea.
+        """
+        self.matriz = np.zeros((0, 0), dtype=np.float32)
+        self.user_ids = np.zeros(0, dtype=np.int64)
+        segmento, self._segmento = self._segmento, None
+        if segmento is not None:
+            try:
+                segmento.close()
+            except BufferError:
+                pass                                        # Quedan vistas fuera: se cierra al soltarlas
+
+    @trazado("coincidencia.instantanea")
+    def mejor_coincidencia(self, query_emb):
+        """
+        Usuario con el embedding más parecido (similitud coseno), con el
+        mismo resultado que best_match_per_user().
+
+        Returns:
+            tuple: (best_user_id, best_score)
+        """
+        if not len(self):
+            return None, 0.0
+        q = np.asarray(query_emb, dtype=np.float32)
+        norma = np.linalg.norm(q)
+        if not norma:
+            return None, 0.0
+        scores = self.matriz @ (q / norma)
+        idx = int(np.argmax(scores))
+        score = float(scores[idx])
+        if score <= 0.0:
+            return None, 0.0
+        return int(self.user_ids[idx]), score
+
+
+def construir_matriz():
+    """
+    Lee de SQLite los embeddings de los usuarios activos.
+
+    Returns:
+        tuple: (matriz float32 normalizada, user_ids int64)
+    """
+    filas = get_connection().execute("""
+        SELECT f.user_id, f.encoding_json
+        FROM faces f JOIN users u ON u.id = f.user_id
+        WHERE u.active = 1
+        ORDER BY f.user_id, f.id
+    """).fetchall()
+
+    ids, embeddings = [], []
+    for user_id, enc_json in filas:
+        try:
+            embeddings.append(json.loads(enc_json))
+        except Exception:
+            continue
+        ids.append(user_id)
+    if not embeddings:
+        return np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=np.int64)
+
+    matriz = np.asarray(embeddings, dtype=np.float32)
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return np.ascontiguousarray(matriz / normas), np.asarray(ids, dtype=np.int64)
+
+
+def escribir_snapshot(version, prefijo=None):
+    """
+    Regenera la instantánea desde la BD y la publica.
+
+    Args:
+        version: Firma de la galería (get_gallery_signature()) que representa
+    """
+    prefijo = prefijo or ruta_snapshot()
+    base, nombre = os.path.split(prefijo)
+    matriz, user_ids = construir_matriz()
+
+    token = secrets.token_hex(4)
+    f_matriz = f"{nombre}-{token}.npy"
+    f_ids = f"{nombre}-{token}-ids.npy"
+    np.save(os.path.join(base, f_matriz), matriz)
+    np.save(os.path.join(base, f_ids), user_ids)
+
+    indice = {
+        "version": list(version) if version is not None else None,
+        "matriz": f_matriz,
+        "ids": f_ids,
+        "rostros": int(matriz.shape[0]),
+        "dim": int(matriz.shape[1]),
+    }
+    tmp = f"{prefijo}.json.{token}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(indice, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, prefijo + ".json")
+
+    _limpiar_generaciones(base, nombre, token)
+
+
+def _limpiar_generaciones(base, nombre, token):
+    """
+    Borra generaciones antiguas de .npy. Se conservan las
+    _GENERACIONES_CONSERVADAS más recientes y cualquiera con menos de
+    _GRACIA_S segundos: otro proceso puede estar regenerando a la vez y
+    aún no haber abierto la suya. Las ya abiertas siguen mapeadas (POSIX);
+    en Windows el borrado puede fallar mientras otro proceso las use.
+    """
+    prefijo = glob.escape(nombre) + "-"
+    generaciones = {}
+    for ruta in glob.glob(os.path.join(glob.escape(base), prefijo + "*.npy")):
+        token_fichero = os.path.basename(ruta)[len(nombre) + 1:].split("-")[0].split(".")[0]
+        try:
+            mtime = os.path.getmtime(ruta)
+        except OSError:
+            continue
+        ficheros, reciente = generaciones.get(token_fichero, ([], 0.0))
+        ficheros.append(ruta)
+        generaciones[token_fichero] = (ficheros, max(reciente, mtime))
+
+    ahora = time.time()
+    ordenadas = sorted(generaciones.items(), key=lambda g: g[1][1], reverse=True)
+    for _, (ficheros, mtime) in ordenadas[_GENERACIONES_CONSERVADAS:]:
+        if ahora - mtime < _GRACIA_S:
+            continue
+        for ruta in ficheros:
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+
+
+def cargar_o_regenerar(version, prefijo=None):
+    """
+    Abre la instantánea si corresponde a 'version'; si no, la regenera
+    (otro proceso puede haberla actualizado ya) y la abre.
+
+    Returns:
+        GallerySnapshot o None si no se pudo abrir tras varios intentos
+    """
+    version = list(version) if version is not None else None
+    snapshot = GallerySnapshot.abrir(prefijo)
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    for _ in range(_INTENTOS):
+        escribir_snapshot(version, prefijo)
+        snapshot = GallerySnapshot.abrir(prefijo)
+        if snapshot is not None:
+            return snapshot
+    return None
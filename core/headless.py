@@ -0,0 +1,347 @@
+# core/headless.py
+# --------------------------------------------
+# Controlador de puerta sin interfaz gráfica
+# --------------------------------------------
+# Ejecuta el flujo cámara -> gesto -> rostro -> PIN usando solo los
+# módulos de 'core'. No importa Tkinter ni PIL: la entrada del PIN y la
+# apertura de la puerta se delegan en objetos intercambiables. Las etapas
+# de cada intento las ejecuta core/verification_pipeline.py.
+
+import os
+import selectors
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import cv2
+
+from config import (
+    DEVICE_NAME,
+    GESTURE_TIMEOUT,
+    GESTURE_FRAMES_REQUIRED,
+    KEYPAD_PIN_TIMEOUT,
+)
+from .gallery import GalleryCache
+from .motion_gate import MotionGate
+from .verification_pipeline import VerificationPipeline, CamaraFrames, EtapaIniciada, coincidencia
+
+
+# ==================== ENTRADA DE PIN ====================
+
+class StdinPinSource:
+    """Lee el PIN desde una secuencia de texto (por defecto stdin)"""
+
+    def __init__(self, stream=None, prompt_stream=None):
+        self.stream = stream or sys.stdin
+        self.prompt_stream = prompt_stream or sys.stdout
+
+    def leer_pin(self, nombre):
+        """Devuelve el PIN introducido o None si se cancela"""
+        self.prompt_stream.write(f"Usuario: {nombre} - introduce PIN: ")
+        self.prompt_stream.flush()
+        linea = self.stream.readline()
+        if not linea:
+            return None                                     # EOF: cancelado
+        pin = linea.strip()
+        return pin or None
+
+
+class KeypadPinSource:
+    """
+    Lee el PIN desde un teclado numérico que envía una tecla por carácter
+    (p.ej. un keypad USB/serie expuesto como fichero de dispositivo).
+    '#' confirma y '*' cancela.
+
+    El dispositivo se abre una sola vez en modo no bloqueante y se espera
+    con selectors hasta el plazo, así el timeout funciona también en ttys.
+    Cada lectura nueva (o cancelar()) retira a la anterior: un lector
+    abandonado por el pipeline no se queda con las teclas del siguiente
+    intento.
+    """
+
+    def __init__(self, device_path, timeout=KEYPAD_PIN_TIMEOUT):
+        self.device_path = device_path
+        self.timeout = timeout
+        self._fd = None
+        self._tty_original = None                           # Atributos del tty a restaurar
+        self._selector = None
+        self._aviso_r, self._aviso_w = os.pipe()            # Despierta al lector en espera
+        os.set_blocking(self._aviso_r, False)
+        os.set_blocking(self._aviso_w, False)
+        self._turno = 0
+        self._turno_lock = threading.Lock()
+        self._lectura = threading.Lock()                    # Un solo lector del dispositivo
+        self._cerrado = False
+
+    def _abrir(self):
+        """Descriptor del dispositivo (se abre en el primer uso)"""
+        if self._fd is None:
+            fd = os.open(self.device_path, os.O_RDONLY | os.O_NONBLOCK | os.O_NOCTTY)
+            if os.isatty(fd):
+                import termios
+                import tty
+                self._tty_original = termios.tcgetattr(fd)
+                tty.setcbreak(fd)                           # Tecla a tecla, sin esperar a Enter
+            self._selector = selectors.DefaultSelector()
+            self._selector.register(fd, selectors.EVENT_READ)
+            self._selector.register(self._aviso_r, selectors.EVENT_READ)
+            self._fd = fd
+        return self._fd
+
+    def _liberar(self):
+        """Cierra el dispositivo (con la lectura tomada)"""
+        if self._fd is None:
+            return
+        if self._tty_original is not None:
+            import termios
+            try:
+                termios.tcsetattr(self._fd, termios.TCSANOW, self._tty_original)
+            except termios.error:
+                pass
+            self._tty_original = None
+        self._selector.close()
+        os.close(self._fd)
+        self._fd = self._selector = None
+
+    @staticmethod
+    def _vaciar(fd):
+        """Descarta lo pendiente en un descriptor no bloqueante"""
+        while True:
+            try:
+                if not os.read(fd, 1024):
+                    return
+            except (BlockingIOError, InterruptedError):
+                return
+
+    def _avisar(self):
+        if self._aviso_w is None:
+            return                                          # Ya cerrado
+        try:
+            os.write(self._aviso_w, b"x")
+        except BlockingIOError:
+            pass                                            # Ya hay un aviso pendiente
+
+    def leer_pin(self, nombre):
+        """Devuelve el PIN tecleado o None si se cancela o expira"""
+        with self._turno_lock:
+            self._turno += 1
+            turno = self._turno
+        self._avisar()                                      # Retira al lector anterior
+        with self._lectura:
+            if self._cerrado or turno != self._turno:
+                return None
+            fd = self._abrir()
+            self._vaciar(self._aviso_r)
+            self._vaciar(fd)                                # Teclas de antes de pedir el PIN
+            digitos = []
+            limite = time.monotonic() + self.timeout
+            while turno == self._turno:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    return None
+                for clave, _ in self._selector.select(restante):
+                    if clave.fd == self._aviso_r:
+                        self._vaciar(self._aviso_r)         # El bucle comprueba el turno
+                        continue
+                    try:
+                        datos = os.read(fd, 64)
+                    except (BlockingIOError, InterruptedError):
+                        continue
+                    if not datos:
+                        self._liberar()                     # Dispositivo desconectado: se reabre
+                        return None
+                    for tecla in datos.decode("ascii", "ignore"):
+                        if tecla == "#":
+                            return "".join(digitos) or None
+                        if tecla == "*":
+                            return None
+                        if tecla.isdigit():
+                            digitos.append(tecla)
+            return None
+
+    def cancelar(self):
+        """Termina la lectura en curso (devuelve None)"""
+        with self._turno_lock:
+            self._turno += 1
+        self._avisar()
+
+    def cerrar(self):
+        """Cancela la lectura y cierra el dispositivo"""
+        self._cerrado = True
+        self.cancelar()
+        with self._lectura:
+            self._liberar()
+            if self._aviso_r is not None:
+                os.close(self._aviso_r)
+                os.close(self._aviso_w)
+                self._aviso_r = self._aviso_w = None
+
+
+# ==================== ACTUADORES DE PUERTA ====================
+
+class DoorActuator(ABC):
+    """Interfaz de un actuador de puerta (abrir() es obligatorio)"""
+
+    def mostrar(self, texto):
+        """Muestra un mensaje al usuario (display, LED, altavoz...)"""
+
+    @abstractmethod
+    def abrir(self, user_id, nombre):
+        """Abre la puerta para el usuario verificado"""
+
+    def denegar(self, motivo):
+        """Señaliza un acceso denegado"""
+
+
+class ConsoleDoorActuator(DoorActuator):
+    """Actuador que solo escribe en consola (útil en pruebas de campo)"""
+
+    def mostrar(self, texto):
+        print(f"[puerta] {texto}", flush=True)
+
+    def abrir(self, user_id, nombre):
+        print(f"[puerta] ABIERTA para {nombre} (ID: {user_id})", flush=True)
+
+    def denegar(self, motivo):
+        print(f"[puerta] DENEGADO: {motivo}", flush=True)
+
+
+class StubDoorActuator(DoorActuator):
+    """Actuador local que solo registra las llamadas recibidas"""
+
+    def __init__(self):
+        self.mensajes = []
+        self.aperturas = []
+        self.denegaciones = []
+
+    def mostrar(self, texto):
+        self.mensajes.append(texto)
+
+    def abrir(self, user_id, nombre):
+        self.aperturas.append((user_id, nombre))
+
+    def denegar(self, motivo):
+        self.denegaciones.append(motivo)
+
+
+# ==================== CONTROLADOR ====================
+
+class HeadlessController:
+    """Orquesta una puerta completa sin ventanas"""
+
+    def __init__(self, cap, pin_source, actuator, device=DEVICE_NAME, gallery=None,
+                 embed_fn=None, gesture_timeout=GESTURE_TIMEOUT,
+                 frames_necesarios=GESTURE_FRAMES_REQUIRED):
+        self.cap = cap                                      # Objeto tipo cv2.VideoCapture
+        self.pin_source = pin_source
+        self.actuator = actuator
+        self.device = device                                # Nombre de la puerta en los eventos
+        # GalleryCache compartida; una propia comprueba la firma en cada intento
+        self.gallery = gallery or GalleryCache(refresh_seconds=0)
+        self.gesture_timeout = gesture_timeout
+        self.frames_necesarios = frames_necesarios
+        self.motion_gate = MotionGate()                     # MediaPipe solo con movimiento
+        self.activo = False
+        self.pipeline = VerificationPipeline(
+            CamaraFrames(cap),
+            pin_source,
+            self.gallery,
+            device=device,
+            embed_fn=embed_fn,
+            notificar=self._al_evento,
+            timeouts={"gesto": gesture_timeout},
+            frames_necesarios=frames_necesarios,
+            motion_gate=self.motion_gate
+        )
+
+    def _manos(self):
+        """MediaPipe Hands del pipeline (un único grafo por puerta)"""
+        return self.pipeline.manos()
+
+    def _leer_frame(self):
+        """Lee un frame en espejo, o None si falla la cámara"""
+        ret, frame = self.cap.read()
+        if not ret:
+            return None
+        return cv2.flip(frame, 1)
+
+    def _landmarks(self, frame):
+        """Devuelve la lista de manos detectadas en el frame"""
+        results = self._manos().process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        return results.multi_hand_landmarks or []
+
+    def esperar_presencia(self):
+        """Bloquea hasta ver una mano delante de la cámara"""
+        while self.activo:
+            frame = self._leer_frame()
+            if (frame is not None and self.motion_gate.actualizar(frame)
+                    and self._landmarks(frame)):
+                return True
+            time.sleep(self.motion_gate.intervalo_ms() / 1000)
+        return False
+
+    def _galeria(self):
+        """Usuarios y embeddings desde la caché de galería"""
+        return self.gallery.obtener()
+
+    def identificar(self, frame, faces):
+        """
+        Obtiene el embedding del frame y busca el mejor usuario.
+
+        Returns:
+            tuple: (best_user_id, best_score)
+
+        Raises:
+            ValueError: Si no se detecta rostro
+        """
+        return coincidencia(self.pipeline.embed_fn(frame), faces)
+
+    def _al_evento(self, evento):
+        """Traduce los eventos del pipeline al actuador"""
+        if isinstance(evento, EtapaIniciada) and evento.etapa not in ("coincidencia", "decision"):
+            self.actuator.mostrar(evento.texto)
+
+    def verificar(self):
+        """
+        Ejecuta un intento completo de verificación.
+
+        Returns:
+            dict: {"resultado": "permitido"|"denegado"|"cancelado"|"error",
+                   "user_id", "motivo", "score", "tiempos"}
+        """
+        resultado = self.pipeline.ejecutar()
+        if resultado.resultado == "permitido":
+            self.actuator.abrir(resultado.user_id, resultado.nombre)
+        elif resultado.resultado == "cancelado":
+            self.actuator.mostrar("Cancelado")
+        else:
+            self.actuator.denegar(resultado.motivo)
+        return resultado.como_dict()
+
+    def ejecutar(self, max_intentos=None):
+        """Bucle principal: espera presencia y lanza verificaciones"""
+        self.activo = True
+        intentos = 0
+        try:
+            while self.activo and (max_intentos is None or intentos < max_intentos):
+                if not self.esperar_presencia():
+                    break
+                self.verificar()
+                intentos += 1
+        finally:
+            self.activo = False
+
+    def detener(self):
+        """Pide al bucle principal que termine"""
+        self.activo = False
+
+    def cerrar(self):
+        """Libera cámara, MediaPipe y la fuente de PIN"""
+        self.detener()
+        self.pipeline.cerrar()
+        cerrar_pin = getattr(self.pin_source, "cerrar", None)
+        if cerrar_pin:
+            cerrar_pin()
+        if self.cap:
+            self.cap.release()
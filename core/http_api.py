@@ -0,0 +1,357 @@
+# core/http_api.py
+# --------------------------------------------
+# API HTTP local de verificación (tornos, check-in móvil)
+# --------------------------------------------
+# Servidor ThreadingHTTPServer (un hilo por conexión) sobre los módulos de
+# 'core'. Los embeddings de peticiones concurrentes se agrupan en
+# micro-lotes con InferenceScheduler.
+#
+#   POST /verificar?device=torno-1     cuerpo: JPEG; PIN opcional en X-PIN
+#   POST /usuarios                     JSON {"nombre", "pin", "fotos": [JPEG en base64]}
+#   GET  /eventos?desde=&hasta=&user_id=&device=&result=&limit=&antes_ts=&antes_id=
+#   GET  /salud
+#
+# Sin PIN, /verificar solo identifica y no registra eventos. Con PIN es un
+# intento de acceso completo: se comprueba el PIN y se registra el evento
+# como en la puerta.
+#
+# Todas las rutas salvo /salud exigen API_TOKEN ('Authorization: Bearer'):
+# /usuarios da de alta caras y PINs que abren la puerta, /eventos expone
+# el historial y /verificar identifica a cualquiera por una foto. Sin
+# API_TOKEN configurado responden 403.
+#
+# La API NO comprueba vida (no hay gesto): con PIN basta una foto de la
+# persona y su PIN. Tras API_PIN_MAX_FAILURES fallos en
+# API_PIN_LOCKOUT_SECONDS se bloquean el usuario y el cliente (429).
+
+import base64
+import binascii
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import cv2
+import numpy as np
+
+from config import (
+    DEVICE_NAME,
+    FACE_THRESHOLD,
+    API_HOST,
+    API_PORT,
+    API_TOKEN,
+    API_MAX_BODY_MB,
+    API_PIN_MAX_FAILURES,
+    API_PIN_LOCKOUT_SECONDS,
+)
+from .credentials import get_credential_service
+from .db_manager import log_event, insert_user, insert_face, query_events
+from .gallery import GalleryCache
+from .inference_scheduler import get_inference_scheduler
+from .occupancy import get_occupancy_index
+from .tracing import trazado
+from .verification_pipeline import coincidencia, hash_pin_usuario
+
+
+class ErrorAPI(Exception):
+    """Error con código HTTP para el cliente"""
+
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+        self.mensaje = mensaje
+
+
+def decodificar_jpeg(datos):
+    """Bytes JPEG/PNG -> frame BGR"""
+    frame = cv2.imdecode(np.frombuffer(datos, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ErrorAPI(400, "La imagen no se pudo decodificar")
+    return frame
+
+
+class BloqueoIntentos:
+    """Fallos de PIN por clave (usuario o cliente) en una ventana deslizante"""
+
+    def __init__(self, max_fallos=API_PIN_MAX_FAILURES, ventana_s=API_PIN_LOCKOUT_SECONDS):
+        self.max_fallos = max_fallos
+        self.ventana_s = ventana_s
+        self._fallos = {}                                   # clave -> deque de instantes
+        self._lock = threading.Lock()
+
+    def _recientes(self, clave, ahora):
+        fallos = self._fallos.get(clave)
+        if fallos is None:
+            return None
+        while fallos and ahora - fallos[0] >= self.ventana_s:
+            fallos.popleft()
+        if not fallos:
+            del self._fallos[clave]
+            return None
+        return fallos
+
+    def bloqueado(self, clave):
+        with self._lock:
+            fallos = self._recientes(clave, time.monotonic())
+            return fallos is not None and len(fallos) >= self.max_fallos
+
+    def fallo(self, clave):
+        with self._lock:
+            ahora = time.monotonic()
+            fallos = self._recientes(clave, ahora)
+            if fallos is None:
+                fallos = self._fallos[clave] = deque()
+            fallos.append(ahora)
+
+    def limpiar(self, clave):
+        with self._lock:
+            self._fallos.pop(clave, None)
+
+
+class AccessAPI:
+    """Lógica de los endpoints, independiente del transporte HTTP"""
+
+    def __init__(self, gallery=None, embedder=None, device=DEVICE_NAME, bloqueos=None):
+        self.gallery = gallery or GalleryCache(refresh_seconds=0)
+        self.embedder = embedder or get_inference_scheduler()  # Objeto con enviar(frame) -> Future
+        self.device = device
+        self.ocupacion = get_occupancy_index()
+        self.bloqueos = bloqueos or BloqueoIntentos()
+
+    @trazado("api.verificar")
+    def verificar(self, imagen, pin=None, device=None, cliente=None):
+        """
+        Identifica la cara de la imagen y, si se da PIN, decide el acceso.
+
+        Args:
+            cliente: Dirección del cliente, para bloquear tras varios fallos
+        """
+        device = device or self.device
+        clave_cliente = ("cliente", cliente)
+        if pin and self.bloqueos.bloqueado(clave_cliente):
+            raise ErrorAPI(429, "Demasiados intentos fallidos; inténtalo más tarde")
+        users, faces = self.gallery.obtener()
+        try:
+            query_emb = self.embedder.enviar(decodificar_jpeg(imagen)).result()
+        except ValueError:
+            if pin:
+                log_event(None, "Entrada Denegada", "No se detecto Rostro", device=device)
+            return {"resultado": "sin_rostro", "reconocido": False, "user_id": None, "score": None}
+
+        best_uid, best_score = coincidencia(query_emb, faces)
+        reconocido = best_uid is not None and best_score >= FACE_THRESHOLD and best_uid in users
+        respuesta = {
+            "resultado": "identificado" if reconocido else "desconocido",
+            "reconocido": reconocido,
+            "user_id": best_uid if reconocido else None,
+            "nombre": users[best_uid]["name"] if reconocido else None,
+            "score": round(float(best_score), 4),
+            "dentro": self.ocupacion.esta_dentro(best_uid) if reconocido else None,
+        }
+        if not pin:
+            return respuesta
+
+        if not reconocido:
+            log_event(None, "Entrada Denegada", f"No reconocido: {best_score:.3f}", device=device)
+            self.bloqueos.fallo(clave_cliente)
+            respuesta["resultado"] = "denegado"
+            return respuesta
+
+        clave_usuario = ("usuario", best_uid)
+        if self.bloqueos.bloqueado(clave_usuario):
+            log_event(best_uid, "Entrada Denegada", "Bloqueado por PINs fallidos (API)", device=device)
+            raise ErrorAPI(429, "Demasiados intentos fallidos; inténtalo más tarde")
+
+        user = users[best_uid]
+        pin_hash = hash_pin_usuario(best_uid, user)
+        if pin_hash is None:
+            log_event(best_uid, "Entrada Denegada", "Usuario inactivo", device=device)
+            respuesta["resultado"] = "denegado"
+            respuesta["motivo"] = "Usuario inactivo"
+            return respuesta
+        correcto = get_credential_service().verificar_usuario(
+            best_uid, pin, pin_hash, al_actualizar=lambda h: self.gallery.invalidar()
+        ).result()
+        if correcto:
+            self.bloqueos.limpiar(clave_usuario)
+            log_event(best_uid, "Entrada Permitida",
+                      f"Acceso Permitido: {user['name']} || score={best_score:.3f}",
+                      device=device)
+            respuesta["resultado"] = "permitido"
+        else:
+            log_event(best_uid, "Entrada Denegada", "Pin Incorrecto", device=device)
+            self.bloqueos.fallo(clave_usuario)
+            self.bloqueos.fallo(clave_cliente)
+            respuesta["resultado"] = "denegado"
+            respuesta["motivo"] = "PIN incorrecto"
+        return respuesta
+
+    def enrolar(self, datos):
+        """Alta de un usuario con sus fotos"""
+        if not isinstance(datos, dict):
+            raise ErrorAPI(400, "El cuerpo debe ser un objeto JSON")
+        nombre = datos.get("nombre") or ""
+        pin = str(datos.get("pin") or "").strip()
+        fotos = datos.get("fotos") or []
+        if not isinstance(nombre, str) or not isinstance(fotos, list):
+            raise ErrorAPI(400, "'nombre' debe ser texto y 'fotos' una lista")
+        nombre = nombre.strip()
+        if not nombre or not pin:
+            raise ErrorAPI(400, "'nombre' y 'pin' son obligatorios")
+        if not pin.isdigit() or len(pin) < 4:
+            raise ErrorAPI(400, "El PIN debe tener al menos 4 dígitos")
+        if not fotos:
+            raise ErrorAPI(400, "Se necesita al menos una foto")
+
+        hash_pin = get_credential_service().hash_pin(pin)
+        try:
+            frames = [decodificar_jpeg(base64.b64decode(f, validate=True)) for f in fotos]
+        except (binascii.Error, TypeError):
+            raise ErrorAPI(400, "Las fotos deben ir en base64")
+        # Todas las fotos a la vez: el planificador las agrupa en lotes
+        futuros = [self.embedder.enviar(frame) for frame in frames]
+        embeddings = []
+        for futuro in futuros:
+            try:
+                embeddings.append(futuro.result())
+            except ValueError:
+                pass
+        if not embeddings:
+            raise ErrorAPI(422, "No se detectó rostro en ninguna foto")
+
+        user_id = insert_user(nombre, hash_pin.result())
+        for embedding in embeddings:
+            insert_face(user_id, embedding)
+        self.gallery.invalidar()
+        return {"user_id": user_id, "rostros": len(embeddings),
+                "fotos_sin_rostro": len(frames) - len(embeddings)}
+
+    def eventos(self, params):
+        """Página de eventos (mismos filtros que el historial del panel)"""
+        def valor(nombre):
+            return params.get(nombre, [None])[0]
+        try:
+            user_id = int(valor("user_id")) if valor("user_id") else None
+            limit = max(1, min(int(valor("limit") or 100), 1000))
+            antes_id = int(valor("antes_id")) if valor("antes_id") else None
+        except ValueError:
+            raise ErrorAPI(400, "Parámetros numéricos no válidos")
+        antes = (valor("antes_ts"), antes_id) if valor("antes_ts") and antes_id else None
+
+        rows, cursor = query_events(
+            desde=valor("desde"),
+            hasta=valor("hasta"),
+            user_id=user_id,
+            device=valor("device"),
+            result=params.get("result") or None,
+            limit=limit,
+            before=antes
+        )
+        return {
+            "eventos": [
+                {"id": r[0], "ts": r[1], "device": r[2], "usuario": r[3],
+                 "result": r[4], "note": r[5]}
+                for r in rows
+            ],
+            "siguiente": {"antes_ts": cursor[0], "antes_id": cursor[1]} if cursor else None,
+        }
+
+    def salud(self):
+        users, faces = self.gallery.obtener()
+        return {"ok": True, "usuarios": len(users), "dentro": self.ocupacion.ocupacion()}
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    """Enrutado y serialización JSON; la lógica está en AccessAPI"""
+
+    protocol_version = "HTTP/1.1"                           # Conexiones persistentes
+    disable_nagle_algorithm = True                          # Sin esperas de ~40 ms (Nagle + ACK retardado)
+    api = None
+    token = None
+
+    def log_message(self, formato, *args):
+        pass                                                # Sin una línea por petición
+
+    def _responder(self, estado, cuerpo):
+        datos = json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _cuerpo(self):
+        valor = self.headers.get("Content-Length")
+        if valor is None:
+            raise ErrorAPI(411, "Falta Content-Length")
+        try:
+            longitud = int(valor)
+        except ValueError:
+            raise ErrorAPI(400, "Content-Length no válido")
+        if longitud < 0:
+            raise ErrorAPI(400, "Content-Length no válido")
+        if longitud > API_MAX_BODY_MB * 1024 * 1024:
+            raise ErrorAPI(413, "Petición demasiado grande")
+        self._leido = True
+        return self.rfile.read(longitud)
+
+    def _atender(self, metodo):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        self._leido = False
+        try:
+            if not self.token and url.path != "/salud":
+                # Alta de caras, historial e identificación: nunca sin token
+                raise ErrorAPI(403, "Esta ruta requiere configurar API_TOKEN")
+            if self.token and self.headers.get("Authorization") != f"Bearer {self.token}":
+                raise ErrorAPI(401, "No autorizado")
+            if metodo == "POST" and url.path == "/verificar":
+                pin = self.headers.get("X-PIN")
+                cuerpo = self.api.verificar(
+                    self._cuerpo(),
+                    pin=pin,
+                    device=params.get("device", [None])[0],
+                    cliente=self.client_address[0]
+                )
+                self._responder(200, cuerpo)
+            elif metodo == "POST" and url.path == "/usuarios":
+                try:
+                    datos = json.loads(self._cuerpo())
+                except ValueError:
+                    raise ErrorAPI(400, "JSON no válido")
+                self._responder(201, self.api.enrolar(datos))
+            elif metodo == "GET" and url.path == "/eventos":
+                self._responder(200, self.api.eventos(params))
+            elif metodo == "GET" and url.path == "/salud":
+                self._responder(200, self.api.salud())
+            else:
+                raise ErrorAPI(404, "Ruta no encontrada")
+        except ErrorAPI as e:
+            if metodo == "POST" and not self._leido:
+                self.close_connection = True                # El cuerpo no se ha leído
+            self._responder(e.estado, {"error": e.mensaje})
+        except Exception as e:
+            print(f"[api] error en {metodo} {url.path}: {e}")
+            self._responder(500, {"error": "Error interno"})
+
+    def do_GET(self):
+        self._atender("GET")
+
+    def do_POST(self):
+        self._atender("POST")
+
+
+class _Servidor(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128                                # Cola de conexiones (por defecto 5)
+
+
+def crear_servidor(api=None, host=API_HOST, port=API_PORT, token=API_TOKEN):
+    """
+    Crea el servidor (aún sin atender peticiones: serve_forever()).
+    Con port=0 el sistema elige un puerto libre (server_address).
+    """
+    manejador = type("Manejador", (_Manejador,), {"api": api or AccessAPI(), "token": token})
+    return _Servidor((host, port), manejador)
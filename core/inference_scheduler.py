@@ -0,0 +1,211 @@
+# core/inference_scheduler.py
+# --------------------------------------------
+# Agrupación de peticiones de embedding en micro-lotes
+# --------------------------------------------
+# Los llamantes envían frames y reciben Futures. Un hilo reúne las
+# peticiones que llegan casi a la vez (hasta INFERENCE_MAX_BATCH o
+# INFERENCE_MAX_WAIT_MS desde la primera) y las resuelve con una sola
+# llamada al modelo (get_embeddings_deepface), en lugar de una pasada por
+# imagen serializada.
+#
+# La espera es adaptativa: si el lote anterior fue de una sola imagen y no
+# hay nada más en cola, la petición sale sin esperar (un único llamante no
+# paga latencia extra). Con concurrencia, mientras el modelo trabaja se
+# acumulan peticiones y el lote siguiente sale lleno o al agotar la
+# espera. En ningún caso una petición espera más de INFERENCE_MAX_WAIT_MS
+# a que se forme su lote.
+#
+# Ningún Future queda sin resolver: tras cerrar(), enviar() devuelve un
+# Future ya fallido (RuntimeError) y lo que quede en cola cuando el hilo
+# termina se falla también.
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from config import INFERENCE_MAX_BATCH, INFERENCE_MAX_WAIT_MS
+from .face_recognition import get_embeddings_deepface
+from . import tracing
+
+_FIN = object()                                             # Marca de parada de la cola
+
+
+class InferenceScheduler:
+    """Cola de frames con un hilo que ejecuta el modelo por lotes"""
+
+    def __init__(self, embed_lote_fn=get_embeddings_deepface,
+                 max_lote=INFERENCE_MAX_BATCH, espera_ms=INFERENCE_MAX_WAIT_MS):
+        self.embed_lote_fn = embed_lote_fn                  # [frames] -> [embedding o ValueError]
+        self.max_lote = max(1, max_lote)
+        self.espera_ms = espera_ms
+        self._cola = queue.Queue()
+        self._ultimo_lote = 1
+        self._cerrado = False
+        self._cierre_lock = threading.Lock()                # Nada entra en cola tras _FIN
+
+        # Métricas (las escribe solo el hilo de inferencia)
+        self._lock = threading.Lock()
+        self._lotes = 0
+        self._imagenes = 0
+        self._tamanos = [0] * (self.max_lote + 1)           # Lotes por tamaño
+        self._espera_total = 0.0                            # Segundos en cola (suma)
+        self._espera_max = 0.0
+        self._modelo_total = 0.0                            # Segundos en el modelo (suma)
+
+        self._hilo = threading.Thread(target=self._bucle, name="inferencia", daemon=True)
+        self._hilo.start()
+
+    def enviar(self, frame):
+        """
+        Future con el embedding del frame (ValueError si no hay rostro;
+        RuntimeError si el planificador está cerrado)
+        """
+        future = Future()
+        with self._cierre_lock:
+            if not self._cerrado:
+                self._cola.put((frame, future, time.perf_counter()))
+                return future
+        future.set_exception(RuntimeError("El planificador de inferencia está cerrado"))
+        return future
+
+    def enviar_varios(self, frames):
+        """Futures de varios frames, encolados juntos para compartir lote"""
+        return [self.enviar(frame) for frame in frames]
+
+    def __call__(self, frame):
+        """Embedding bloqueante: sustituto directo de get_embedding_deepface"""
+        return self.enviar(frame).result()
+
+    def profundidad_cola(self):
+        """Peticiones esperando a entrar en un lote"""
+        return self._cola.qsize()
+
+    def estadisticas(self):
+        """
+        Métricas acumuladas desde el arranque.
+
+        Returns:
+            dict: 'cola', 'lotes', 'imagenes', 'lote_medio',
+                  'tamanos' ({tamaño: lotes}), 'espera_media_ms',
+                  'espera_max_ms' (en cola antes del modelo) y
+                  'modelo_medio_ms' (por llamada al modelo)
+        """
+        with self._lock:
+            lotes, imagenes = self._lotes, self._imagenes
+            return {
+                "cola": self._cola.qsize(),
+                "lotes": lotes,
+                "imagenes": imagenes,
+                "lote_medio": round(imagenes / lotes, 2) if lotes else 0.0,
+                "tamanos": {n: c for n, c in enumerate(self._tamanos) if c},
+                "espera_media_ms": round(self._espera_total / imagenes * 1000, 2) if imagenes else 0.0,
+                "espera_max_ms": round(self._espera_max * 1000, 2),
+                "modelo_medio_ms": round(self._modelo_total / lotes * 1000, 2) if lotes else 0.0,
+            }
+
+    def cerrar(self, timeout=5):
+        """Resuelve lo ya encolado, para el hilo y rechaza envíos posteriores"""
+        with self._cierre_lock:
+            if not self._cerrado:
+                self._cerrado = True
+                self._cola.put(_FIN)
+        self._hilo.join(timeout)
+
+    def _bucle(self):
+        try:
+            self._procesar()
+        finally:
+            # También si el hilo muere por un error: nadie queda esperando
+            with self._cierre_lock:
+                self._cerrado = True
+            self._fallar_pendientes()
+
+    def _fallar_pendientes(self):
+        """Falla los Futures que siguen en cola"""
+        while True:
+            try:
+                item = self._cola.get_nowait()
+            except queue.Empty:
+                return
+            if item is not _FIN:
+                item[1].set_exception(RuntimeError("El planificador de inferencia está cerrado"))
+
+    def _procesar(self):
+        terminar = False
+        while not terminar:
+            item = self._cola.get()
+            if item is _FIN:
+                break
+            lote = [item]
+            limite = item[2] + self.espera_ms / 1000
+            while len(lote) < self.max_lote:
+                try:
+                    item = self._cola.get_nowait()          # Lo que ya está en cola, sin esperar
+                except queue.Empty:
+                    restante = limite - time.perf_counter()
+                    if restante <= 0 or (len(lote) == 1 and self._ultimo_lote == 1):
+                        break
+                    try:
+                        item = self._cola.get(timeout=restante)
+                    except queue.Empty:
+                        break
+                if item is _FIN:
+                    terminar = True
+                    break
+                lote.append(item)
+            self._ultimo_lote = len(lote)
+            try:
+                self._resolver(lote)
+            except BaseException as e:
+                for _, future, _ in lote:
+                    if not future.done():
+                        future.set_exception(RuntimeError(f"Fallo del hilo de inferencia: {e!r}"))
+                raise
+
+    def _resolver(self, lote):
+        frames = [frame for frame, _, _ in lote]
+        inicio = time.perf_counter()
+        try:
+            resultados = list(self.embed_lote_fn(frames))
+        except Exception as e:
+            resultados = [e] * len(lote)
+        if len(resultados) < len(lote):
+            faltan = len(lote) - len(resultados)
+            resultados += [RuntimeError(
+                f"El modelo devolvió {len(lote) - faltan} resultados para {len(lote)} frames"
+            )] * faltan
+        fin = time.perf_counter()
+
+        with self._lock:
+            self._lotes += 1
+            self._imagenes += len(lote)
+            self._tamanos[min(len(lote), self.max_lote)] += 1
+            self._modelo_total += fin - inicio
+            for _, _, encolado in lote:
+                self._espera_total += inicio - encolado
+                self._espera_max = max(self._espera_max, inicio - encolado)
+        if tracing.ACTIVO:
+            for _, _, encolado in lote:
+                tracing.registrar("inferencia.espera", (inicio - encolado) * 1000)
+
+        for (_, future, _), resultado in zip(lote, resultados):
+            if isinstance(resultado, Exception):
+                future.set_exception(resultado)
+            else:
+                future.set_result(resultado)
+
+
+# ==================== INSTANCIA GLOBAL ====================
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_inference_scheduler():
+    """Planificador global (se crea en el primer uso)"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = InferenceScheduler()
+        return _scheduler
@@ -0,0 +1,110 @@
+# core/motion_gate.py
+# --------------------------------------------
+# Detector barato de movimiento/presencia
+# --------------------------------------------
+# Diferencia de frames sobre una imagen gris reducida. Se coloca delante
+# de las etapas caras (MediaPipe, DeepFace) para que solo se ejecuten
+# cuando hay alguien delante de la cámara.
+
+import time
+
+import cv2
+
+from config import (
+    MOTION_DOWNSCALE,
+    MOTION_PIXEL_THRESHOLD,
+    MOTION_MIN_AREA,
+    MOTION_HOLD_SECONDS,
+    PREVIEW_INTERVAL_MS,
+    IDLE_PREVIEW_INTERVAL_MS,
+)
+
+
+class MotionGate:
+    """Decide frame a frame si la escena está activa o en reposo"""
+
+    def __init__(self, downscale=MOTION_DOWNSCALE, pixel_threshold=MOTION_PIXEL_THRESHOLD,
+                 min_area=MOTION_MIN_AREA, hold_seconds=MOTION_HOLD_SECONDS):
+        self.downscale = downscale                          # (ancho, alto) de la imagen reducida
+        self.pixel_threshold = pixel_threshold              # Diferencia mínima de gris por píxel
+        self.min_area = min_area                            # Fracción mínima de píxeles cambiados
+        self.hold_seconds = hold_seconds                    # Tiempo activo tras el último movimiento
+        self._anterior = None
+        self._ultimo_movimiento = None
+        self.activo = False
+        self.reiniciar_estadisticas()
+
+    def reiniciar_estadisticas(self):
+        """Pone a cero los contadores de ciclo de trabajo"""
+        self.frames_total = 0
+        self.frames_activos = 0
+        self.activaciones = 0                               # Transiciones reposo -> activo
+        self._inicio = time.monotonic()
+        self._segundos_activo = 0.0
+        self._marca = self._inicio
+
+    def _reducir(self, frame_bgr):
+        """Imagen gris reducida y suavizada"""
+        gris = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY)
+        pequeno = cv2.resize(gris, self.downscale, interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(pequeno, (5, 5), 0)
+
+    def actualizar(self, frame_bgr):
+        """
+        Procesa un frame y devuelve True si la escena está activa.
+
+        La escena pasa a activa en el mismo frame en que se detecta
+        movimiento y vuelve a reposo tras hold_seconds sin movimiento.
+        """
+        ahora = time.monotonic()
+        actual = self._reducir(frame_bgr)
+
+        movimiento = False
+        if self._anterior is not None:
+            diff = cv2.absdiff(actual, self._anterior)
+            cambiados = cv2.countNonZero(cv2.threshold(
+                diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)[1])
+            movimiento = cambiados >= self.min_area * diff.size
+        self._anterior = actual
+
+        if movimiento:
+            self._ultimo_movimiento = ahora
+
+        activo = (self._ultimo_movimiento is not None
+                  and ahora - self._ultimo_movimiento <= self.hold_seconds)
+
+        # Estadísticas
+        if self.activo:
+            self._segundos_activo += ahora - self._marca
+        self._marca = ahora
+        if activo and not self.activo:
+            self.activaciones += 1
+        self.activo = activo
+        self.frames_total += 1
+        if activo:
+            self.frames_activos += 1
+        return activo
+
+    def forzar_activo(self):
+        """Marca la escena como activa (p.ej. al pulsar VERIFICAR)"""
+        self._ultimo_movimiento = time.monotonic()
+
+    def intervalo_ms(self):
+        """Intervalo recomendado hasta el siguiente frame"""
+        return PREVIEW_INTERVAL_MS if self.activo else IDLE_PREVIEW_INTERVAL_MS
+
+    def estadisticas(self):
+        """Ciclo de trabajo desde el último reinicio"""
+        transcurrido = max(time.monotonic() - self._inicio, 1e-9)
+        segundos_activo = self._segundos_activo
+        if self.activo:
+            segundos_activo += time.monotonic() - self._marca
+        return {
+            "frames_total": self.frames_total,
+            "frames_activos": self.frames_activos,
+            "activaciones": self.activaciones,
+            "segundos": round(transcurrido, 1),
+            "ciclo_trabajo": segundos_activo / transcurrido,
+            "ciclo_trabajo_frames": (self.frames_activos / self.frames_total
+                                     if self.frames_total else 0.0),
+        }
@@ -0,0 +1,107 @@
+# core/multi_door.py
+# --------------------------------------------
+# Varias puertas servidas desde un único proceso
+# --------------------------------------------
+# Cada puerta tiene su propia cámara y estado de gesto (un
+# HeadlessController por hilo), pero todas comparten el modelo de
+# embeddings, la caché de galería y la escritura de eventos.
+
+import threading
+
+import cv2
+
+from config import CAMERA_WIDTH, CAMERA_HEIGHT, DOORS
+from .face_recognition import get_embedding_deepface
+from .gallery import GalleryCache
+from .inference_scheduler import get_inference_scheduler
+from .headless import HeadlessController, StdinPinSource, KeypadPinSource, ConsoleDoorActuator
+
+
+class SharedEmbedder:
+    """
+    Envuelve una función de embedding de una imagen para que todas las
+    puertas usen el mismo modelo residente (DeepFace lo cachea por proceso)
+    sin lanzar inferencias concurrentes sobre él. Por defecto las puertas
+    usan el planificador de micro-lotes, que además agrupa las peticiones
+    simultáneas; esta clase queda para funciones sin versión por lotes.
+    """
+
+    def __init__(self, embed_fn=get_embedding_deepface):
+        self.embed_fn = embed_fn
+        self._lock = threading.Lock()
+        self.llamadas = 0
+
+    def __call__(self, frame):
+        with self._lock:
+            self.llamadas += 1
+            return self.embed_fn(frame)
+
+
+def abrir_camara(camera_id):
+    """Abre una cámara con la resolución configurada"""
+    cap = cv2.VideoCapture(camera_id)
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_WIDTH)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_HEIGHT)
+    return cap
+
+
+def pin_source_por_defecto(door):
+    """Keypad si la puerta lo declara, stdin en otro caso"""
+    if door.get("keypad"):
+        return KeypadPinSource(door["keypad"])
+    return StdinPinSource()
+
+
+class MultiDoorRuntime:
+    """Lanza un HeadlessController por puerta con recursos compartidos"""
+
+    def __init__(self, doors=None, gallery=None, embedder=None,
+                 cap_factory=abrir_camara,
+                 pin_source_factory=pin_source_por_defecto,
+                 actuator_factory=lambda door: ConsoleDoorActuator()):
+        self.doors = list(doors if doors is not None else DOORS)
+        if not self.doors:
+            raise ValueError("No hay puertas configuradas (config.DOORS)")
+        self.gallery = gallery or GalleryCache()
+        self.embedder = embedder or get_inference_scheduler()
+
+        self.controllers = []
+        for door in self.doors:
+            self.controllers.append(HeadlessController(
+                cap_factory(door["camera_id"]),
+                pin_source_factory(door),
+                actuator_factory(door),
+                device=door["device"],
+                gallery=self.gallery,
+                embed_fn=self.embedder
+            ))
+        self._hilos = []
+
+    def iniciar(self, max_intentos=None):
+        """Arranca un hilo por puerta"""
+        for controller in self.controllers:
+            hilo = threading.Thread(
+                target=controller.ejecutar,
+                kwargs={"max_intentos": max_intentos},
+                name=f"door-{controller.device}",
+                daemon=True
+            )
+            hilo.start()
+            self._hilos.append(hilo)
+
+    def esperar(self, timeout=None):
+        """Espera a que terminen todas las puertas"""
+        for hilo in self._hilos:
+            hilo.join(timeout)
+
+    def detener(self):
+        """Pide a todas las puertas que paren"""
+        for controller in self.controllers:
+            controller.detener()
+
+    def cerrar(self):
+        """Detiene y libera cámaras y MediaPipe"""
+        self.detener()
+        self.esperar(timeout=5)
+        for controller in self.controllers:
+            controller.cerrar()
@@ -0,0 +1,194 @@
+# core/occupancy.py
+# --------------------------------------------
+# Ocupación: quién está dentro en este momento
+# --------------------------------------------
+# La tabla 'presence' tiene una fila por persona dentro (desde cuándo y por
+# qué puerta). Un trigger sobre 'events' la actualiza en la misma
+# transacción que cada entrada permitida o salida, así que nunca queda
+# desfasada respecto al historial y responder "¿quién está dentro?" no
+# obliga a recorrer 'events'.
+#
+# OccupancyIndex mantiene una copia en memoria para consultas O(1)
+# (esta_dentro, ocupacion). Se actualiza con los eventos escritos en este
+# proceso (oyentes de core/event_writer.py) y se recarga de 'presence'
+# cada OCCUPANCY_REFRESH_SECONDS para recoger lo que escriban otras puertas.
+#
+# Si la tabla se corrompe o se restaura una copia de la BD,
+# rebuild_presence() la recalcula a partir del último evento de entrada o
+# salida de cada usuario (incluido el archivo).
+
+import threading
+import time
+
+from config import OCCUPANCY_REFRESH_SECONDS
+from .db_connection import get_connection
+from .event_writer import registrar_oyente
+from .retention import fuente_eventos
+from .db_manager import RESULTADOS_PERMITIDOS, RESULTADO_SALIDA, _sql_en
+
+
+def crear_presencia(c):
+    """
+    Crea la tabla y los triggers de presencia.
+
+    Returns:
+        bool: True si la tabla no existía (hay que reconstruirla)
+    """
+    nueva = c.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='presence'"
+    ).fetchone() is None
+
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS presence(
+      user_id INTEGER PRIMARY KEY,
+      since DATETIME NOT NULL,
+      device TEXT
+    );
+    """)
+    c.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_events_presence_in
+    AFTER INSERT ON events
+    WHEN NEW.user_id IS NOT NULL AND NEW.result IN {_sql_en(RESULTADOS_PERMITIDOS)}
+    BEGIN
+      INSERT OR REPLACE INTO presence(user_id, since, device)
+      VALUES(NEW.user_id, COALESCE(NEW.ts, CURRENT_TIMESTAMP), NEW.device);
+    END;
+    """)
+    c.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_events_presence_out
+    AFTER INSERT ON events
+    WHEN NEW.user_id IS NOT NULL AND NEW.result = '{RESULTADO_SALIDA}'
+    BEGIN
+      DELETE FROM presence WHERE user_id = NEW.user_id;
+    END;
+    """)
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_users_delete_presence
+    AFTER DELETE ON users
+    BEGIN
+      DELETE FROM presence WHERE user_id = OLD.id;
+    END;
+    """)
+    return nueva
+
+
+def rebuild_presence():
+    """
+    Recalcula 'presence' desde los eventos (calientes y archivados): está
+    dentro quien tiene como último movimiento una entrada permitida.
+
+    Returns:
+        int: Personas dentro
+    """
+    conn = get_connection()
+    movimientos = _sql_en(RESULTADOS_PERMITIDOS + (RESULTADO_SALIDA,))
+    with conn:
+        conn.execute("DELETE FROM presence")
+        conn.execute(f"""
+            INSERT INTO presence(user_id, since, device)
+            SELECT user_id, ts, device
+            FROM (
+                SELECT e.user_id, e.ts, e.device, e.result,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY e.user_id ORDER BY e.ts DESC, e.id DESC
+                       ) AS n
+                FROM {fuente_eventos(conn)} e
+                JOIN users u ON u.id = e.user_id
+                WHERE e.result IN {movimientos}
+            )
+            WHERE n = 1 AND result IN {_sql_en(RESULTADOS_PERMITIDOS)}
+        """)
+        total = conn.execute("SELECT COUNT(*) FROM presence").fetchone()[0]
+    indice = _indice
+    if indice is not None:
+        indice.recargar()
+    return total
+
+
+def get_occupants():
+    """
+    Personas dentro según la BD, de la más reciente a la más antigua.
+
+    Returns:
+        list: [(user_id, nombre, desde, puerta)]
+    """
+    return get_connection().execute("""
+        SELECT p.user_id, u.name, p.since, p.device
+        FROM presence p
+        LEFT JOIN users u ON u.id = p.user_id
+        ORDER BY p.since DESC, p.user_id
+    """).fetchall()
+
+
+class OccupancyIndex:
+    """Copia en memoria de 'presence' con consultas O(1)"""
+
+    def __init__(self, refresh_seconds=OCCUPANCY_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._dentro = {}                                   # user_id -> (desde, puerta)
+        self._cargado = None                                # Instante de la última recarga
+
+    def recargar(self):
+        """Lee 'presence' completa (una fila por persona dentro)"""
+        with self._lock:
+            filas = get_connection().execute(
+                "SELECT user_id, since, device FROM presence"
+            ).fetchall()
+            self._dentro = {uid: (desde, puerta) for uid, desde, puerta in filas}
+            self._cargado = time.monotonic()
+
+    def aplicar(self, filas):
+        """
+        Aplica eventos ya confirmados en la BD.
+
+        Args:
+            filas: [(ts, device, user_id, result, note)]
+        """
+        with self._lock:
+            for ts, device, user_id, result, _ in filas:
+                if user_id is None:
+                    continue
+                if result in RESULTADOS_PERMITIDOS:
+                    self._dentro[user_id] = (ts, device)
+                elif result == RESULTADO_SALIDA:
+                    self._dentro.pop(user_id, None)
+
+    def _vigente(self):
+        """Recarga si nunca se cargó o si venció el intervalo de refresco"""
+        if self._cargado is None or (
+            self.refresh_seconds is not None
+            and time.monotonic() - self._cargado >= self.refresh_seconds
+        ):
+            self.recargar()
+        return self._dentro
+
+    def esta_dentro(self, user_id):
+        """True si el usuario está dentro"""
+        return user_id in self._vigente()
+
+    def ocupacion(self):
+        """Número de personas dentro"""
+        return len(self._vigente())
+
+    def ocupantes(self):
+        """dict {user_id: (desde, puerta)} con una copia del estado actual"""
+        dentro = self._vigente()
+        with self._lock:
+            return dict(dentro)
+
+
+# ==================== INSTANCIA GLOBAL ====================
+
+_indice = None
+_indice_lock = threading.Lock()
+
+
+def get_occupancy_index():
+    """Índice global, suscrito a los eventos escritos por este proceso"""
+    global _indice
+    with _indice_lock:
+        if _indice is None:
+            _indice = OccupancyIndex()
+            registrar_oyente(_indice.aplicar)
+        return _indice
@@ -0,0 +1,174 @@
+# core/retention.py
+# --------------------------------------------
+# Retención, archivado y compactación de eventos
+# --------------------------------------------
+# La tabla 'events' solo conserva los últimos EVENT_HOT_DAYS días. Los
+# eventos más antiguos se copian por lotes a una BD de archivo adjunta
+# (ATTACH), después se borran de la principal y el fichero principal se
+# compacta con auto_vacuum incremental.
+#
+#   python -m core.retention            # archiva y compacta una vez
+
+import os
+
+from config import (
+    EVENT_HOT_DAYS,
+    EVENT_ARCHIVE_PATH,
+    RETENTION_BATCH_SIZE,
+    INCREMENTAL_VACUUM_PAGES,
+)
+from .db_connection import get_connection, ruta_actual
+
+ARCHIVO = "archivo"                                         # Alias de la BD adjunta
+
+
+def ruta_archivo():
+    """Ruta de la BD de archivo (junto a la BD principal)"""
+    if os.path.isabs(EVENT_ARCHIVE_PATH):
+        return EVENT_ARCHIVE_PATH
+    return os.path.join(os.path.dirname(os.path.abspath(ruta_actual())), EVENT_ARCHIVE_PATH)
+
+
+def adjuntar_archivo(conn=None, crear=True):
+    """
+    Adjunta la BD de archivo a la conexión si no lo está ya.
+
+    Returns:
+        bool: True si el archivo está disponible en la conexión
+    """
+    conn = conn or get_connection()
+    adjuntas = {fila[1] for fila in conn.execute("PRAGMA database_list")}
+    if ARCHIVO in adjuntas:
+        return True
+    path = ruta_archivo()
+    if not crear and not os.path.exists(path):
+        return False
+    conn.execute(f"ATTACH DATABASE ? AS {ARCHIVO}", (path,))
+    with conn:
+        conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ARCHIVO}.events(
+          id INTEGER PRIMARY KEY,
+          ts DATETIME,
+          device TEXT,
+          user_id INTEGER,
+          result TEXT,
+          note TEXT
+        );
+        """)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVO}.idx_archivo_ts ON events(ts);")
+    return True
+
+
+def fuente_eventos(conn=None, incluir_archivo=True):
+    """
+    Expresión FROM que cubre eventos calientes y archivados.
+
+    Devuelve 'events' si no hay archivo, de modo que las consultas sobre
+    el periodo caliente no pagan el coste de la unión.
+    """
+    if incluir_archivo and adjuntar_archivo(conn, crear=False):
+        return (f"(SELECT id, ts, device, user_id, result, note FROM main.events "
+                f"UNION ALL SELECT id, ts, device, user_id, result, note FROM {ARCHIVO}.events)")
+    return "events"
+
+
+def get_events_between(desde=None, hasta=None, limit=None):
+    """
+    Eventos entre dos fechas ('YYYY-MM-DD[ HH:MM:SS]'), leyendo de forma
+    transparente la tabla caliente y el archivo. Más recientes primero.
+    """
+    conn = get_connection()
+    condiciones, params = [], []
+    if desde:
+        condiciones.append("e.ts >= ?")
+        params.append(desde)
+    if hasta:
+        condiciones.append("e.ts <= ?")
+        params.append(hasta)
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    sql = f"""
+        SELECT e.id, e.ts, e.device, u.name, e.result, e.note
+        FROM {fuente_eventos(conn)} e
+        LEFT JOIN users u ON e.user_id = u.id
+        {where}
+        ORDER BY e.ts DESC, e.id DESC
+    """
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return conn.execute(sql, params).fetchall()
+
+
+def archivar_eventos(dias=EVENT_HOT_DAYS, lote=RETENTION_BATCH_SIZE):
+    """
+    Mueve al archivo los eventos con más de 'dias' días, en lotes de
+    'lote' filas para no bloquear a los escritores.
+
+    En modo WAL una transacción solo es atómica dentro de cada fichero, no
+    entre BDs adjuntas. Por eso cada lote va en dos transacciones: primero
+    se copia al archivo (INSERT OR IGNORE, repetible) y después se borran
+    de 'main' solo los ids que ya están en el archivo. Un corte entre las
+    dos deja el lote duplicado, nunca perdido, y la siguiente ejecución
+    termina de moverlo.
+
+    Returns:
+        int: número de eventos archivados
+    """
+    conn = get_connection()
+    adjuntar_archivo(conn)
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS _lote_archivo(id INTEGER PRIMARY KEY)")
+    limite = f"-{int(dias)} days"
+    total = 0
+    while True:
+        with conn:
+            conn.execute("DELETE FROM _lote_archivo")
+            conn.execute("""
+                INSERT INTO _lote_archivo(id)
+                SELECT id FROM main.events
+                WHERE ts < datetime('now', ?)
+                ORDER BY ts
+                LIMIT ?
+            """, (limite, lote))
+            seleccionados = conn.execute("SELECT COUNT(*) FROM _lote_archivo").fetchone()[0]
+            if seleccionados:
+                conn.execute(f"""
+                    INSERT OR IGNORE INTO {ARCHIVO}.events(id, ts, device, user_id, result, note)
+                    SELECT e.id, e.ts, e.device, e.user_id, e.result, e.note
+                    FROM main.events e JOIN _lote_archivo l ON l.id = e.id
+                """)
+        if not seleccionados:
+            return total
+        with conn:
+            movidos = conn.execute(f"""
+                DELETE FROM main.events
+                WHERE id IN (SELECT l.id FROM _lote_archivo l
+                             JOIN {ARCHIVO}.events a ON a.id = l.id)
+            """).rowcount
+        total += movidos
+        if seleccionados < lote or not movidos:
+            return total
+
+
+def compactar(paginas=INCREMENTAL_VACUUM_PAGES):
+    """Libera páginas vacías del fichero principal (auto_vacuum incremental)"""
+    conn = get_connection()
+    libres_antes = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    # executescript avanza la sentencia hasta el final; execute() solo
+    # liberaría una página por llamada
+    conn.executescript(f"PRAGMA incremental_vacuum({int(paginas)});")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    libres_despues = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return libres_antes - libres_despues
+
+
+def aplicar_retencion(dias=EVENT_HOT_DAYS):
+    """Archiva los eventos antiguos y compacta la BD principal"""
+    archivados = archivar_eventos(dias)
+    paginas = compactar() if archivados else 0
+    return {"archivados": archivados, "paginas_liberadas": paginas}
+
+
+if __name__ == "__main__":
+    from .db_manager import ensure_schema
+    ensure_schema()
+    print(aplicar_retencion())
@@ -0,0 +1,387 @@
+# core/telemetry.py
+# --------------------------------------------
+# Telemetría de los bucles de vídeo (FPS, tiempos y frames perdidos)
+# --------------------------------------------
+# Cada bucle de vista previa (puerta, registro en el panel, diálogo de
+# rostros) tiene un VideoTelemetry con nombre que mide, por frame:
+#
+#   t0 = telemetria.inicio()           # al entrar en el callback de after()
+#   ret, frame = cap.read()
+#   telemetria.captura(ret, t0)        # FPS de captura y tiempo de lectura
+#   ...                                # flip, overlays, conversión PIL
+#   telemetria.render(t0)              # FPS de render y tiempo de proceso
+#   root.after(ms, ...)
+#   telemetria.programar(ms)           # ritmo esperado del siguiente frame
+#
+# Un frame se cuenta como perdido cuando el periodo real entre callbacks
+# cubre más de un periodo esperado (el mayor entre el intervalo programado
+# y el de la cámara); el ritmo lento intencionado de MotionGate en reposo
+# no cuenta como pérdida. Las lecturas fallidas de la cámara también.
+#
+# Las métricas de todos los bucles se exportan en formato de texto de
+# Prometheus a TELEMETRY_PROM_FILE (escritura atómica, apto para el
+# textfile collector de node_exporter) y/o en GET /metrics en
+# 127.0.0.1:TELEMETRY_PROM_PORT.
+
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+from config import (
+    DEVICE_NAME,
+    TELEMETRY_OVERLAY,
+    TELEMETRY_CAMERA_FPS,
+    TELEMETRY_PROM_FILE,
+    TELEMETRY_PROM_PORT,
+    TELEMETRY_EXPORT_SECONDS,
+)
+from .tracing import Histograma
+
+_VENTANA_FPS_S = 1.0                                        # Ventana de cálculo de FPS
+_REINICIO_S = 5.0                                           # Hueco mayor: el bucle se paró, no es pérdida
+_INACTIVO_S = 5.0                                           # Sin frames desde entonces: FPS = 0
+
+overlay_activo = TELEMETRY_OVERLAY
+
+
+def alternar_overlay():
+    """Muestra u oculta el overlay en todos los bucles; devuelve el estado nuevo"""
+    global overlay_activo
+    overlay_activo = not overlay_activo
+    return overlay_activo
+
+
+class VideoTelemetry:
+    """Contadores y tiempos de un bucle de vista previa"""
+
+    def __init__(self, nombre, fps_camara=TELEMETRY_CAMERA_FPS, ventana_s=TELEMETRY_EXPORT_SECONDS):
+        self.nombre = nombre
+        self.periodo_camara = 1.0 / fps_camara if fps_camara else 0.0
+        self.ventana_s = ventana_s                          # Los percentiles cubren 1-2 ventanas
+        self._lock = threading.Lock()
+
+        # Contadores acumulados (counters de Prometheus)
+        self.frames = 0                                     # Callbacks del bucle
+        self.capturados = 0                                 # Lecturas correctas de la cámara
+        self.renderizados = 0                               # Frames pintados en el canvas
+        self.perdidos = 0
+        self.lecturas_fallidas = 0
+        self.proceso_total_s = 0.0
+        self.lectura_total_s = 0.0
+
+        # Ritmo
+        self._ultimo_inicio = None
+        self._periodo_esperado = None
+        self._ultimo_frame = None
+
+        # FPS por ventana de ~1 s
+        self._ventana_inicio = time.perf_counter()
+        self._ventana_capturas = 0
+        self._ventana_renders = 0
+        self.fps_captura = 0.0
+        self.fps_render = 0.0
+        self.ultimo_proceso_ms = 0.0
+
+        # Percentiles recientes: ventana actual + anterior
+        self._proceso = Histograma()
+        self._proceso_previo = Histograma()
+        self._lectura = Histograma()
+        self._lectura_previo = Histograma()
+        self._rotacion = time.perf_counter()
+
+    # ---------- medición (hilo de Tk) ----------
+
+    def inicio(self):
+        """Marca el comienzo de un frame; devuelve t0 para captura() y render()"""
+        t0 = time.perf_counter()
+        with self._lock:
+            self.frames += 1
+            if self._ultimo_inicio is not None and self._periodo_esperado:
+                periodo = t0 - self._ultimo_inicio
+                if periodo < _REINICIO_S:
+                    self.perdidos += max(0, int(periodo / self._periodo_esperado) - 1)
+            self._ultimo_inicio = t0
+            self._periodo_esperado = None                   # Lo fija programar() si el bucle sigue
+            self._ultimo_frame = t0
+            self._rotar(t0)
+        return t0
+
+    def captura(self, ok, t0):
+        """Resultado de cap.read() (ok) iniciado en t0"""
+        lectura = time.perf_counter() - t0
+        with self._lock:
+            if ok:
+                self.capturados += 1
+                self._ventana_capturas += 1
+            else:
+                self.lecturas_fallidas += 1
+                self.perdidos += 1
+            self.lectura_total_s += lectura
+            self._lectura.registrar(lectura * 1000)
+
+    def render(self, t0):
+        """Frame pintado; el proceso va desde t0 hasta aquí"""
+        proceso = time.perf_counter() - t0
+        with self._lock:
+            self.renderizados += 1
+            self._ventana_renders += 1
+            self.proceso_total_s += proceso
+            self.ultimo_proceso_ms = proceso * 1000
+            self._proceso.registrar(proceso * 1000)
+
+    def programar(self, intervalo_ms):
+        """Intervalo con el que se reprogramó el bucle (after)"""
+        with self._lock:
+            self._periodo_esperado = max(intervalo_ms / 1000, self.periodo_camara)
+
+    def detener(self):
+        """El bucle se para a propósito: el hueco hasta que vuelva no son pérdidas"""
+        with self._lock:
+            self._ultimo_inicio = None
+            self._periodo_esperado = None
+
+    def _rotar(self, ahora):
+        """Recalcula FPS y rota los histogramas (con el lock tomado)"""
+        transcurrido = ahora - self._ventana_inicio
+        if transcurrido >= _VENTANA_FPS_S:
+            self.fps_captura = self._ventana_capturas / transcurrido
+            self.fps_render = self._ventana_renders / transcurrido
+            self._ventana_inicio = ahora
+            self._ventana_capturas = 0
+            self._ventana_renders = 0
+        if ahora - self._rotacion >= self.ventana_s:
+            self._proceso_previo, self._proceso = self._proceso, Histograma()
+            self._lectura_previo, self._lectura = self._lectura, Histograma()
+            self._rotacion = ahora
+
+    # ---------- consulta ----------
+
+    def activo(self):
+        """True si el bucle ha procesado algún frame hace poco"""
+        return self._ultimo_frame is not None and time.perf_counter() - self._ultimo_frame < _INACTIVO_S
+
+    def estadisticas(self):
+        """
+        Estado actual del bucle.
+
+        Returns:
+            dict: 'bucle', 'activo', 'fps_captura', 'fps_render', 'frames',
+                  'capturados', 'renderizados', 'perdidos',
+                  'lecturas_fallidas', 'proceso' y 'lectura' (resúmenes de
+                  Histograma de las últimas 1-2 ventanas), 'proceso_total_s'
+                  y 'lectura_total_s'
+        """
+        activo = self.activo()
+        with self._lock:
+            proceso, lectura = Histograma(), Histograma()
+            proceso.fusionar(self._proceso_previo)
+            proceso.fusionar(self._proceso)
+            lectura.fusionar(self._lectura_previo)
+            lectura.fusionar(self._lectura)
+            return {
+                "bucle": self.nombre,
+                "activo": activo,
+                "fps_captura": round(self.fps_captura, 2) if activo else 0.0,
+                "fps_render": round(self.fps_render, 2) if activo else 0.0,
+                "frames": self.frames,
+                "capturados": self.capturados,
+                "renderizados": self.renderizados,
+                "perdidos": self.perdidos,
+                "lecturas_fallidas": self.lecturas_fallidas,
+                "proceso": proceso.resumen(),
+                "lectura": lectura.resumen(),
+                "proceso_total_s": self.proceso_total_s,
+                "lectura_total_s": self.lectura_total_s,
+            }
+
+    def texto_overlay(self):
+        return (f"cap {self.fps_captura:.1f} / ren {self.fps_render:.1f} FPS | "
+                f"{self.ultimo_proceso_ms:.1f} ms | perdidos {self.perdidos}")
+
+    def dibujar(self, frame):
+        """Escribe el overlay sobre el frame (BGR, ya volteado) si está activo"""
+        if overlay_activo:
+            h = frame.shape[0]
+            texto = self.texto_overlay()
+            cv2.putText(frame, texto, (10, h - 40), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 3)
+            cv2.putText(frame, texto, (10, h - 40), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        return frame
+
+
+# ==================== REGISTRO GLOBAL ====================
+
+_bucles = {}
+_bucles_lock = threading.Lock()
+
+
+def get_video_telemetry(nombre):
+    """Telemetría del bucle 'nombre' (se crea en el primer uso y se reutiliza)"""
+    with _bucles_lock:
+        telemetria = _bucles.get(nombre)
+        if telemetria is None:
+            telemetria = _bucles[nombre] = VideoTelemetry(nombre)
+        return telemetria
+
+
+def estadisticas_video():
+    """bucle -> estadisticas() de todos los bucles registrados"""
+    with _bucles_lock:
+        bucles = list(_bucles.values())
+    return {t.nombre: t.estadisticas() for t in bucles}
+
+
+# ==================== FORMATO PROMETHEUS ====================
+
+_METRICAS = [
+    # (nombre, tipo, ayuda, función estadísticas -> valor)
+    ("acceso_video_activo", "gauge",
+     "1 si el bucle ha pintado frames en los últimos segundos",
+     lambda e: 1 if e["activo"] else 0),
+    ("acceso_video_fps_captura", "gauge",
+     "Frames leídos de la cámara por segundo (último segundo)",
+     lambda e: e["fps_captura"]),
+    ("acceso_video_fps_render", "gauge",
+     "Frames pintados en pantalla por segundo (último segundo)",
+     lambda e: e["fps_render"]),
+    ("acceso_video_frames_total", "counter",
+     "Frames procesados por el bucle",
+     lambda e: e["frames"]),
+    ("acceso_video_frames_perdidos_total", "counter",
+     "Frames perdidos por retraso del bucle o lectura fallida",
+     lambda e: e["perdidos"]),
+    ("acceso_video_lecturas_fallidas_total", "counter",
+     "Lecturas de la cámara sin frame",
+     lambda e: e["lecturas_fallidas"]),
+]
+
+_CUANTILES = (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("0.99", "p99_ms"))
+
+
+def _etiquetas(**valores):
+    partes = []
+    for clave, valor in valores.items():
+        valor = str(valor).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        partes.append(f'{clave}="{valor}"')
+    return "{" + ",".join(partes) + "}"
+
+
+def texto_prometheus(device=DEVICE_NAME):
+    """Métricas de todos los bucles en el formato de texto de Prometheus 0.0.4"""
+    estadisticas = estadisticas_video()
+    lineas = []
+    for nombre, tipo, ayuda, valor in _METRICAS:
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} {tipo}")
+        for bucle, e in estadisticas.items():
+            lineas.append(f"{nombre}{_etiquetas(device=device, bucle=bucle)} {valor(e)}")
+
+    for nombre, clave, total, ayuda in (
+            ("acceso_video_proceso_segundos", "proceso", "proceso_total_s",
+             "Tiempo por frame desde el callback hasta pintar (cuantiles recientes)"),
+            ("acceso_video_lectura_segundos", "lectura", "lectura_total_s",
+             "Tiempo de cap.read() por frame (cuantiles recientes)")):
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} summary")
+        for bucle, e in estadisticas.items():
+            for cuantil, campo in _CUANTILES:
+                etiquetas = _etiquetas(device=device, bucle=bucle, quantile=cuantil)
+                lineas.append(f"{nombre}{etiquetas} {e[clave][campo] / 1000:.6f}")
+            etiquetas = _etiquetas(device=device, bucle=bucle)
+            lineas.append(f"{nombre}_sum{etiquetas} {e[total]:.6f}")
+            cuenta = e["renderizados"] if clave == "proceso" else e["capturados"] + e["lecturas_fallidas"]
+            lineas.append(f"{nombre}_count{etiquetas} {cuenta}")
+    return "\n".join(lineas) + "\n"
+
+
+def escribir_metricas(ruta=TELEMETRY_PROM_FILE):
+    """Escribe texto_prometheus() en 'ruta' de forma atómica (tmp + rename)"""
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        f.write(texto_prometheus())
+    os.replace(temporal, ruta)
+
+
+# ==================== EXPORTADOR ====================
+
+class _ManejadorMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        cuerpo = texto_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        pass                                                # Sin una línea por cada scrape
+
+
+class _ServidorMetricas(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class MetricsExporter:
+    """Hilo que reescribe el fichero de métricas y, opcionalmente, sirve /metrics"""
+
+    def __init__(self, ruta=TELEMETRY_PROM_FILE, puerto=TELEMETRY_PROM_PORT,
+                 intervalo_s=TELEMETRY_EXPORT_SECONDS):
+        self.ruta = ruta
+        self.puerto = puerto
+        self.intervalo_s = intervalo_s
+        self._parar = threading.Event()
+        self._hilo = None
+        self._servidor = None
+
+    def iniciar(self):
+        if self.puerto:
+            self._servidor = _ServidorMetricas(("127.0.0.1", self.puerto), _ManejadorMetricas)
+            threading.Thread(target=self._servidor.serve_forever, name="metricas-http",
+                             daemon=True).start()
+        if self.ruta:
+            self._hilo = threading.Thread(target=self._bucle, name="metricas", daemon=True)
+            self._hilo.start()
+        return self
+
+    def _bucle(self):
+        while not self._parar.wait(self.intervalo_s):
+            self._escribir()
+
+    def _escribir(self):
+        try:
+            escribir_metricas(self.ruta)
+        except OSError as e:
+            print(f"[telemetría] no se pudo escribir {self.ruta}: {e}")
+
+    def detener(self):
+        """Para el hilo, deja un último volcado y cierra el servidor"""
+        self._parar.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=2)
+            self._escribir()
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+
+
+_exportador = None
+
+
+def iniciar_exportador_metricas():
+    """Arranca el exportador si hay fichero o puerto configurado (idempotente)"""
+    global _exportador
+    if _exportador is None and (TELEMETRY_PROM_FILE or TELEMETRY_PROM_PORT):
+        _exportador = MetricsExporter().iniciar()
+    return _exportador
+
+
+def detener_exportador_metricas():
+    global _exportador
+    if _exportador is not None:
+        _exportador.detener()
+        _exportador = None
@@ -0,0 +1,253 @@
+# core/tracing.py
+# --------------------------------------------
+# Trazas de latencia por etapa
+# --------------------------------------------
+# Spans ligeros (gestor de contexto o decorador) que acumulan la duración
+# de cada etapa en histogramas en memoria de tipo HDR: cubos logarítmicos
+# con 32 subdivisiones por potencia de dos, de modo que p50/p95/p99 tienen
+# un error relativo <= 3 % con memoria fija y sin guardar muestras.
+#
+#   with tracing.span("db.consulta"):
+#       ...
+#
+#   @tracing.trazado("deepface.embedding")
+#   def get_embedding_deepface(frame): ...
+#
+# Se activa con TRACING_ENABLED, que se lee al importar: desactivado,
+# trazado() devuelve la función original y span() un objeto nulo
+# compartido, así que el coste es nulo. Con TRACE_PERSIST cada intento de
+# verificación deja además una fila en la tabla 'traces' con los tiempos
+# de sus etapas, que el panel puede agregar para todas las puertas.
+
+import functools
+import json
+import threading
+from time import perf_counter
+
+from config import TRACING_ENABLED, TRACE_PERSIST
+from .db_connection import get_connection
+from .event_writer import timestamp_utc
+
+ACTIVO = TRACING_ENABLED
+PERSISTIR = TRACING_ENABLED and TRACE_PERSIST
+
+_SUB = 32                                                   # Subdivisiones por potencia de 2
+_BITS = _SUB.bit_length()                                   # log2(2 * _SUB)
+_MAX_US = (1 << 37) - 1                                     # ~38 h
+
+
+def _indice(us):
+    """Cubo de un valor en microsegundos"""
+    if us < 2 * _SUB:
+        return us
+    e = us.bit_length() - _BITS
+    return e * _SUB + (us >> e)
+
+
+def _valor(indice):
+    """Valor representativo (centro) de un cubo, en microsegundos"""
+    if indice < 2 * _SUB:
+        return indice
+    e = indice // _SUB - 1
+    return ((indice - e * _SUB) << e) + (1 << (e - 1))
+
+
+class Histograma:
+    """Histograma de latencias (ms) con cubos logarítmicos"""
+
+    def __init__(self):
+        self.cuentas = [0] * (_indice(_MAX_US) + 1)
+        self.n = 0
+        self.suma_ms = 0.0
+        self.max_ms = 0.0
+
+    def registrar(self, ms):
+        us = min(max(int(ms * 1000), 0), _MAX_US)
+        self.cuentas[_indice(us)] += 1
+        self.n += 1
+        self.suma_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def fusionar(self, otro):
+        for i, c in enumerate(otro.cuentas):
+            if c:
+                self.cuentas[i] += c
+        self.n += otro.n
+        self.suma_ms += otro.suma_ms
+        self.max_ms = max(self.max_ms, otro.max_ms)
+
+    def percentil(self, p):
+        """Percentil p (0-100) en ms"""
+        if not self.n:
+            return 0.0
+        objetivo = max(1, int(p / 100 * self.n + 0.5))
+        acumulado = 0
+        for i, c in enumerate(self.cuentas):
+            acumulado += c
+            if acumulado >= objetivo:
+                return min(_valor(i) / 1000, self.max_ms)
+        return self.max_ms
+
+    def resumen(self):
+        """dict con n, media_ms, p50_ms, p95_ms, p99_ms y max_ms"""
+        return {
+            "n": self.n,
+            "media_ms": round(self.suma_ms / self.n, 3) if self.n else 0.0,
+            "p50_ms": round(self.percentil(50), 3),
+            "p95_ms": round(self.percentil(95), 3),
+            "p99_ms": round(self.percentil(99), 3),
+            "max_ms": round(self.max_ms, 3),
+        }
+
+
+# ==================== HISTOGRAMAS DEL PROCESO ====================
+
+_histogramas = {}
+_lock = threading.Lock()
+
+
+def registrar(nombre, ms):
+    """Añade una duración (ms) al histograma 'nombre'"""
+    with _lock:
+        h = _histogramas.get(nombre)
+        if h is None:
+            h = _histogramas[nombre] = Histograma()
+        h.registrar(ms)
+
+
+def informe():
+    """
+    Resumen de los histogramas en memoria de este proceso.
+
+    Returns:
+        dict: nombre -> resumen (ver Histograma.resumen), ordenado por nombre
+    """
+    with _lock:
+        return {nombre: _histogramas[nombre].resumen() for nombre in sorted(_histogramas)}
+
+
+def reiniciar():
+    """Vacía los histogramas en memoria"""
+    with _lock:
+        _histogramas.clear()
+
+
+# ==================== SPANS ====================
+
+class _SpanNulo:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULO = _SpanNulo()
+
+
+class _Span:
+    __slots__ = ("nombre", "inicio")
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+
+    def __enter__(self):
+        self.inicio = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        registrar(self.nombre, (perf_counter() - self.inicio) * 1000)
+        return False
+
+
+def span(nombre):
+    """Gestor de contexto que mide el bloque (nulo si está desactivado)"""
+    return _Span(nombre) if ACTIVO else _NULO
+
+
+def trazado(nombre):
+    """Decorador que mide cada llamada (sin envoltura si está desactivado)"""
+    def decorador(funcion):
+        if not ACTIVO:
+            return funcion
+
+        @functools.wraps(funcion)
+        def medida(*args, **kwargs):
+            inicio = perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                registrar(nombre, (perf_counter() - inicio) * 1000)
+        return medida
+    return decorador
+
+
+# ==================== TRAZAS POR INTENTO ====================
+
+def crear_tabla_trazas(c):
+    """Tabla de trazas por intento (dentro de la transacción de ensure_schema)"""
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS traces(
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      ts DATETIME NOT NULL,
+      device TEXT,
+      resultado TEXT,
+      total_ms REAL NOT NULL,
+      etapas_json TEXT NOT NULL
+    );
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_traces_ts ON traces(ts);")
+
+
+def guardar_traza(device, resultado, total_ms, etapas):
+    """
+    Guarda la traza de un intento si TRACE_PERSIST está activo.
+
+    Args:
+        etapas: dict etapa -> ms (VerificacionTerminada.tiempos)
+    """
+    if not PERSISTIR:
+        return
+    try:
+        conn = get_connection()
+        with conn:
+            conn.execute(
+                "INSERT INTO traces(ts, device, resultado, total_ms, etapas_json) "
+                "VALUES(?, ?, ?, ?, ?)",
+                (timestamp_utc(), device, resultado, round(total_ms, 3), json.dumps(etapas))
+            )
+    except Exception as e:
+        print(f"[trazas] no se pudo guardar la traza: {e}")
+
+
+def informe_trazas(desde=None, device=None):
+    """
+    Percentiles por etapa a partir de la tabla 'traces' (todas las puertas
+    y procesos que comparten la BD).
+
+    Args:
+        desde: Timestamp mínimo ('YYYY-MM-DD HH:MM:SS', UTC)
+        device: Filtrar por puerta
+
+    Returns:
+        dict: etapa -> resumen; 'total' es el intento completo
+    """
+    condiciones, params = [], []
+    if desde:
+        condiciones.append("ts >= ?")
+        params.append(desde)
+    if device:
+        condiciones.append("device = ?")
+        params.append(device)
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+
+    histogramas = {}
+    cur = get_connection().execute(f"SELECT total_ms, etapas_json FROM traces {where}", params)
+    for total_ms, etapas_json in cur:
+        histogramas.setdefault("total", Histograma()).registrar(total_ms)
+        for etapa, ms in json.loads(etapas_json).items():
+            histogramas.setdefault(etapa, Histograma()).registrar(ms)
+    return {nombre: histogramas[nombre].resumen() for nombre in sorted(histogramas)}
@@ -0,0 +1,564 @@
+# core/verification_pipeline.py
+# --------------------------------------------
+# Verificación por etapas fuera del hilo de la interfaz
+# --------------------------------------------
+# Un intento de acceso recorre las etapas
+#
+#   gesto -> captura -> embedding -> coincidencia -> pin -> decision
+#
+# Cada etapa se ejecuta en un hilo de trabajo con su propio plazo
+# (VERIFICATION_TIMEOUTS) y se puede cancelar. El progreso se publica como
+# eventos tipados (EtapaIniciada, ProgresoGesto, PinSolicitado,
+# EtapaTerminada, VerificacionTerminada) en una cola: la GUI la vacía con
+# after() desde el hilo de Tk (utils.tk_async.drenar_cola) y nunca toca
+# widgets desde otro hilo. El controlador sin pantalla recibe los mismos
+# eventos con un callback.
+#
+# Los frames llegan por una fuente con siguiente(timeout): UltimoFrame
+# cuando otro hilo lee la cámara (la GUI) o CamaraFrames para leerla
+# directamente. El PIN se pide a un objeto con leer_pin(nombre); BuzonPin
+# recibe el PIN desde otro hilo (un diálogo de Tk).
+
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from dataclasses import dataclass, field
+
+import cv2
+
+from config import (
+    DEVICE_NAME,
+    FACE_THRESHOLD,
+    GESTURE_FRAMES_REQUIRED,
+    VERIFICATION_TIMEOUTS,
+    PIN_CHECK_MIN_SECONDS,
+)
+from .credentials import get_credential_service
+from .db_manager import log_event, get_user_credentials
+from .face_recognition import best_match_per_user
+from .gallery_snapshot import GallerySnapshot
+from .gesture_detection import GestureDetector
+from .inference_scheduler import get_inference_scheduler
+from . import tracing
+
+ETAPAS = ("gesto", "captura", "embedding", "coincidencia", "pin", "decision")
+
+
+# ==================== EVENTOS ====================
+
+@dataclass(frozen=True)
+class EtapaIniciada:
+    etapa: str
+    texto: str                                              # Mensaje para el usuario
+
+
+@dataclass(frozen=True)
+class EtapaTerminada:
+    etapa: str
+    duracion_ms: float
+    estado: str                                             # ok | fallo | tiempo_agotado | cancelada | error
+
+
+@dataclass(frozen=True)
+class ProgresoGesto:
+    gesto: str
+    frames_correctos: int
+    frames_necesarios: int
+    correcto: bool                                          # El último frame cumplía el gesto
+    manos: tuple = ()                                       # Landmarks de MediaPipe (para dibujar)
+
+    @property
+    def fraccion(self):
+        return min(self.frames_correctos / self.frames_necesarios, 1.0)
+
+
+@dataclass(frozen=True)
+class PinSolicitado:
+    user_id: int
+    nombre: str
+
+
+@dataclass(frozen=True)
+class VerificacionTerminada:
+    resultado: str                                          # permitido | denegado | cancelado | error
+    user_id: int = None
+    nombre: str = None
+    motivo: str = None
+    score: float = None
+    tiempos: dict = field(default_factory=dict)             # etapa -> ms
+
+    def como_dict(self):
+        return {
+            "resultado": self.resultado,
+            "user_id": self.user_id,
+            "motivo": self.motivo,
+            "score": self.score,
+            "tiempos": dict(self.tiempos),
+        }
+
+
+# ==================== FUENTES DE FRAMES Y PIN ====================
+
+class UltimoFrame:
+    """
+    Último frame publicado por el hilo que lee la cámara. siguiente()
+    espera a uno posterior al último entregado (los intermedios se
+    descartan: la verificación nunca se queda atrás).
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self._secuencia = 0
+        self._entregado = 0
+
+    def publicar(self, frame):
+        with self._cond:
+            self._frame = frame
+            self._secuencia += 1
+            self._cond.notify_all()
+
+    def siguiente(self, timeout=None):
+        """Frame nuevo, o None si no llega ninguno a tiempo"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._secuencia != self._entregado, timeout):
+                return None
+            self._entregado = self._secuencia
+            return self._frame
+
+
+class CamaraFrames:
+    """Lee frames directamente de un objeto tipo cv2.VideoCapture"""
+
+    def __init__(self, cap):
+        self.cap = cap
+
+    def siguiente(self, timeout=None):
+        ret, frame = self.cap.read()
+        if not ret:
+            time.sleep(min(timeout or 0.05, 0.05))          # Cámara sin frame disponible
+            return None
+        return frame
+
+
+class BuzonPin:
+    """
+    Fuente de PIN alimentada desde otro hilo: la etapa 'pin' espera en
+    leer_pin() hasta que el diálogo llama a entregar() o cancelar().
+    """
+
+    def __init__(self, timeout=VERIFICATION_TIMEOUTS.get("pin")):
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._turno = 0
+        self._pin = None
+        self._entregado = False
+
+    def leer_pin(self, nombre):
+        with self._cond:
+            self._turno += 1
+            turno = self._turno
+            self._entregado = False
+            self._cond.notify_all()                         # Libera esperas de intentos anteriores
+            listo = self._cond.wait_for(
+                lambda: self._entregado or self._turno != turno, self.timeout
+            )
+            if not listo or self._turno != turno:
+                return None
+            self._entregado = False
+            return self._pin
+
+    def entregar(self, pin):
+        with self._cond:
+            self._pin = pin
+            self._entregado = True
+            self._cond.notify_all()
+
+    def cancelar(self):
+        self.entregar(None)
+
+
+# ==================== ETAPAS ====================
+
+class _Cancelado(Exception):
+    def __init__(self, motivo="Cancelado", user_id=None):
+        super().__init__(motivo)
+        self.motivo = motivo
+        self.user_id = user_id
+
+
+class _TiempoAgotado(Exception):
+    def __init__(self, etapa):
+        super().__init__(etapa)
+        self.etapa = etapa
+
+
+class _Denegado(Exception):
+    """Denegación; 'nota' se registra como evento (None = no se registra)"""
+
+    def __init__(self, user_id, nota, motivo, score=None):
+        super().__init__(motivo)
+        self.user_id = user_id
+        self.nota = nota
+        self.motivo = motivo
+        self.score = score
+
+
+class _Plazo:
+    """Límite de tiempo y cancelación de una etapa"""
+
+    def __init__(self, etapa, cancelado, timeout):
+        self.etapa = etapa
+        self._cancelado = cancelado
+        self.limite = time.monotonic() + timeout if timeout is not None else None
+
+    def restante(self):
+        if self.limite is None:
+            return None
+        return max(0.0, self.limite - time.monotonic())
+
+    def prorrogar(self, segundos):
+        """Garantiza al menos 'segundos' más de plazo desde ahora"""
+        if self.limite is not None:
+            self.limite = max(self.limite, time.monotonic() + segundos)
+
+    def vencido(self):
+        return self.limite is not None and time.monotonic() >= self.limite
+
+    def comprobar(self):
+        """Lanza la excepción adecuada si la etapa debe terminar"""
+        if self._cancelado.is_set():
+            raise _Cancelado()
+        if self.vencido():
+            raise _TiempoAgotado(self.etapa)
+
+    def esperar(self, segundos):
+        """time.sleep() interrumpible por cancelación y limitado al plazo"""
+        restante = self.restante()
+        if restante is not None:
+            segundos = min(segundos, restante)
+        self._cancelado.wait(segundos)
+        self.comprobar()
+
+
+def coincidencia(query_emb, faces):
+    """
+    Mejor usuario para un embedding, contra la instantánea de la galería o
+    contra el diccionario de embeddings.
+
+    Returns:
+        tuple: (best_user_id, best_score)
+    """
+    if isinstance(faces, GallerySnapshot):
+        return faces.mejor_coincidencia(query_emb)
+    return best_match_per_user(query_emb, faces)
+
+
+def hash_pin_usuario(user_id, user):
+    """
+    Hash del PIN de un usuario de la galería. La galería en memoria
+    compartida no lleva hashes: se buscan por clave primaria.
+
+    Returns:
+        str o None si el usuario ya no existe o está inactivo
+    """
+    if user.get("pin") is not None:
+        return user["pin"]
+    credenciales = get_user_credentials(user_id)
+    return credenciales["pin"] if credenciales else None
+
+
+# ==================== PIPELINE ====================
+
+class VerificationPipeline:
+    """Ejecuta intentos de verificación por etapas en hilos de trabajo"""
+
+    def __init__(self, frames, pin_source, gallery, device=DEVICE_NAME,
+                 embed_fn=None, notificar=None, timeouts=None,
+                 frames_necesarios=GESTURE_FRAMES_REQUIRED, motion_gate=None,
+                 espejo_gestos=True, espera_captura=0.0):
+        self.frames = frames                                # Objeto con siguiente(timeout)
+        self.pin_source = pin_source                        # Objeto con leer_pin(nombre)
+        self.gallery = gallery                              # GalleryCache o compatible
+        self.device = device
+        self.embed_fn = embed_fn or get_inference_scheduler()  # Frame -> embedding (micro-lotes)
+        self.eventos = queue.Queue()
+        self.notificar = notificar or self.eventos.put      # Destino de los eventos
+        self.timeouts = dict(VERIFICATION_TIMEOUTS, **(timeouts or {}))
+        self.frames_necesarios = frames_necesarios
+        self.motion_gate = motion_gate                      # Opcional: MediaPipe solo con movimiento
+        self.espejo_gestos = espejo_gestos                  # Gestos sobre la imagen en espejo
+        self.espera_captura = espera_captura                # Pausa antes de capturar el rostro
+        self.detector = GestureDetector()
+        self.hands = None                                   # MediaPipe se carga bajo demanda
+
+        # Dos hilos: una etapa abandonada por tiempo no bloquea el siguiente intento
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="verificacion")
+        self._cancelado = threading.Event()
+        self._despertar = threading.Event()
+        self._hilo = None
+        self._tiempos = None
+
+        self._stats_lock = threading.Lock()
+        self._stats = {etapa: {"n": 0, "total_ms": 0.0, "max_ms": 0.0, "tiempos_agotados": 0}
+                       for etapa in ETAPAS}
+
+    # ---------- API pública ----------
+
+    def iniciar(self, gesto=None):
+        """
+        Lanza un intento en un hilo propio; el resultado llega como
+        VerificacionTerminada. Devuelve False si ya hay uno en curso.
+        """
+        if self.en_curso():
+            return False
+        self._hilo = threading.Thread(target=self.ejecutar, args=(gesto,),
+                                      name="verificacion", daemon=True)
+        self._hilo.start()
+        return True
+
+    def en_curso(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def cancelar(self):
+        """Cancela el intento en curso (la etapa activa termina en cuanto puede)"""
+        self._cancelado.set()
+        self._despertar.set()
+        cancelar_pin = getattr(self.pin_source, "cancelar", None)
+        if cancelar_pin:
+            cancelar_pin()
+
+    def ejecutar(self, gesto=None):
+        """
+        Ejecuta un intento completo en el hilo actual.
+
+        Args:
+            gesto: Gesto a pedir (clave de gestos_disponibles); por defecto
+                   uno al azar. Fijarlo sirve para reproducir grabaciones.
+
+        Returns:
+            VerificacionTerminada (también se publica como evento)
+        """
+        # Evento nuevo por intento: las etapas abandonadas de un intento
+        # anterior siguen viendo el suyo cancelado
+        self._cancelado = threading.Event()
+        self._tiempos = tiempos = {}
+        contexto = {}
+        inicio = time.perf_counter()
+        try:
+            resultado = self._verificar(contexto, gesto)
+        except _Denegado as d:
+            if d.nota:
+                log_event(d.user_id, "Entrada Denegada", d.nota, device=self.device)
+            resultado = VerificacionTerminada("denegado", d.user_id, contexto.get("nombre"),
+                                              d.motivo, d.score, tiempos)
+        except _TiempoAgotado as t:
+            nota = "Tiempo para gesto agotado" if t.etapa == "gesto" else f"Tiempo agotado ({t.etapa})"
+            log_event(contexto.get("user_id"), "Entrada Denegada", nota, device=self.device)
+            resultado = VerificacionTerminada("denegado", contexto.get("user_id"),
+                                              contexto.get("nombre"), "Tiempo agotado",
+                                              contexto.get("score"), tiempos)
+        except _Cancelado as c:
+            resultado = VerificacionTerminada("cancelado", c.user_id or contexto.get("user_id"),
+                                              contexto.get("nombre"), c.motivo,
+                                              contexto.get("score"), tiempos)
+        except Exception as e:
+            resultado = VerificacionTerminada("error", contexto.get("user_id"),
+                                              contexto.get("nombre"), str(e) or type(e).__name__,
+                                              contexto.get("score"), tiempos)
+        if tracing.ACTIVO:
+            total = (time.perf_counter() - inicio) * 1000
+            tracing.registrar("verificacion.total", total)
+            tracing.guardar_traza(self.device, resultado.resultado, total, tiempos)
+        self.notificar(resultado)
+        return resultado
+
+    def estadisticas(self):
+        """Nº de ejecuciones, media y máximo (ms) y plazos agotados por etapa"""
+        with self._stats_lock:
+            return {
+                etapa: {
+                    "n": s["n"],
+                    "media_ms": round(s["total_ms"] / s["n"], 3) if s["n"] else 0.0,
+                    "max_ms": round(s["max_ms"], 3),
+                    "tiempos_agotados": s["tiempos_agotados"],
+                }
+                for etapa, s in self._stats.items()
+            }
+
+    def cerrar(self):
+        """Cancela lo pendiente y libera hilos y MediaPipe"""
+        self.cancelar()
+        self._pool.shutdown(wait=False)
+        if self.hands is not None:
+            self.hands.close()
+            self.hands = None
+
+    # ---------- Secuencia de etapas ----------
+
+    def _verificar(self, contexto, gesto=None):
+        users, faces = self.gallery.obtener()
+        if not users:
+            raise _Denegado(None, None, "No hay usuarios")
+
+        gesto = gesto or random.choice(list(self.detector.gestos_disponibles.keys()))
+        self._etapa("gesto", f"Paso 1/4: {self.detector.gestos_disponibles[gesto]}",
+                    self._etapa_gesto, gesto)
+        frame = self._etapa("captura", "Paso 2/4: Captura", self._etapa_captura)
+        query_emb = self._etapa("embedding", "Paso 3/4: Reconociendo", self._etapa_embedding, frame)
+        best_uid, best_score = self._etapa("coincidencia", "Paso 3/4: Reconociendo",
+                                           self._etapa_coincidencia, query_emb, faces)
+        contexto["score"] = best_score
+
+        if best_uid is None or best_score < FACE_THRESHOLD or best_uid not in users:
+            raise _Denegado(None, f"No reconocido: {best_score:.3f}", "Desconocido", best_score)
+
+        user = users[best_uid]
+        contexto.update(user_id=best_uid, nombre=user["name"])
+        correcto = self._etapa("pin", f"Paso 4/4: PIN de {user['name']}",
+                               self._etapa_pin, best_uid, user)
+        if not correcto:
+            raise _Denegado(best_uid, "Pin Incorrecto", "PIN incorrecto", best_score)
+
+        self._etapa("decision", "Registrando acceso", self._etapa_decision,
+                    best_uid, user, best_score)
+        return VerificacionTerminada("permitido", best_uid, user["name"], None,
+                                     best_score, self._tiempos)
+
+    def _etapa(self, etapa, texto, funcion, *args):
+        """Ejecuta una etapa en el pool respetando su plazo y la cancelación"""
+        if self._cancelado.is_set():
+            raise _Cancelado()
+        self.notificar(EtapaIniciada(etapa, texto))
+        plazo = _Plazo(etapa, self._cancelado, self.timeouts.get(etapa))
+        despertar = self._despertar = threading.Event()
+        if self._cancelado.is_set():
+            despertar.set()                                 # Cancelado justo antes de crear el evento
+        estado = "ok"
+        inicio = time.perf_counter()
+        try:
+            future = self._pool.submit(funcion, plazo, *args)
+            future.add_done_callback(lambda f: despertar.set())
+            while not future.done():
+                despertar.wait(plazo.restante())
+                if not future.done():
+                    plazo.comprobar()                       # Cancelada o fuera de plazo
+                    despertar.clear()
+            return future.result()
+        except _Cancelado:
+            estado = "cancelada"
+            raise
+        except _TiempoAgotado:
+            estado = "tiempo_agotado"
+            raise
+        except _Denegado:
+            estado = "fallo"
+            raise
+        except Exception:
+            estado = "error"
+            raise
+        finally:
+            duracion = (time.perf_counter() - inicio) * 1000
+            self._tiempos[etapa] = round(duracion, 3)
+            self._registrar(etapa, duracion, estado)
+            self.notificar(EtapaTerminada(etapa, round(duracion, 3), estado))
+
+    def _registrar(self, etapa, duracion, estado):
+        with self._stats_lock:
+            s = self._stats[etapa]
+            s["n"] += 1
+            s["total_ms"] += duracion
+            s["max_ms"] = max(s["max_ms"], duracion)
+            if estado == "tiempo_agotado":
+                s["tiempos_agotados"] += 1
+        if tracing.ACTIVO:
+            tracing.registrar(f"verificacion.{etapa}", duracion)
+
+    # ---------- Etapas (hilos de trabajo) ----------
+
+    def manos(self):
+        """Inicializa MediaPipe Hands la primera vez que se necesita"""
+        if self.hands is None:
+            import mediapipe as mp
+            self.hands = mp.solutions.hands.Hands(
+                static_image_mode=False,
+                max_num_hands=2,
+                min_detection_confidence=0.5,
+                min_tracking_confidence=0.5
+            )
+        return self.hands
+
+    def _etapa_gesto(self, plazo, gesto):
+        """Espera a que el gesto se mantenga los frames necesarios"""
+        frames_correctos = 0
+        if self.motion_gate is not None:
+            self.motion_gate.forzar_activo()
+        while True:
+            plazo.comprobar()
+            restante = plazo.restante()
+            frame = self.frames.siguiente(timeout=0.1 if restante is None else min(0.1, restante))
+            if frame is None:
+                continue
+            if self.espejo_gestos:
+                frame = cv2.flip(frame, 1)
+            if self.motion_gate is not None and not self.motion_gate.actualizar(frame):
+                continue                                    # Escena quieta: no se ejecuta MediaPipe
+            resultados = self.manos().process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            manos = tuple(resultados.multi_hand_landmarks or ())
+            correcto = any(self.detector.verificar_gesto(gesto, mano.landmark) for mano in manos)
+            if correcto:
+                frames_correctos += 1
+            else:
+                frames_correctos = max(0, frames_correctos - 1)
+            self.notificar(ProgresoGesto(gesto, frames_correctos, self.frames_necesarios,
+                                         correcto, manos))
+            if frames_correctos >= self.frames_necesarios:
+                return True
+
+    def _etapa_captura(self, plazo):
+        """Frame (en espejo) para el reconocimiento facial"""
+        if self.espera_captura:
+            plazo.esperar(self.espera_captura)
+        restante = plazo.restante()
+        frame = self.frames.siguiente(timeout=1.0 if restante is None else restante)
+        if frame is None:
+            plazo.comprobar()
+            raise _Denegado(None, None, "Captura fallida")
+        return cv2.flip(frame, 1)
+
+    def _etapa_embedding(self, plazo, frame):
+        try:
+            return self.embed_fn(frame)
+        except ValueError:
+            raise _Denegado(None, "No se detecto Rostro", "Sin rostro")
+
+    def _etapa_coincidencia(self, plazo, query_emb, faces):
+        return coincidencia(query_emb, faces)
+
+    def _etapa_pin(self, plazo, user_id, user):
+        """Pide el PIN y lo comprueba en el pool de bcrypt"""
+        pin_hash = hash_pin_usuario(user_id, user)
+        if pin_hash is None:
+            raise _Denegado(user_id, "Usuario inactivo", "Usuario inactivo")
+        self.notificar(PinSolicitado(user_id, user["name"]))
+        pin = self.pin_source.leer_pin(user["name"])
+        plazo.comprobar()
+        if not pin:
+            raise _Cancelado("PIN cancelado", user_id)
+        # El PIN llegó a tiempo: bcrypt tiene su propio margen aunque el
+        # usuario haya apurado el plazo tecleando
+        plazo.prorrogar(PIN_CHECK_MIN_SECONDS)
+        future = get_credential_service().verificar_usuario(
+            user_id, pin, pin_hash, al_actualizar=lambda h: self.gallery.invalidar()
+        )
+        try:
+            return future.result(timeout=plazo.restante())
+        except FuturesTimeoutError:
+            raise _TiempoAgotado(plazo.etapa)
+
+    def _etapa_decision(self, plazo, user_id, user, score):
+        log_event(user_id, "Entrada Permitida",
+                  f"Acceso Permitido: {user['name']} || score={score:.3f}",
+                  device=self.device)
@@ -5,16 +5,17 @@
 
 import tkinter as tk
 from tkinter import messagebox
-import bcrypt
 
 from config import COLOR_PANEL, COLOR_TEXT, COLOR_TEXT_SECONDARY, COLOR_SUCCESS, COLOR_ERROR
-from core import insert_user
+from core import insert_user, get_credential_service
+from utils.tk_async import al_terminar
 
 
 class AgregarUsuarioDialog:
     def __init__(self, parent):
         self.parent = parent
         self.resultado = None
+        self.guardando = False  # Hash del PIN en curso
         
         self.dialog = tk.Toplevel(parent)
         self.dialog.title("Agregar Nuevo Usuario")
@@ -105,7 +106,7 @@ class AgregarUsuarioDialog:
         frame_botones = tk.Frame(self.dialog, bg=COLOR_PANEL)
         frame_botones.pack(pady=20)
         
-        tk.Button(
+        self.btn_crear = tk.Button(
             frame_botones,
             text="✓ Crear Usuario",
             font=("Arial", 12, "bold"),
@@ -113,7 +114,8 @@ class AgregarUsuarioDialog:
             fg="white",
             command=self.crear_usuario,
             width=15
-        ).pack(side="left", padx=5)
+        )
+        self.btn_crear.pack(side="left", padx=5)
         
         tk.Button(
             frame_botones,
@@ -169,12 +171,22 @@ class AgregarUsuarioDialog:
             self.entry_pin_confirm.focus()
             return
         
+        if self.guardando:
+            return  # Ya se está guardando
+        self.guardando = True
+        self.btn_crear.config(state="disabled")
+        
+        # Hashear PIN en el pool de credenciales (sin bloquear la ventana)
+        future = get_credential_service().hash_pin(pin)
+        al_terminar(self.dialog, future, lambda f: self.pin_hasheado(f, nombre))
+        
+    def pin_hasheado(self, future, nombre):
+        """Inserta el usuario cuando el hash del PIN está listo"""
+        self.guardando = False
+        self.btn_crear.config(state="normal")
         try:
-            # Hashear PIN
-            pin_hash = bcrypt.hashpw(pin.encode(), bcrypt.gensalt()).decode()
-            
             # Insertar en BD
-            user_id = insert_user(nombre, pin_hash)
+            user_id = insert_user(nombre, future.result())
             
             self.resultado = nombre
             self.dialog.destroy()
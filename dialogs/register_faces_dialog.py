@@ -10,7 +10,7 @@ from PIL import Image, ImageTk
 import time
 
 from config import *
-from core import get_all_users, insert_face, get_embedding_deepface
+from core import get_all_users, insert_face, get_inference_scheduler, get_video_telemetry
 
 
 class RegistrarRostrosDialog:
@@ -27,6 +27,7 @@ class RegistrarRostrosDialog:
         
         # Variables
         self.cap = None
+        self.telemetria = get_video_telemetry("rostros")
         self.usuario_seleccionado = None
         self.capturas = []
         self.max_capturas = 5
@@ -224,8 +225,10 @@ class RegistrarRostrosDialog:
     
     def actualizar_video(self):
         """Actualiza el frame de video"""
+        t0 = self.telemetria.inicio()
         if self.cap is not None and self.cap.isOpened():
             ret, frame = self.cap.read()
+            self.telemetria.captura(ret, t0)
             if ret:
                 frame = cv2.flip(frame, 1)
                 
@@ -235,6 +238,7 @@ class RegistrarRostrosDialog:
                 cv2.putText(frame, "Centra tu rostro aqui", 
                            (w//4 + 10, h//4 - 10), 
                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                frame = self.telemetria.dibujar(frame)
                 
                 frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
                 img = Image.fromarray(frame_rgb)
@@ -242,9 +246,13 @@ class RegistrarRostrosDialog:
                 
                 self.canvas_video.create_image(0, 0, anchor="nw", image=img_tk)
                 self.canvas_video.image = img_tk
+                self.telemetria.render(t0)
         
         if hasattr(self, 'dialog') and self.dialog.winfo_exists():
             self.dialog.after(30, self.actualizar_video)
+            self.telemetria.programar(30)
+        else:
+            self.telemetria.detener()
     
     def capturar_foto(self):
         """Captura una foto del usuario"""
@@ -307,7 +315,9 @@ class RegistrarRostrosDialog:
         embeddings_guardados = 0
         errores = 0
         
-        for i, frame in enumerate(self.capturas):
+        # Todas las fotos a la vez: el planificador las agrupa en lotes
+        futuros = get_inference_scheduler().enviar_varios(self.capturas)
+        for i, futuro in enumerate(futuros):
             try:
                 self.label_progreso.config(
                     text=f"Procesando foto {i+1}/{len(self.capturas)}..."
@@ -315,7 +325,7 @@ class RegistrarRostrosDialog:
                 self.dialog.update()
                 
                 # Obtener embedding
-                embedding = get_embedding_deepface(frame)
+                embedding = futuro.result()
                 
                 # Guardar en BD
                 insert_face(self.usuario_seleccionado, embedding)
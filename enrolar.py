@@ -0,0 +1,78 @@
+# enrolar.py
+# --------------------------------------------
+# Alta masiva de usuarios desde un directorio de fotos o un manifiesto
+# --------------------------------------------
+# Uso:
+#   python enrolar.py fotos/                           # una subcarpeta por persona
+#   python enrolar.py --manifiesto altas.csv           # columnas nombre,pin,foto
+#   python enrolar.py fotos/ --workers 8 --informe errores.csv --pines pines.csv
+#
+# Se puede relanzar tras una interrupción: las personas ya dadas de alta se
+# omiten.
+
+import argparse
+import sys
+
+from config import ENROLL_WORKERS, ENROLL_BATCH_SIZE
+from core import ensure_schema, cerrar_conexiones
+from core.bulk_enrollment import (
+    enrolar,
+    personas_desde_directorio,
+    personas_desde_manifiesto,
+)
+
+
+def parse_args():
+    """Argumentos de línea de comandos"""
+    parser = argparse.ArgumentParser(description="Alta masiva de usuarios a partir de fotos")
+    parser.add_argument("directorio", nargs="?", help="Directorio con una subcarpeta por persona")
+    parser.add_argument("--manifiesto", default=None, help="CSV con columnas nombre,pin,foto")
+    parser.add_argument("--workers", type=int, default=ENROLL_WORKERS, help="Procesos del pool")
+    parser.add_argument("--lote", type=int, default=ENROLL_BATCH_SIZE, help="Usuarios por transacción")
+    parser.add_argument("--informe", default="enrolamiento_errores.csv", help="CSV de errores por foto")
+    parser.add_argument("--pines", default="enrolamiento_pines.csv", help="CSV con los PINs generados")
+    args = parser.parse_args()
+    if bool(args.directorio) == bool(args.manifiesto):
+        parser.error("Indica un directorio o --manifiesto (solo uno)")
+    return args
+
+
+def mostrar_progreso(hechas, total):
+    print(f"\r  {hechas}/{total} personas", end="", file=sys.stderr, flush=True)
+
+
+def main():
+    args = parse_args()
+    ensure_schema()
+
+    if args.manifiesto:
+        personas = personas_desde_manifiesto(args.manifiesto)
+    else:
+        personas = personas_desde_directorio(args.directorio)
+    print(f"📷 {len(personas)} personas, {sum(len(p[3]) for p in personas)} fotos")
+
+    try:
+        resumen = enrolar(
+            personas,
+            workers=args.workers,
+            batch_size=args.lote,
+            informe=args.informe,
+            pines=args.pines,
+            progreso=mostrar_progreso
+        )
+    finally:
+        cerrar_conexiones()
+    print(file=sys.stderr)
+
+    if resumen["pines_generados"]:
+        print(f"🔢 PINs generados en {args.pines} (entregar y borrar el fichero)")
+
+    print(f"✅ Usuarios creados: {resumen['usuarios']} ({resumen['rostros']} rostros)")
+    print(f"⏭️  Ya dados de alta: {resumen['omitidas']}")
+    if resumen["fotos_con_error"] or resumen["personas_sin_rostro"]:
+        print(f"⚠️  Fotos con error: {resumen['fotos_con_error']}, "
+              f"personas sin rostro válido: {resumen['personas_sin_rostro']} (ver {args.informe})")
+
+
+if __name__ == "__main__":
+    main()
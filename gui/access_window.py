@@ -5,25 +5,36 @@
 
 import tkinter as tk                # Importa Tkinter base
 from tkinter import ttk, messagebox # Importa widgets y cuadros de diálogo
-import threading                    # Para ejecutar tareas en segundo plano
 import cv2                          # OpenCV para manejo de cámara y video
 from PIL import Image, ImageTk      # Para convertir imágenes a formato Tkinter
-import random                       # Selección aleatoria de gestos
-import time                         # Tiempos y esperas
-import bcrypt                       # Verificación segura de PINs
 
 from config import *                # Configuración general (colores, tamaños, thresholds)
 # Importa funciones y clases esenciales desde el módulo 'core':
 from core import (
-    fetch_active_users_and_faces,   # Obtiene usuarios activos y sus embeddings faciales
+    get_user_credentials,           # Nombre y hash del PIN de un usuario (búsqueda por ID)
     log_event,                      # Registra eventos (entradas/salidas, errores, etc.)
-    get_embedding_deepface,         # Genera el embedding del rostro usando DeepFace
-    best_match_per_user,            # Encuentra el mejor usuario que coincide con el embedding
-    GestureDetector                 # Clase para detectar y verificar gestos de mano
+    GalleryCache,                   # Galería en caché (instantánea .npy mapeada en memoria)
+    get_occupancy_index,            # Índice en memoria de quién está dentro
+    get_credential_service,         # bcrypt en un pool de hilos (devuelve Futures)
+    VerificationPipeline,           # Etapas de verificación en hilos de trabajo
+    UltimoFrame,                    # Último frame de la cámara para el pipeline
+    BuzonPin,                       # PIN entregado desde el diálogo de Tk
+    EtapaIniciada,                  # Eventos que publica el pipeline
+    ProgresoGesto,
+    PinSolicitado,
+    VerificacionTerminada,
+    MotionGate,                     # Detector de movimiento para no inferir en reposo
+    get_video_telemetry,            # FPS, tiempos y frames perdidos de la vista previa
+    alternar_overlay,
+    detener_exportador_metricas,    # Último volcado de métricas al cerrar
+    detener_event_writer,           # Vuelca los eventos pendientes al cerrar
+    cerrar_conexiones               # Cierra las conexiones SQLite persistentes
 )
 
 import mediapipe as mp              # MediaPipe para detección de manos
 
+from utils.tk_async import al_terminar, drenar_cola  # Futures y eventos sin bloquear Tk
+
 class VentanaAcceso:
     def __init__(self, root):
         self.root = root                                    # Guarda la ventana raíz
@@ -34,26 +45,36 @@ class VentanaAcceso:
         # Variables de estado
         self.cap = None                                     # Capturador de cámara
         self.verificando = False                            # Flag de proceso de verificación en curso
-        self.detector = GestureDetector()                   # Instancia del detector de gestos
         self.camara_activa = False                          # Flag para saber si la cámara está activa
+        self.motion_gate = MotionGate()                     # Regula FPS y MediaPipe según movimiento
+        self.telemetria = get_video_telemetry("acceso")     # FPS y frames perdidos de la vista previa
+        self.gallery = GalleryCache(refresh_seconds=0)      # Recarga solo si cambió la BD
+        self.ocupacion = get_occupancy_index()              # Quién está dentro (se actualiza con cada evento)
         
-        self.frames_correctos = 0                           # Contador de frames válidos del gesto
         self.frames_necesarios = 30                         # Frames consecutivos requeridos para validar gesto
-        self.gesto_actual = None                            # Identificador del gesto solicitado
-        self.gesto_objetivo = None                          # No usado (reservado)
-        self.usuario_verificando = None                     # No usado (reservado)
+        self.progreso_gesto = None                          # Último ProgresoGesto recibido (overlay)
+        self.dialog_pin = None                              # Diálogo de PIN abierto
         
         self.mp_hands = mp.solutions.hands                  # Referencia al módulo de manos
-        self.hands = self.mp_hands.Hands(                   # Inicializa el modelo de manos
-            static_image_mode=False,                        # Modo video (seguimiento)
-            max_num_hands=2,                                # Máximo manos detectables
-            min_detection_confidence=0.5,                   # Confianza mínima detección
-            min_tracking_confidence=0.5                     # Confianza mínima seguimiento
-        )
         self.mp_drawing = mp.solutions.drawing_utils        # Utilidad para dibujar landmarks
         
+        # Pipeline de verificación: las etapas corren en hilos de trabajo y
+        # solo se comunican con la ventana mediante su cola de eventos
+        self.ultimo_frame = UltimoFrame()                   # Frames de la cámara para el pipeline
+        self.buzon_pin = BuzonPin()                         # PIN desde el diálogo
+        self.pipeline = VerificationPipeline(
+            self.ultimo_frame,
+            self.buzon_pin,
+            self.gallery,
+            frames_necesarios=self.frames_necesarios,
+            espejo_gestos=False,                            # La GUI evalúa gestos sin espejo
+            espera_captura=FACE_CAPTURE_DELAY               # Pausa antes de capturar el rostro
+        )
+        
         self.setup_ui()                                     # Construye la interfaz
         self.iniciar_video()                                # Arranca la cámara
+        self.root.bind("<F3>", lambda e: alternar_overlay())  # Muestra/oculta el overlay de FPS
+        drenar_cola(self.root, self.pipeline.eventos, self.procesar_evento)  # Eventos en el hilo de Tk
     
     def setup_ui(self):
         """Configura todos los elementos de la interfaz"""
@@ -162,6 +183,40 @@ class VentanaAcceso:
         )
         self.label_usuarios.grid(row=0, column=1, sticky="e", pady=2)
         
+        tk.Label(
+            info_frame,
+            text="Ciclo activo:",
+            font=("Arial", 10),
+            bg=COLOR_PANEL,
+            fg=COLOR_TEXT_SECONDARY
+        ).grid(row=1, column=0, sticky="w", pady=2)
+        
+        self.label_ciclo = tk.Label(
+            info_frame,
+            text="0%",
+            font=("Arial", 10, "bold"),
+            bg=COLOR_PANEL,
+            fg=COLOR_TEXT
+        )
+        self.label_ciclo.grid(row=1, column=1, sticky="e", pady=2)
+        
+        tk.Label(
+            info_frame,
+            text="Personas dentro:",
+            font=("Arial", 10),
+            bg=COLOR_PANEL,
+            fg=COLOR_TEXT_SECONDARY
+        ).grid(row=2, column=0, sticky="w", pady=2)
+        
+        self.label_dentro = tk.Label(
+            info_frame,
+            text="0",
+            font=("Arial", 10, "bold"),
+            bg=COLOR_PANEL,
+            fg=COLOR_TEXT
+        )
+        self.label_dentro.grid(row=2, column=1, sticky="e", pady=2)
+        
         # Botón para abrir el panel de administración
         self.btn_admin = tk.Button(
             frame_controles,
@@ -176,6 +231,7 @@ class VentanaAcceso:
         
         # Carga número de usuarios activos
         self.actualizar_info_sistema()
+        self.actualizar_ocupacion()
         
     def iniciar_video(self):
         """Inicia la captura de video"""
@@ -189,6 +245,7 @@ class VentanaAcceso:
     def pausar_camara(self):  
         """Pausa la cámara sin liberarla"""
         self.camara_activa = False                                       # Detiene el loop de actualización
+        self.telemetria.detener()                                        # La pausa no cuenta como pérdida
         if self.cap and self.cap.isOpened():
             self.cap.release()                                           # Libera el dispositivo de cámara
             self.cap = None
@@ -212,54 +269,57 @@ class VentanaAcceso:
         if not self.camara_activa:                                       # Si está pausada, no continúa
             return
         
+        t0 = self.telemetria.inicio()                                    # Mide ritmo y tiempo del frame
         if self.cap and self.cap.isOpened():
             ret, frame = self.cap.read()                                 # Lee un frame de la cámara
+            self.telemetria.captura(ret, t0)
             if ret:
-                if self.verificando:                                     # Si está verificando gesto
-                    frame = self.procesar_frame_gestos(frame)            # Procesa y dibuja overlay de gestos
+                self.motion_gate.actualizar(frame)                       # Diferencia de frames (barato)
+                if self.verificando:
+                    self.ultimo_frame.publicar(frame)                    # El pipeline toma el más reciente
+                if self.verificando and self.progreso_gesto:             # Si está verificando gesto
+                    frame = self.dibujar_progreso_gesto(frame.copy())    # Dibuja overlay de gestos
                 else:
                     frame = cv2.flip(frame, 1)                           # Esp espejo para vista normal
                 
+                if self.motion_gate.frames_total % 30 == 0:              # Refresca el ciclo de trabajo
+                    ciclo = self.motion_gate.estadisticas()["ciclo_trabajo"]
+                    self.label_ciclo.config(text=f"{ciclo:.0%}")
+                
+                frame = self.telemetria.dibujar(frame)                   # Overlay de FPS (F3)
                 frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)       # Convierte a RGB para PIL
                 img = Image.fromarray(frame_rgb)                         # Crea imagen PIL
                 img_tk = ImageTk.PhotoImage(image=img)                   # Convierte a objeto Tkinter
                 
                 self.canvas_video.create_image(0, 0, anchor="nw", image=img_tk) # Pinta en canvas
                 self.canvas_video.image = img_tk                         # Referencia para evitar GC
+                self.telemetria.render(t0)
         
         if self.camara_activa:                                           # Reprograma el próximo frame
-            self.root.after(30, self.actualizar_video)                   # ~33 FPS aprox.
+            intervalo = self.motion_gate.intervalo_ms()                  # ~33 FPS activo, ~5 FPS en reposo
+            self.root.after(intervalo, self.actualizar_video)
+            self.telemetria.programar(intervalo)
     
-    def procesar_frame_gestos(self, frame):
-        """Procesa frame para gestos"""
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)               # Prepara frame para MediaPipe
-        results = self.hands.process(frame_rgb)                          # Ejecuta detección de manos
-        
-        gesto_correcto = False                                           # Flag del estado del gesto actual
+    def dibujar_progreso_gesto(self, frame):
+        """Dibuja manos y barra de progreso del último ProgresoGesto"""
+        progreso_gesto = self.progreso_gesto
+        nombre = self.pipeline.detector.gestos_disponibles.get(progreso_gesto.gesto, "")
         
-        cv2.putText(frame, f"Gesto: {self.gesto_nombre}",                # Dibuja nombre del gesto solicitado
+        cv2.putText(frame, f"Gesto: {nombre}",                           # Dibuja nombre del gesto solicitado
                    (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
         
-        if results.multi_hand_landmarks:                                 # Si hay manos detectadas
-            for hand_landmarks in results.multi_hand_landmarks:          # Itera por cada mano
-                self.mp_drawing.draw_landmarks(                          # Dibuja landmarks y conexiones
-                    frame, hand_landmarks, self.mp_hands.HAND_CONNECTIONS,
-                    self.mp_drawing.DrawingSpec(color=(0,255,0), thickness=2, circle_radius=2),
-                    self.mp_drawing.DrawingSpec(color=(0,255,255), thickness=2)
-                )
-                
-                if self.detector.verificar_gesto(self.gesto_actual, hand_landmarks.landmark):
-                    gesto_correcto = True                                # Marca gesto correcto
-                    self.frames_correctos += 1                           # Suma frame válido
-        
-        if not gesto_correcto:
-            self.frames_correctos = max(0, self.frames_correctos - 1)    # Penaliza si no coincide
+        for hand_landmarks in progreso_gesto.manos:                      # Manos detectadas por el pipeline
+            self.mp_drawing.draw_landmarks(                              # Dibuja landmarks y conexiones
+                frame, hand_landmarks, self.mp_hands.HAND_CONNECTIONS,
+                self.mp_drawing.DrawingSpec(color=(0,255,0), thickness=2, circle_radius=2),
+                self.mp_drawing.DrawingSpec(color=(0,255,255), thickness=2)
+            )
         
-        progreso = min(int((self.frames_correctos / self.frames_necesarios) * 100), 100) # % progreso
+        progreso = int(progreso_gesto.fraccion * 100)                    # % progreso
         
         cv2.rectangle(frame, (10, 450), (630, 470), (50, 50, 50), -1)    # Barra de fondo
         if progreso > 0:
-            color = (0, 255, 0) if gesto_correcto else (255, 165, 0)     # Verde si va bien, naranja si no
+            color = (0, 255, 0) if progreso_gesto.correcto else (255, 165, 0) # Verde si va bien, naranja si no
             cv2.rectangle(frame, (10, 450), (10 + int(progreso * 6.2), 470), color, -1) # Barra progreso
         
         cv2.putText(frame, f"{progreso}%", (540, 465),                   # Texto del porcentaje
@@ -267,39 +327,19 @@ class VentanaAcceso:
         
         return frame                                                     # Devuelve frame con overlay
     
-    def verificacion_gesto_gui(self, timeout=GESTURE_TIMEOUT):
-        """Verificación de gesto"""
-        self.gesto_actual = random.choice(list(self.detector.gestos_disponibles.keys())) # Elige gesto aleatorio
-        self.gesto_nombre = self.detector.gestos_disponibles[self.gesto_actual]          # Nombre legible
-        self.frames_correctos = 0                                                        # Reinicia contador
-        self.modo_normal = False                                                         # Activa modo verificación
-        
-        start_time = time.time()                                                         # Marca inicio
-        
-        while True:
-            if time.time() - start_time > timeout:                                       # Si expira tiempo
-                self.modo_normal = True
-                self.gesto_actual = None
-                raise TimeoutError("Tiempo agotado")                                     # Notifica timeout
-            
-            if self.frames_correctos >= self.frames_necesarios:                          # Si cumple frames
-                time.sleep(0.5)                                                          # Pequeña espera
-                self.modo_normal = True
-                self.gesto_actual = None
-                return True                                                              # Gesto validado
-            
-            time.sleep(0.1)                                                              # Evita busy-wait
-            self.root.update()                                                           # Refresca GUI
-    
     def actualizar_info_sistema(self):
         """Actualiza info del sistema"""
-        users, faces = fetch_active_users_and_faces()           # Obtiene usuarios y embeddings
+        users, faces = self.gallery.obtener()                   # Abre la galería (mmap) al arrancar
         self.label_usuarios.config(text=str(len(users)))        # Muestra cantidad de usuarios activos
         
+    def actualizar_ocupacion(self):
+        """Personas dentro según el índice en memoria (O(1), sin consultar la BD)"""
+        self.label_dentro.config(text=str(self.ocupacion.ocupacion()))
+        self.root.after(1000, self.actualizar_ocupacion)
+        
     def cambiar_estado(self, texto, color=COLOR_WARNING):
         """Cambia estado"""
         self.label_estado.config(text=texto, fg=color)          # Actualiza texto y color del estado
-        self.root.update()                                      # Refresca GUI
         
     def iniciar_verificacion(self):
         """Inicia verificación"""
@@ -309,93 +349,48 @@ class VentanaAcceso:
         
         self.btn_verificar.config(state="disabled", bg="#95A5A6") # Deshabilita botón mientras procesa
         self.verificando = True                                    # Marca estado verificando
-        
-        thread = threading.Thread(target=self.proceso_verificacion, daemon=True) # Hilo en segundo plano
-        thread.start()                                              # Inicia hilo
+        self.progreso_gesto = None
+        self.motion_gate.forzar_activo()                           # Frecuencia completa desde ya
+        self.cambiar_estado("Cargando...", COLOR_INFO)             # Estado: cargando
+        self.pipeline.iniciar()                                    # Etapas en hilos de trabajo
     
-    def proceso_verificacion(self):
-        """Proceso de verificación completo"""
-        try:
-            self.cambiar_estado("Cargando...", COLOR_INFO)         # Estado: cargando
-            users, faces = fetch_active_users_and_faces()          # Carga usuarios y embeddings
-            
-            if not users:                                          # Si no hay usuarios activos
-                messagebox.showerror("Error", "No hay usuarios")
-                return
-            
-            # Paso 1: Gesto
-            self.cambiar_estado("Paso 1/4: Gesto", COLOR_WARNING)  # Indica paso
-            try:
-                if not self.verificacion_gesto_gui():              # Ejecuta verificación de gesto
-                    log_event(None, "Entrada Denegada", "Gesto fallido")
-                    messagebox.showerror("Denegado", "Gesto fallido")
-                    return
-            except TimeoutError:
-                log_event(None, "Entrada Denegada", "Tiempo para gesto agotado")
-                messagebox.showerror("Error", "Tiempo agotado")
-                return
-            
-            # Paso 2: Captura de frame
-            self.cambiar_estado("Paso 2/4: Captura", COLOR_WARNING)
-            time.sleep(1)                                          # Pequeña espera
-            ret, frame = self.cap.read()                           # Captura un frame
-            if not ret:
-                messagebox.showerror("Error", "Captura fallida")
-                return
-            frame = cv2.flip(frame, 1)                             # Voltea para vista natural
-            
-            # Paso 3: Reconocimiento facial
-            self.cambiar_estado("Paso 3/4: Reconociendo", COLOR_WARNING)
-            try:
-                query_emb = get_embedding_deepface(frame)          # Obtiene embedding del rostro
-            except:
-                log_event(None, "Entrada Denegada", "No se detecto Rostro")
-                messagebox.showerror("Error", "Sin rostro")
-                return
-            
-            best_uid, best_score = best_match_per_user(query_emb, faces) # Busca mejor coincidencia
-            
-            if best_uid is None or best_score < FACE_THRESHOLD:     # Comprueba umbral de similitud
-                log_event(None, "Entrada Denegada", f"No reconocido: {best_score:.3f}")
-                messagebox.showerror("Denegado", f"Desconocido\nScore: {best_score:.3f}")
-                return
-            
-            # Paso 4: PIN del usuario reconocido
-            try:
-                user = users.get(best_uid)
-                print(best_uid)                          # Datos del usuario
-                self.cambiar_estado(f"Usuario: {user['name']}", COLOR_INFO)
-            except Exception as e:
-                messagebox.showerror("NONE",str(e))
-            
-            try:
-                pin = self.solicitar_pin(user['name'])  # Pide PIN
-            except Exception as e:
-                messagebox.showerror("NONE",str(e))
-                            
-            if not pin:
-                return                                              # Cancelado
-            
-            if bcrypt.checkpw(pin.encode(), user["pin"].encode()):  # Verifica PIN contra hash
-                self.cambiar_estado("PERMITIDO", COLOR_SUCCESS)     # Estado permitido
-                log_event(best_uid, "Entrada Permitida",
-                          f"Acceso Permitido: {user['name']} || score={best_score:.3f}")
-                VentanaSalida(self.root, user['name'], best_uid)    # Abre ventana de salida
-            else:
-                log_event(best_uid, "Entrada Denegada", "Pin Incorrecto")
-                messagebox.showerror("Denegado", "PIN incorrecto")
-            
-        except Exception as e:
-            messagebox.showerror("Error", str(e))                   # Muestra cualquier error inesperado
-        finally:
-            self.verificando = False                                 # Resetea flags
-            self.modo_normal = True
-            self.gesto_actual = None
-            self.btn_verificar.config(state="normal", bg=COLOR_SUCCESS) # Rehabilita botón
-            self.cambiar_estado("Esperando...", COLOR_WARNING)       # Estado por defecto
+    def procesar_evento(self, evento):
+        """Atiende un evento del pipeline (siempre en el hilo de Tk)"""
+        if isinstance(evento, EtapaIniciada):
+            color = COLOR_INFO if evento.etapa == "pin" else COLOR_WARNING
+            self.cambiar_estado(evento.texto, color)               # Indica paso
+        elif isinstance(evento, ProgresoGesto):
+            self.progreso_gesto = evento                           # Se dibuja en el siguiente frame
+        elif isinstance(evento, PinSolicitado):
+            self.progreso_gesto = None
+            self.solicitar_pin(evento.nombre)                      # Diálogo no bloqueante
+        elif isinstance(evento, VerificacionTerminada):
+            self.finalizar_verificacion(evento)
+    
+    def finalizar_verificacion(self, resultado):
+        """Muestra el resultado del intento y deja la ventana lista para otro"""
+        if self.dialog_pin is not None and self.dialog_pin.winfo_exists():
+            self.dialog_pin.destroy()                              # PIN fuera de plazo o cancelado
+        self.dialog_pin = None
+        self.verificando = False                                   # Resetea flags
+        self.progreso_gesto = None
+        self.btn_verificar.config(state="normal", bg=COLOR_SUCCESS) # Rehabilita botón
+        self.cambiar_estado("Esperando...", COLOR_WARNING)         # Estado por defecto
+        
+        if resultado.resultado == "permitido":
+            self.cambiar_estado("PERMITIDO", COLOR_SUCCESS)        # Estado permitido
+            VentanaSalida(self.root, resultado.nombre, resultado.user_id) # Abre ventana de salida
+            self.cambiar_estado("Esperando...", COLOR_WARNING)
+        elif resultado.resultado == "denegado":
+            mensaje = resultado.motivo
+            if resultado.motivo == "Desconocido":
+                mensaje = f"Desconocido\nScore: {resultado.score:.3f}"
+            messagebox.showerror("Denegado", mensaje)
+        elif resultado.resultado == "error":
+            messagebox.showerror("Error", resultado.motivo)        # Cualquier error inesperado
     
     def solicitar_pin(self, nombre):
-        """Diálogo PIN"""
+        """Diálogo PIN (entrega el PIN al pipeline sin bloquear la ventana)"""
         dialog = tk.Toplevel(self.root)                              # Crea ventana secundaria
         dialog.title("PIN")
         dialog.geometry("350x200")
@@ -404,8 +399,7 @@ class VentanaAcceso:
         dialog.grab_set()                                            # Bloquea interacción con la raíz
         
         dialog.geometry("+%d+%d" % (self.root.winfo_x() + 275, self.root.winfo_y() + 250)) # Posición
-        
-        resultado = {"pin": None}                                    # Contenedor para resultado
+        self.dialog_pin = dialog
         
         tk.Label(dialog, text=f"Usuario: {nombre}", font=("Arial", 12, "bold"),
                 bg=COLOR_PANEL, fg=COLOR_TEXT).pack(pady=20)         # Muestra nombre
@@ -418,21 +412,24 @@ class VentanaAcceso:
         entry_pin.focus()                                             # Foco para escribir
         
         def confirmar():
-            resultado["pin"] = entry_pin.get()                        # Guarda el PIN
+            self.buzon_pin.entregar(entry_pin.get())                  # Entrega el PIN al pipeline
+            self.cambiar_estado("Verificando PIN...", COLOR_INFO)
             dialog.destroy()                                          # Cierra diálogo
         
+        def cancelar():
+            self.buzon_pin.cancelar()                                 # El pipeline termina como cancelado
+            dialog.destroy()
+        
         frame_btns = tk.Frame(dialog, bg=COLOR_PANEL)                 # Contenedor botones
         frame_btns.pack(pady=20)
         
         tk.Button(frame_btns, text="OK", command=confirmar,           # Botón aceptar
                  bg=COLOR_SUCCESS, fg="white", width=10).pack(side="left", padx=5)
-        tk.Button(frame_btns, text="Cancelar", command=dialog.destroy,# Botón cancelar
+        tk.Button(frame_btns, text="Cancelar", command=cancelar,      # Botón cancelar
                  bg=COLOR_ERROR, fg="white", width=10).pack(side="left", padx=5)
         
         entry_pin.bind("<Return>", lambda e: confirmar())             # Enter confirma
-        
-        dialog.wait_window()                                          # Espera cierre
-        return resultado["pin"]                                       # Devuelve el PIN
+        dialog.protocol("WM_DELETE_WINDOW", cancelar)                 # Cerrar equivale a cancelar
     
     def abrir_admin(self):
         """Abre panel admin"""
@@ -459,9 +456,12 @@ class VentanaAcceso:
         if self.cap:
             self.cap.release()                                        # Libera cámara
         
-        # AGREGAR - Cerrar MediaPipe Hands
-        if hasattr(self, 'hands'):
-            self.hands.close()                                        # Cierra recursos de MediaPipe
+        # Cancelar la verificación en curso y cerrar MediaPipe
+        self.pipeline.cerrar()
+        
+        detener_event_writer()                                        # Vuelca eventos pendientes
+        detener_exportador_metricas()                                 # Último volcado de métricas
+        cerrar_conexiones()                                           # Cierra conexiones SQLite
         
         self.root.destroy()                                           # Cierra ventana principal
 
@@ -600,46 +600,61 @@ class VentanaSalida:
                 messagebox.showerror("Error", "El PIN es obligatorio", parent=dialog_salida)
                 return
             
+            if str(btn_confirmar["state"]) == "disabled":
+                return                                                # Comprobación en curso
+            
             # Verificar PIN y nombre
             try:
-                from core import fetch_active_users_and_faces         # Import para obtener usuarios
-                users, _ = fetch_active_users_and_faces()
+                user = get_user_credentials(self.user_id)             # Una búsqueda por clave primaria
             
-                if self.user_id in users and nombre == users[self.user_id]["name"]: # Comprueba identidad
-                    user_pin_hash = users[self.user_id]["pin"]        # Hash del PIN
+                if user and nombre == user["name"]:                   # Comprueba identidad
+                    user_pin_hash = user["pin"]                       # Hash del PIN
                     
-                    if bcrypt.checkpw(pin.encode(), user_pin_hash.encode()): # Verifica PIN
-                        # PIN correcto - registrar salida
-                        log_event(
-                            self.user_id,
-                            "salida",
-                            f"Salida registrada: {nombre}"
-                        )
-                        
-                        messagebox.showinfo(
-                            "Éxito",
-                            f"Salida registrada correctamente.\n¡Hasta luego, {nombre}!",
-                            parent=dialog_salida
-                        )
-                        
-                        resultado["confirmado"] = True                # Marca confirmación
-                        dialog_salida.destroy()                       # Cierra secundario
-                        self.dialog.destroy()                         # Cierra principal
-                    else:
-                        messagebox.showerror("Error", "PIN incorrecto", parent=dialog_salida)
-                        entry_pin.delete(0, tk.END)                   # Limpia campo PIN
-                        entry_pin.focus()
+                    # bcrypt fuera del hilo de Tk; la ventana sigue respondiendo
+                    btn_confirmar.config(state="disabled")
+                    future = get_credential_service().verificar_usuario(self.user_id, pin, user_pin_hash)
+                    al_terminar(dialog_salida, future, lambda f: pin_verificado(f, nombre))
                 else:
                     messagebox.showerror("Error", "Usuario no encontrado", parent=dialog_salida)
             
             except Exception as e:
                 messagebox.showerror("Error", f"Error al verificar: {e}", parent=dialog_salida)
         
+        def pin_verificado(future, nombre):
+            btn_confirmar.config(state="normal")
+            try:
+                correcto = future.result()
+            except Exception as e:
+                messagebox.showerror("Error", f"Error al verificar: {e}", parent=dialog_salida)
+                return
+            
+            if correcto:
+                # PIN correcto - registrar salida
+                log_event(
+                    self.user_id,
+                    "salida",
+                    f"Salida registrada: {nombre}"
+                )
+                
+                messagebox.showinfo(
+                    "Éxito",
+                    f"Salida registrada correctamente.\n¡Hasta luego, {nombre}!",
+                    parent=dialog_salida
+                )
+                
+                resultado["confirmado"] = True                        # Marca confirmación
+                dialog_salida.destroy()                               # Cierra secundario
+                self.dialog.destroy()                                 # Cierra principal
+            else:
+                messagebox.showerror("Error", "PIN incorrecto", parent=dialog_salida)
+                entry_pin.delete(0, tk.END)                           # Limpia campo PIN
+                entry_pin.focus()
+        
         # Botones de acción
         frame_botones = tk.Frame(dialog_salida, bg=COLOR_PANEL)
         frame_botones.pack(pady=20)
         
-        tk.Button(
+        btn_confirmar = tk.Button(
             frame_botones,
             text="Confirmar",
             font=("Arial", 11),
@@ -647,7 +662,8 @@ class VentanaSalida:
             fg="white",
             command=confirmar_salida,                                 # Ejecuta verificación y registro
             width=12
-        ).pack(side="left", padx=5)
+        )
+        btn_confirmar.pack(side="left", padx=5)
         
         tk.Button(
             frame_botones,
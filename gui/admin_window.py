@@ -4,25 +4,67 @@
 # --------------------------------------------
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import cv2
 from PIL import Image, ImageTk
-import bcrypt
 import time
 
 from config import *
 from core import (
     ensure_schema,
-    get_all_users,
+    get_users_page,
     update_user_status,
     delete_user,
-    get_recent_events,
+    query_events,
+    search_events,
+    get_last_event_id,
+    get_events_since,
+    export_events_csv,
+    get_event_series,
+    get_event_devices,
+    get_credential_service,
+    get_occupants,
+    rebuild_presence,
     insert_user,
     insert_face,
-    get_embedding_deepface,
+    get_inference_scheduler,
+    get_video_telemetry,
     log_event
 )
+from core import tracing
+from core.db_manager import RESULTADOS_PERMITIDOS, RESULTADOS_DENEGADOS, RESULTADO_SALIDA
 from utils.admin_auth import verificar_admin
+from utils.tk_async import al_terminar
+
+# Ventanas del gráfico de tráfico -> (duración, granularidad)
+VENTANAS_TRAFICO = {
+    "Últimas 24 horas": (timedelta(hours=23), "hora"),
+    "Últimos 7 días": (timedelta(days=7), "hora"),
+    "Últimos 30 días": (timedelta(days=29), "dia"),
+    "Último año": (timedelta(days=364), "dia"),
+}
+
+# Color de cada tipo de resultado en el gráfico
+COLORES_RESULTADO = {
+    "Concedido": COLOR_SUCCESS,
+    "Denegado": COLOR_ERROR,
+    "Salida": COLOR_INFO,
+}
+
+# Origen del informe de latencias -> horas de trazas guardadas (None = memoria)
+FUENTES_LATENCIA = {
+    "Este proceso": None,
+    "Trazas guardadas (24 h)": 24,
+    "Trazas guardadas (7 días)": 24 * 7,
+}
+
+# Filtro de resultado del historial -> valores de events.result
+FILTROS_RESULTADO = {
+    "Todos": None,
+    "Concedidos": RESULTADOS_PERMITIDOS,
+    "Denegados": RESULTADOS_DENEGADOS,
+    "Salidas": RESULTADO_SALIDA,
+}
 
 
 class VentanaAdmin:
@@ -41,12 +83,21 @@ class VentanaAdmin:
         
         # Variables
         self.usuarios_data = []
+        self.cursor_usuarios = None  # Cursor de la siguiente página de usuarios
+        self.cargando_usuarios = False
+        self.cursor_eventos = None  # Cursor de la siguiente página de eventos
+        self.cargando_eventos = False
+        self.ultimo_id_evento = 0  # Último evento visto por el historial en vivo
+        self.job_historial = None
+        self.guardando_usuario = False
         self.cap_registro = None  # <-- Cámara para registro
         self.camara_registro_activa = False  # <-- Estado de cámara de registro
+        self.telemetria_registro = get_video_telemetry("registro")  # FPS de la vista previa de registro
         
         self.setup_ui()
         self.cargar_usuarios()
         self.cargar_eventos()
+        self.actualizar_historial()
         
         self.window.protocol("WM_DELETE_WINDOW", self.cerrar)
     
@@ -73,8 +124,23 @@ class VentanaAdmin:
         self.tab_historial = tk.Frame(self.notebook, bg=COLOR_PANEL)
         self.notebook.add(self.tab_historial, text=" Historial")
         
+        # Tab 3: Tráfico
+        self.tab_trafico = tk.Frame(self.notebook, bg=COLOR_PANEL)
+        self.notebook.add(self.tab_trafico, text=" Tráfico")
+        
+        # Tab 4: Presentes
+        self.tab_presentes = tk.Frame(self.notebook, bg=COLOR_PANEL)
+        self.notebook.add(self.tab_presentes, text=" Presentes")
+        
+        # Tab 5: Rendimiento
+        self.tab_rendimiento = tk.Frame(self.notebook, bg=COLOR_PANEL)
+        self.notebook.add(self.tab_rendimiento, text=" Rendimiento")
+        
         self.setup_tab_usuarios()
         self.setup_tab_historial()
+        self.setup_tab_trafico()
+        self.setup_tab_presentes()
+        self.setup_tab_rendimiento()
     
     # ==================== TAB USUARIOS ====================
     
@@ -105,21 +171,38 @@ class VentanaAdmin:
             width=20
         ).pack(side="left", padx=10)
         
+        # Filtro por nombre
+        self.entry_filtro_usuarios = tk.Entry(
+            frame_botones,
+            font=("Arial", 12),
+            width=20
+        )
+        self.entry_filtro_usuarios.pack(side="right", padx=10)
+        self.entry_filtro_usuarios.bind("<Return>", lambda e: self.cargar_usuarios())
+        
+        tk.Label(
+            frame_botones,
+            text="Buscar:",
+            font=("Arial", 12),
+            bg=COLOR_PANEL,
+            fg=COLOR_TEXT
+        ).pack(side="right")
+        
         # Frame tabla
         frame_tabla = tk.Frame(self.tab_usuarios, bg=COLOR_PANEL)
         frame_tabla.pack(expand=True, fill="both", padx=20, pady=10)
         
         # Scrollbar
-        scrollbar = ttk.Scrollbar(frame_tabla)
-        scrollbar.pack(side="right", fill="y")
+        self.scrollbar_usuarios = ttk.Scrollbar(frame_tabla)
+        self.scrollbar_usuarios.pack(side="right", fill="y")
         
-        # Treeview
+        # Treeview (las páginas se cargan al acercarse al final del scroll)
         columns = ("ID", "Nombre", "Rostros", "Estado", "Fecha Registro")
         self.tree_usuarios = ttk.Treeview(
             frame_tabla,
             columns=columns,
             show="headings",
-            yscrollcommand=scrollbar.set,
+            yscrollcommand=self.scroll_usuarios,
             height=15
         )
         
@@ -137,7 +220,7 @@ class VentanaAdmin:
         self.tree_usuarios.column("Fecha Registro", width=150, anchor="center")
         
         self.tree_usuarios.pack(expand=True, fill="both")
-        scrollbar.config(command=self.tree_usuarios.yview)
+        self.scrollbar_usuarios.config(command=self.tree_usuarios.yview)
         
         # Botones de acción
         frame_acciones = tk.Frame(self.tab_usuarios, bg=COLOR_PANEL)
@@ -164,43 +247,55 @@ class VentanaAdmin:
         ).pack(side="left", padx=5)
     
     def cargar_usuarios(self):
-        """Carga la lista de usuarios"""
+        """Carga la lista de usuarios desde la primera página"""
         # Limpiar tabla
-        for item in self.tree_usuarios.get_children():
-            self.tree_usuarios.delete(item)
+        self.tree_usuarios.delete(*self.tree_usuarios.get_children())
+        self.usuarios_data = []
+        self.cursor_usuarios = None
         
-        # Obtener usuarios
-        usuarios = get_all_users()
-        self.usuarios_data = usuarios
+        self.cargar_pagina_usuarios(primera=True)
+    
+    def cargar_pagina_usuarios(self, primera=False):
+        """Añade la siguiente página de usuarios a la tabla"""
+        if self.cargando_usuarios or (not primera and self.cursor_usuarios is None):
+            return
+        self.cargando_usuarios = True
         
-        # Agregar a la tabla
-        for usuario in usuarios:
-            user_id, nombre, pin, active, created_at = usuario
-            
-            # Contar rostros manualmente desde la BD
-            import sqlite3
-            from config import DB_PATH
-            conn = sqlite3.connect(DB_PATH)
-            c = conn.cursor()
-            c.execute("SELECT COUNT(*) FROM faces WHERE user_id = ?", (user_id,))
-            num_rostros = c.fetchone()[0]
-            conn.close()
-            
-            estado = "Activo" if active else "Inactivo"
-            rostros_text = f"{num_rostros} rostros" if num_rostros else "Sin rostros"
-            
-            # CORREGIR MANEJO DE FECHA
-            if isinstance(created_at, str):
-                fecha = created_at[:10]  # Ya es string
-            else:
-                # Si es timestamp o None
-                fecha = str(created_at) if created_at else "N/A"
-            
-            self.tree_usuarios.insert(
-                "",
-                "end",
-                values=(user_id, nombre, rostros_text, estado, fecha)
+        try:
+            filtro = self.entry_filtro_usuarios.get().strip() or None
+            usuarios, self.cursor_usuarios = get_users_page(
+                after=self.cursor_usuarios,
+                name_filter=filtro
             )
+            self.usuarios_data.extend(usuarios)
+            
+            # Agregar a la tabla
+            for usuario in usuarios:
+                user_id, nombre, active, created_at, num_rostros = usuario
+                
+                estado = "Activo" if active else "Inactivo"
+                rostros_text = f"{num_rostros} rostros" if num_rostros else "Sin rostros"
+                
+                # CORREGIR MANEJO DE FECHA
+                if isinstance(created_at, str):
+                    fecha = created_at[:10]  # Ya es string
+                else:
+                    # Si es timestamp o None
+                    fecha = str(created_at) if created_at else "N/A"
+                
+                self.tree_usuarios.insert(
+                    "",
+                    "end",
+                    values=(user_id, nombre, rostros_text, estado, fecha)
+                )
+        finally:
+            self.cargando_usuarios = False
+    
+    def scroll_usuarios(self, first, last):
+        """Sincroniza el scrollbar y pide otra página cerca del final"""
+        self.scrollbar_usuarios.set(first, last)
+        if float(last) >= 0.9 and self.cursor_usuarios is not None:
+            self.window.after_idle(self.cargar_pagina_usuarios)
     
     def eliminar_usuario(self):
         """Elimina un usuario seleccionado"""
@@ -255,6 +350,10 @@ class VentanaAdmin:
         self.dialog_registro.configure(bg=COLOR_BG)
         self.dialog_registro.transient(self.window)
         self.dialog_registro.grab_set()
+        # al_terminar() no llama a pin_hasheado si el diálogo se cierra antes:
+        # el flag de guardado se libera al destruirlo
+        dialog = self.dialog_registro
+        dialog.bind("<Destroy>", lambda e: self.registro_destruido(e, dialog), add="+")
         
         # Variables del proceso
         self.nombre_usuario = None
@@ -345,8 +444,10 @@ class VentanaAdmin:
     
     def actualizar_video_registro(self):
         """Actualiza el video en tiempo real"""
+        t0 = self.telemetria_registro.inicio()
         if self.cap_registro and self.cap_registro.isOpened() and self.camara_registro_activa:
             ret, frame = self.cap_registro.read()
+            self.telemetria_registro.captura(ret, t0)
             if ret:
                 frame = cv2.flip(frame, 1)
                 
@@ -356,6 +457,7 @@ class VentanaAdmin:
                 cv2.putText(frame, "Centra tu rostro aqui", 
                            (w//4 + 10, h//4 - 10), 
                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                frame = self.telemetria_registro.dibujar(frame)
                 
                 frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
                 img = Image.fromarray(frame_rgb)
@@ -363,9 +465,13 @@ class VentanaAdmin:
                 
                 self.canvas_registro.create_image(0, 0, anchor="nw", image=img_tk)
                 self.canvas_registro.image = img_tk
+                self.telemetria_registro.render(t0)
         
         if hasattr(self, 'dialog_registro') and self.dialog_registro.winfo_exists() and self.camara_registro_activa:
             self.dialog_registro.after(30, self.actualizar_video_registro)
+            self.telemetria_registro.programar(30)
+        else:
+            self.telemetria_registro.detener()
     
     def mostrar_paso_rostros(self):
         """Muestra la interfaz de captura de rostros"""
@@ -485,9 +591,11 @@ class VentanaAdmin:
         
         embeddings_ok = 0
         
-        for frame in self.capturas_rostro:
+        # Todas las capturas a la vez: el planificador las agrupa en lotes
+        futuros = get_inference_scheduler().enviar_varios(self.capturas_rostro)
+        for futuro in futuros:
             try:
-                embedding = get_embedding_deepface(frame)
+                embedding = futuro.result()
                 self.embeddings_rostro.append(embedding)
                 embeddings_ok += 1
             except Exception as e:
@@ -590,10 +698,20 @@ class VentanaAdmin:
             messagebox.showerror("Error", "Los PINs no coinciden", parent=self.dialog_registro)
             return
         
-        # Encriptar PIN
-        pin_hash = bcrypt.hashpw(pin.encode(), bcrypt.gensalt()).decode()
+        if self.guardando_usuario:
+            return  # Ya se está guardando
+        self.guardando_usuario = True
         
+        # Encriptar PIN en el pool de credenciales (sin bloquear la ventana)
+        future = get_credential_service().hash_pin(pin)
+        al_terminar(self.dialog_registro, future, self.pin_hasheado)
+    
+    def pin_hasheado(self, future):
+        """Guarda el usuario cuando el hash del PIN está listo"""
+        self.guardando_usuario = False
         try:
+            pin_hash = future.result()
+            
             # Guardar usuario
             user_id = insert_user(self.nombre_usuario, pin_hash)
             
@@ -602,7 +720,7 @@ class VentanaAdmin:
                 insert_face(user_id, embedding)
             
             # Log
-            log_event(user_id, "granted", "Usuario registrado desde panel admin")
+            log_event(user_id, "registro", "Usuario registrado desde panel admin")
             
             messagebox.showinfo(
                 "Éxito",
@@ -624,6 +742,11 @@ class VentanaAdmin:
             self.cap_registro.release()
             self.cap_registro = None
     
+    def registro_destruido(self, evento, dialog):
+        """Libera el guardado pendiente cuando se destruye el diálogo de registro"""
+        if evento.widget is dialog:                                # <Destroy> llega también por cada hijo
+            self.guardando_usuario = False
+    
     def cerrar_registro(self):
         """Cierra el diálogo de registro"""
         self.cerrar_camara_registro()
@@ -640,7 +763,7 @@ class VentanaAdmin:
         
         tk.Label(
             frame_top,
-            text="Eventos recientes:",
+            text="Historial de eventos:",
             font=("Arial", 14, "bold"),
             bg=COLOR_PANEL,
             fg=COLOR_TEXT
@@ -656,6 +779,18 @@ class VentanaAdmin:
             width=15
         ).pack(side="right", padx=5)
         
+        # Historial en vivo: añade arriba los eventos nuevos
+        self.historial_en_vivo = tk.BooleanVar(value=True)
+        tk.Checkbutton(
+            frame_top,
+            text="En vivo",
+            variable=self.historial_en_vivo,
+            font=("Arial", 11),
+            bg=COLOR_PANEL,
+            fg=COLOR_TEXT,
+            selectcolor=COLOR_BG
+        ).pack(side="right", padx=5)
+        
         tk.Button(
             frame_top,
             text="Exportar CSV",
@@ -666,67 +801,214 @@ class VentanaAdmin:
             width=15
         ).pack(side="right", padx=5)
         
+        # Frame filtros
+        frame_filtros = tk.Frame(self.tab_historial, bg=COLOR_PANEL)
+        frame_filtros.pack(fill="x", padx=20)
+        
+        self.entry_busqueda = self._campo_filtro(frame_filtros, "Buscar:", 18)
+        self.entry_desde = self._campo_filtro(frame_filtros, "Desde:", 12)
+        self.entry_hasta = self._campo_filtro(frame_filtros, "Hasta:", 12)
+        self.entry_usuario_evento = self._campo_filtro(frame_filtros, "Usuario ID:", 6)
+        self.entry_dispositivo = self._campo_filtro(frame_filtros, "Dispositivo:", 14)
+        
+        tk.Label(
+            frame_filtros,
+            text="Resultado:",
+            font=("Arial", 11),
+            bg=COLOR_PANEL,
+            fg=COLOR_TEXT
+        ).pack(side="left", padx=(10, 2))
+        self.combo_resultado = ttk.Combobox(
+            frame_filtros,
+            values=list(FILTROS_RESULTADO),
+            state="readonly",
+            width=11
+        )
+        self.combo_resultado.current(0)
+        self.combo_resultado.pack(side="left")
+        self.combo_resultado.bind("<<ComboboxSelected>>", lambda e: self.cargar_eventos())
+        
+        tk.Button(
+            frame_filtros,
+            text="Filtrar",
+            font=("Arial", 11),
+            bg=COLOR_INFO,
+            fg="white",
+            command=self.cargar_eventos,
+            width=10
+        ).pack(side="left", padx=10)
+        
         # Frame tabla
         frame_tabla = tk.Frame(self.tab_historial, bg=COLOR_PANEL)
         frame_tabla.pack(expand=True, fill="both", padx=20, pady=10)
         
         # Scrollbar
-        scrollbar = ttk.Scrollbar(frame_tabla)
-        scrollbar.pack(side="right", fill="y")
+        self.scrollbar_eventos = ttk.Scrollbar(frame_tabla)
+        self.scrollbar_eventos.pack(side="right", fill="y")
         
-        # Treeview
-        columns = ("Fecha/Hora", "Usuario", "Resultado", "Notas")
+        # Treeview (las páginas se cargan al acercarse al final del scroll)
+        columns = ("Fecha/Hora", "Dispositivo", "Usuario", "Resultado", "Notas")
         self.tree_eventos = ttk.Treeview(
             frame_tabla,
             columns=columns,
             show="headings",
-            yscrollcommand=scrollbar.set,
+            yscrollcommand=self.scroll_eventos,
             height=20
         )
         
         self.tree_eventos.heading("Fecha/Hora", text="Fecha/Hora")
+        self.tree_eventos.heading("Dispositivo", text="Dispositivo")
         self.tree_eventos.heading("Usuario", text="Usuario")
         self.tree_eventos.heading("Resultado", text="Resultado")
         self.tree_eventos.heading("Notas", text="Notas")
         
         self.tree_eventos.column("Fecha/Hora", width=180)
+        self.tree_eventos.column("Dispositivo", width=140)
         self.tree_eventos.column("Usuario", width=200)
         self.tree_eventos.column("Resultado", width=120, anchor="center")
-        self.tree_eventos.column("Notas", width=400)
+        self.tree_eventos.column("Notas", width=360)
         
         self.tree_eventos.pack(expand=True, fill="both")
-        scrollbar.config(command=self.tree_eventos.yview)
+        self.scrollbar_eventos.config(command=self.tree_eventos.yview)
+    
+    def _campo_filtro(self, parent, texto, ancho):
+        """Crea una etiqueta con su Entry de filtro y devuelve el Entry"""
+        tk.Label(
+            parent,
+            text=texto,
+            font=("Arial", 11),
+            bg=COLOR_PANEL,
+            fg=COLOR_TEXT
+        ).pack(side="left", padx=(10, 2))
+        entry = tk.Entry(parent, font=("Arial", 11), width=ancho)
+        entry.pack(side="left")
+        entry.bind("<Return>", lambda e: self.cargar_eventos())
+        return entry
+    
+    def filtros_eventos(self):
+        """Filtros actuales del historial en el formato de query_events()"""
+        usuario = self.entry_usuario_evento.get().strip()
+        if usuario and not usuario.isdigit():
+            raise ValueError("El usuario debe ser un ID numérico")
+        hasta = self.entry_hasta.get().strip()
+        if len(hasta) == 10:
+            hasta += " 23:59:59"  # Día completo
+        return {
+            "desde": self.entry_desde.get().strip() or None,
+            "hasta": hasta or None,
+            "user_id": int(usuario) if usuario else None,
+            "device": self.entry_dispositivo.get().strip() or None,
+            "result": FILTROS_RESULTADO[self.combo_resultado.get()],
+        }
     
     def cargar_eventos(self):
-        """Carga el historial de eventos"""
+        """Carga el historial desde la primera página"""
         # Limpiar tabla
-        for item in self.tree_eventos.get_children():
-            self.tree_eventos.delete(item)
+        self.tree_eventos.delete(*self.tree_eventos.get_children())
+        self.cursor_eventos = None
         
-        # Obtener eventos
-        eventos = get_recent_events(100)
+        # Antes de la primera página, para no perder eventos intermedios
+        self.ultimo_id_evento = get_last_event_id()
+        self.cargar_pagina_eventos(primera=True)
+    
+    def cargar_pagina_eventos(self, primera=False):
+        """Añade la siguiente página de eventos a la tabla"""
+        if self.cargando_eventos or (not primera and self.cursor_eventos is None):
+            return
+        self.cargando_eventos = True
         
-        # Agregar a la tabla
-        for evento in eventos:
-            event_id, ts, device, user_id, result, note = evento
-            
-            # Obtener nombre de usuario
-            usuario_nombre = "Desconocido"
-            for user in self.usuarios_data:
-                if user[0] == user_id:
-                    usuario_nombre = user[1]
-                    break
-            
-            resultado = "Concedido" if result == "granted" else "Denegado"
+        try:
+            try:
+                filtros = self.filtros_eventos()
+            except ValueError as e:
+                messagebox.showwarning("Filtro", str(e))
+                return
+            texto = self.entry_busqueda.get().strip()
+            if texto:
+                # Búsqueda por texto: una página ordenada por relevancia
+                eventos = search_events(texto, **filtros)
+                self.cursor_eventos = None
+            else:
+                eventos, self.cursor_eventos = query_events(before=self.cursor_eventos, **filtros)
             
-            self.tree_eventos.insert(
-                "",
-                "end",
-                values=(ts, usuario_nombre, resultado, note or "")
-            )
+            # Agregar a la tabla
+            for evento in eventos:
+                self.insertar_evento(evento, "end")
+        finally:
+            self.cargando_eventos = False
+    
+    def insertar_evento(self, evento, posicion):
+        """Inserta una fila de evento (el iid es el id del evento)"""
+        event_id, ts, device, nombre, result, note = evento
+        if self.tree_eventos.exists(event_id):
+            return
+        self.tree_eventos.insert(
+            "",
+            posicion,
+            iid=event_id,
+            values=(ts, device or "", nombre or "Desconocido",
+                    self.texto_resultado(result), note or "")
+        )
+    
+    def actualizar_historial(self):
+        """Añade arriba los eventos nuevos desde la última consulta"""
+        self.job_historial = self.window.after(HISTORY_POLL_MS, self.actualizar_historial)
+        if not self.historial_en_vivo.get() or self.cargando_eventos:
+            return
+        if self.entry_busqueda.get().strip():
+            return  # Los resultados de búsqueda van por relevancia, no por fecha
+        try:
+            filtros = self.filtros_eventos()
+        except ValueError:
+            return
+        
+        tope = get_last_event_id()
+        if tope <= self.ultimo_id_evento:
+            return
+        nuevos = get_events_since(self.ultimo_id_evento, upto_id=tope, **filtros)
+        # Si se llegó al límite, el resto se recoge en la siguiente consulta
+        self.ultimo_id_evento = nuevos[-1][0] if len(nuevos) == HISTORY_MAX_ROWS else tope
+        
+        for evento in nuevos:
+            self.insertar_evento(evento, 0)
+        if nuevos:
+            self.recortar_historial()
+    
+    def recortar_historial(self):
+        """Limita las filas de la tabla a HISTORY_MAX_ROWS"""
+        filas = self.tree_eventos.get_children()
+        if len(filas) <= HISTORY_MAX_ROWS:
+            return
+        self.tree_eventos.delete(*filas[HISTORY_MAX_ROWS:])
+        # La paginación continúa desde la última fila conservada
+        ultima = filas[HISTORY_MAX_ROWS - 1]
+        self.cursor_eventos = (self.tree_eventos.set(ultima, "Fecha/Hora"), int(ultima))
+    
+    def scroll_eventos(self, first, last):
+        """Sincroniza el scrollbar y pide otra página cerca del final"""
+        self.scrollbar_eventos.set(first, last)
+        if float(last) >= 0.9 and self.cursor_eventos is not None:
+            self.window.after_idle(self.cargar_pagina_eventos)
+    
+    @staticmethod
+    def texto_resultado(result):
+        """Texto a mostrar para un valor de events.result"""
+        if result in RESULTADOS_PERMITIDOS:
+            return "Concedido"
+        if result in RESULTADOS_DENEGADOS:
+            return "Denegado"
+        if result == RESULTADO_SALIDA:
+            return "Salida"
+        return result or ""
     
     def exportar_csv(self):
-        """Exporta el historial a CSV"""
+        """Exporta a CSV todos los eventos que cumplen los filtros actuales"""
+        try:
+            filtros = self.filtros_eventos()
+        except ValueError as e:
+            messagebox.showwarning("Filtro", str(e))
+            return
+        
         archivo = filedialog.asksaveasfilename(
             defaultextension=".csv",
             filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
@@ -735,21 +1017,381 @@ class VentanaAdmin:
         
         if archivo:
             try:
-                import csv
-                eventos = get_recent_events(1000)
-                
-                with open(archivo, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.writer(f)
-                    writer.writerow(["Fecha/Hora", "Dispositivo", "Usuario ID", "Resultado", "Notas"])
-                    
-                    for evento in eventos:
-                        event_id, ts, device, user_id, result, note = evento
-                        writer.writerow([ts, device, user_id, result, note or ""])
-                
-                messagebox.showinfo("Éxito", f"Historial exportado a:\n{archivo}")
+                total = export_events_csv(archivo, **filtros)
+                messagebox.showinfo("Éxito", f"{total} eventos exportados a:\n{archivo}")
             except Exception as e:
                 messagebox.showerror("Error", f"Error al exportar: {e}")
     
+    # ==================== TAB TRÁFICO ====================
+    
+    def setup_tab_trafico(self):
+        """Configura la pestaña con el gráfico de tráfico"""
+        frame_top = tk.Frame(self.tab_trafico, bg=COLOR_PANEL)
+        frame_top.pack(pady=20, fill="x", padx=20)
+        
+        tk.Label(
+            frame_top,
+            text="Tráfico por franja:",
+            font=("Arial", 14, "bold"),
+            bg=COLOR_PANEL,
+            fg=COLOR_TEXT
+        ).pack(side="left")
+        
+        self.combo_ventana = ttk.Combobox(
+            frame_top,
+            values=list(VENTANAS_TRAFICO),
+            state="readonly",
+            width=16
+        )
+        self.combo_ventana.current(0)
+        self.combo_ventana.pack(side="left", padx=10)
+        self.combo_ventana.bind("<<ComboboxSelected>>", lambda e: self.cargar_trafico())
+        
+        tk.Label(
+            frame_top,
+            text="Puerta:",
+            font=("Arial", 11),
+            bg=COLOR_PANEL,
+            fg=COLOR_TEXT
+        ).pack(side="left", padx=(10, 2))
+        self.combo_puerta = ttk.Combobox(frame_top, state="readonly", width=16)
+        self.combo_puerta.pack(side="left")
+        self.combo_puerta.bind("<<ComboboxSelected>>", lambda e: self.cargar_trafico())
+        
+        tk.Button(
+            frame_top,
+            text="Actualizar",
+            font=("Arial", 11),
+            bg=COLOR_INFO,
+            fg="white",
+            command=self.cargar_trafico,
+            width=15
+        ).pack(side="right", padx=5)
+        
+        self.canvas_trafico = tk.Canvas(self.tab_trafico, bg=COLOR_BG, highlightthickness=0)
+        self.canvas_trafico.pack(expand=True, fill="both", padx=20, pady=(0, 20))
+        self.canvas_trafico.bind("<Configure>", lambda e: self.dibujar_trafico())
+        
+        self.datos_trafico = None
+        self.cargar_trafico()
+    
+    def cargar_trafico(self):
+        """Consulta las series de la ventana elegida y redibuja"""
+        puertas = ["Todas"] + get_event_devices()
+        self.combo_puerta["values"] = puertas
+        if self.combo_puerta.get() not in puertas:
+            self.combo_puerta.current(0)
+        
+        duracion, granularidad = VENTANAS_TRAFICO[self.combo_ventana.get()]
+        hasta = datetime.now(timezone.utc).replace(tzinfo=None)  # Los eventos se guardan en UTC
+        puerta = self.combo_puerta.get()
+        datos = get_event_series(
+            hasta - duracion,
+            hasta,
+            granularidad=granularidad,
+            device=None if puerta == "Todas" else puerta
+        )
+        
+        # Agrupar los valores de result en Concedido / Denegado / Salida / otros
+        series = {}
+        for result, valores in datos["series"].items():
+            clave = self.texto_resultado(result)
+            acumulada = series.setdefault(clave, [0] * len(valores))
+            for i, v in enumerate(valores):
+                acumulada[i] += v
+        self.datos_trafico = (datos["franjas"], series)
+        self.dibujar_trafico()
+    
+    def dibujar_trafico(self):
+        """Dibuja barras apiladas por franja en el canvas"""
+        canvas = self.canvas_trafico
+        canvas.delete("all")
+        if not self.datos_trafico:
+            return
+        franjas, series = self.datos_trafico
+        ancho, alto = canvas.winfo_width(), canvas.winfo_height()
+        margen_x, margen_y = 60, 40
+        if not franjas or ancho <= 2 * margen_x or alto <= 2 * margen_y:
+            return
+        
+        totales = [sum(s[i] for s in series.values()) for i in range(len(franjas))]
+        maximo = max(totales) or 1
+        area_w, area_h = ancho - 2 * margen_x, alto - 2 * margen_y
+        paso = area_w / len(franjas)
+        
+        # Ejes y escala
+        base = alto - margen_y
+        canvas.create_line(margen_x, base, ancho - margen_x, base, fill=COLOR_TEXT_SECONDARY)
+        canvas.create_line(margen_x, margen_y, margen_x, base, fill=COLOR_TEXT_SECONDARY)
+        for k in range(5):
+            valor = maximo * k / 4
+            y = base - area_h * k / 4
+            canvas.create_text(margen_x - 8, y, text=f"{valor:.0f}", anchor="e",
+                               fill=COLOR_TEXT_SECONDARY, font=("Arial", 9))
+        
+        # Barras apiladas
+        orden = sorted(series, key=lambda c: (c not in COLORES_RESULTADO, c))
+        for i in range(len(franjas)):
+            x0 = margen_x + i * paso + paso * 0.1
+            x1 = margen_x + (i + 1) * paso - paso * 0.1
+            y = base
+            for clave in orden:
+                v = series[clave][i]
+                if not v:
+                    continue
+                alto_barra = area_h * v / maximo
+                canvas.create_rectangle(x0, y - alto_barra, x1, y, width=0,
+                                        fill=COLORES_RESULTADO.get(clave, COLOR_WARNING))
+                y -= alto_barra
+        
+        # Etiquetas del eje X (como mucho ~12)
+        cada = max(1, len(franjas) // 12)
+        for i in range(0, len(franjas), cada):
+            x = margen_x + (i + 0.5) * paso
+            etiqueta = franjas[i][5:16] if len(franjas[i]) > 10 else franjas[i][5:]
+            canvas.create_text(x, base + 14, text=etiqueta, fill=COLOR_TEXT_SECONDARY,
+                               font=("Arial", 9))
+        
+        # Leyenda
+        x = margen_x
+        for clave in orden:
+            color = COLORES_RESULTADO.get(clave, COLOR_WARNING)
+            canvas.create_rectangle(x, 12, x + 12, 24, fill=color, width=0)
+            texto = f"{clave} ({sum(series[clave])})"
+            canvas.create_text(x + 18, 18, text=texto, anchor="w", fill=COLOR_TEXT,
+                               font=("Arial", 10))
+            x += 30 + 8 * len(texto)
+    
+    # ==================== TAB PRESENTES ====================
+    
+    def setup_tab_presentes(self):
+        """Configura la pestaña con las personas que están dentro"""
+        frame_top = tk.Frame(self.tab_presentes, bg=COLOR_PANEL)
+        frame_top.pack(pady=20, fill="x", padx=20)
+        
+        self.label_presentes = tk.Label(
+            frame_top,
+            text="Dentro: 0",
+            font=("Arial", 14, "bold"),
+            bg=COLOR_PANEL,
+            fg=COLOR_TEXT
+        )
+        self.label_presentes.pack(side="left")
+        
+        tk.Button(
+            frame_top,
+            text="Reconstruir",
+            font=("Arial", 11),
+            bg=COLOR_WARNING,
+            fg="white",
+            command=self.reconstruir_presentes,
+            width=15
+        ).pack(side="right", padx=5)
+        
+        tk.Button(
+            frame_top,
+            text="Marcar salida",
+            font=("Arial", 11),
+            bg=COLOR_ERROR,
+            fg="white",
+            command=self.marcar_salida,
+            width=15
+        ).pack(side="right", padx=5)
+        
+        tk.Button(
+            frame_top,
+            text="Actualizar",
+            font=("Arial", 11),
+            bg=COLOR_INFO,
+            fg="white",
+            command=self.cargar_presentes,
+            width=15
+        ).pack(side="right", padx=5)
+        
+        frame_tabla = tk.Frame(self.tab_presentes, bg=COLOR_PANEL)
+        frame_tabla.pack(expand=True, fill="both", padx=20, pady=(0, 20))
+        
+        scrollbar = ttk.Scrollbar(frame_tabla)
+        scrollbar.pack(side="right", fill="y")
+        
+        columns = ("ID", "Usuario", "Dentro desde", "Puerta")
+        self.tree_presentes = ttk.Treeview(
+            frame_tabla,
+            columns=columns,
+            show="headings",
+            yscrollcommand=scrollbar.set,
+            height=20
+        )
+        for col in columns:
+            self.tree_presentes.heading(col, text=col)
+        self.tree_presentes.column("ID", width=60, anchor="center")
+        self.tree_presentes.column("Usuario", width=260)
+        self.tree_presentes.column("Dentro desde", width=180)
+        self.tree_presentes.column("Puerta", width=160)
+        self.tree_presentes.pack(expand=True, fill="both")
+        scrollbar.config(command=self.tree_presentes.yview)
+        
+        # Al abrir la pestaña se muestra el estado actual
+        self.notebook.bind("<<NotebookTabChanged>>", self.pestana_cambiada)
+        self.cargar_presentes()
+    
+    def pestana_cambiada(self, event=None):
+        """Refresca presentes y latencias al seleccionar su pestaña"""
+        if self.notebook.select() == str(self.tab_presentes):
+            self.cargar_presentes()
+        elif self.notebook.select() == str(self.tab_rendimiento):
+            self.cargar_rendimiento()
+    
+    def cargar_presentes(self):
+        """Lista las personas dentro (tabla presence, sin recorrer eventos)"""
+        self.tree_presentes.delete(*self.tree_presentes.get_children())
+        ocupantes = get_occupants()
+        for user_id, nombre, desde, puerta in ocupantes:
+            self.tree_presentes.insert(
+                "", "end", iid=str(user_id),
+                values=(user_id, nombre or "Desconocido", desde, puerta or "")
+            )
+        self.label_presentes.config(text=f"Dentro: {len(ocupantes)}")
+    
+    def marcar_salida(self):
+        """Registra la salida de las personas seleccionadas"""
+        seleccion = self.tree_presentes.selection()
+        if not seleccion:
+            messagebox.showwarning("Advertencia", "Selecciona una persona", parent=self.window)
+            return
+        if not messagebox.askyesno(
+            "Confirmar",
+            f"¿Registrar la salida de {len(seleccion)} persona(s)?",
+            parent=self.window
+        ):
+            return
+        for iid in seleccion:
+            log_event(int(iid), RESULTADO_SALIDA, "Salida registrada desde panel admin")
+        # Con el escritor asíncrono la salida se confirma en el siguiente lote
+        self.window.after(int(EVENT_FLUSH_INTERVAL * 1000) + 100, self.cargar_presentes)
+    
+    def reconstruir_presentes(self):
+        """Recalcula la tabla de presencia desde el historial de eventos"""
+        if not messagebox.askyesno(
+            "Confirmar",
+            "¿Recalcular quién está dentro a partir del historial?\n\n"
+            "Puede tardar con historiales muy grandes.",
+            parent=self.window
+        ):
+            return
+        total = rebuild_presence()
+        self.cargar_presentes()
+        messagebox.showinfo("Presentes", f"Personas dentro: {total}", parent=self.window)
+    
+    # ==================== TAB RENDIMIENTO ====================
+    
+    def setup_tab_rendimiento(self):
+        """Configura la pestaña con los percentiles de latencia por etapa"""
+        frame_top = tk.Frame(self.tab_rendimiento, bg=COLOR_PANEL)
+        frame_top.pack(pady=20, fill="x", padx=20)
+        
+        tk.Label(
+            frame_top,
+            text="Latencia por etapa:",
+            font=("Arial", 14, "bold"),
+            bg=COLOR_PANEL,
+            fg=COLOR_TEXT
+        ).pack(side="left")
+        
+        self.combo_fuente = ttk.Combobox(
+            frame_top,
+            values=list(FUENTES_LATENCIA),
+            state="readonly",
+            width=24
+        )
+        self.combo_fuente.current(0)
+        self.combo_fuente.pack(side="left", padx=10)
+        self.combo_fuente.bind("<<ComboboxSelected>>", lambda e: self.cargar_rendimiento())
+        
+        tk.Button(
+            frame_top,
+            text="Reiniciar",
+            font=("Arial", 11),
+            bg=COLOR_WARNING,
+            fg="white",
+            command=self.reiniciar_rendimiento,
+            width=15
+        ).pack(side="right", padx=5)
+        
+        tk.Button(
+            frame_top,
+            text="Actualizar",
+            font=("Arial", 11),
+            bg=COLOR_INFO,
+            fg="white",
+            command=self.cargar_rendimiento,
+            width=15
+        ).pack(side="right", padx=5)
+        
+        self.label_rendimiento = tk.Label(
+            self.tab_rendimiento,
+            text="",
+            font=("Arial", 10),
+            bg=COLOR_PANEL,
+            fg=COLOR_TEXT
+        )
+        self.label_rendimiento.pack(padx=20, anchor="w")
+        
+        frame_tabla = tk.Frame(self.tab_rendimiento, bg=COLOR_PANEL)
+        frame_tabla.pack(expand=True, fill="both", padx=20, pady=(5, 20))
+        
+        scrollbar = ttk.Scrollbar(frame_tabla)
+        scrollbar.pack(side="right", fill="y")
+        
+        columns = ("Etapa", "N", "Media (ms)", "p50 (ms)", "p95 (ms)", "p99 (ms)", "Máx (ms)")
+        self.tree_rendimiento = ttk.Treeview(
+            frame_tabla,
+            columns=columns,
+            show="headings",
+            yscrollcommand=scrollbar.set,
+            height=20
+        )
+        for col in columns:
+            self.tree_rendimiento.heading(col, text=col)
+            self.tree_rendimiento.column(col, width=100, anchor="e")
+        self.tree_rendimiento.column("Etapa", width=280, anchor="w")
+        self.tree_rendimiento.pack(expand=True, fill="both")
+        scrollbar.config(command=self.tree_rendimiento.yview)
+        
+        self.cargar_rendimiento()
+    
+    def cargar_rendimiento(self):
+        """Muestra p50/p95/p99 de los histogramas o de la tabla traces"""
+        self.tree_rendimiento.delete(*self.tree_rendimiento.get_children())
+        horas = FUENTES_LATENCIA[self.combo_fuente.get()]
+        if not TRACING_ENABLED:
+            self.label_rendimiento.config(
+                text="Trazas desactivadas: activa TRACING_ENABLED en config.py y reinicia"
+            )
+        elif horas is not None and not TRACE_PERSIST:
+            self.label_rendimiento.config(
+                text="No se guardan trazas por intento: activa TRACE_PERSIST en config.py"
+            )
+        else:
+            self.label_rendimiento.config(text="")
+        
+        if horas is None:
+            filas = tracing.informe()
+        else:
+            desde = datetime.now(timezone.utc) - timedelta(hours=horas)
+            filas = tracing.informe_trazas(desde=desde.strftime("%Y-%m-%d %H:%M:%S"))
+        for nombre, r in filas.items():
+            self.tree_rendimiento.insert(
+                "", "end",
+                values=(nombre, r["n"], f"{r['media_ms']:.1f}", f"{r['p50_ms']:.1f}",
+                        f"{r['p95_ms']:.1f}", f"{r['p99_ms']:.1f}", f"{r['max_ms']:.1f}")
+            )
+    
+    def reiniciar_rendimiento(self):
+        """Vacía los histogramas en memoria de este proceso"""
+        tracing.reiniciar()
+        self.cargar_rendimiento()
+    
     def cerrar(self):
         """Cierra la ventana de administración"""
         # Asegurar que se cierra la cámara de registro si está abierta
@@ -759,6 +1401,11 @@ class VentanaAdmin:
         if hasattr(self, 'dialog_registro') and self.dialog_registro.winfo_exists():
             self.dialog_registro.destroy()
         
+        # Parar el historial en vivo
+        if self.job_historial:
+            self.window.after_cancel(self.job_historial)
+            self.job_historial = None
+        
         # Cerrar ventana principal
         if self.window:
             self.window.destroy()
\ No newline at end of file
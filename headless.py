@@ -0,0 +1,124 @@
+# headless.py
+# --------------------------------------------
+# Punto de entrada sin interfaz gráfica (puertas sin pantalla)
+# --------------------------------------------
+# Uso:
+#   python headless.py                          # PIN por stdin
+#   python headless.py --keypad /dev/ttyACM0    # PIN desde keypad
+#   python headless.py --multi                  # Todas las puertas de config.DOORS
+#   python headless.py --galeria-compartida     # Galería del publicador (python -m core.gallery_shm)
+#
+# Pensado para ejecutarse bajo un supervisor de procesos (systemd,
+# supervisord...): termina limpiamente con SIGTERM.
+
+import argparse
+import signal
+import threading
+
+import cv2
+
+from config import CAMERA_ID, CAMERA_WIDTH, CAMERA_HEIGHT, DEVICE_NAME
+from core import (
+    ensure_schema,
+    iniciar_event_writer,
+    detener_event_writer,
+    cerrar_conexiones,
+    aplicar_retencion,
+)
+from core.headless import (
+    HeadlessController,
+    StdinPinSource,
+    KeypadPinSource,
+    ConsoleDoorActuator,
+)
+from core.multi_door import MultiDoorRuntime
+from core.gallery_shm import SharedGalleryReader
+
+
+def parse_args():
+    """Argumentos de línea de comandos"""
+    parser = argparse.ArgumentParser(description="Controlador de puerta sin GUI")
+    parser.add_argument("--camera", type=int, default=CAMERA_ID, help="ID de la cámara")
+    parser.add_argument("--device", default=DEVICE_NAME, help="Nombre de la puerta en los eventos")
+    parser.add_argument("--multi", action="store_true", help="Servir todas las puertas de config.DOORS")
+    parser.add_argument("--keypad", default=None, help="Dispositivo del keypad (por defecto stdin)")
+    parser.add_argument("--intentos", type=int, default=None, help="Número máximo de intentos")
+    parser.add_argument("--galeria-compartida", action="store_true",
+                        help="Leer la galería de la memoria compartida del publicador")
+    return parser.parse_args()
+
+
+def galeria(args):
+    """Galería compartida si se pide y hay publicador; None = caché local"""
+    if not args.galeria_compartida:
+        return None
+    try:
+        return SharedGalleryReader()
+    except FileNotFoundError:
+        print("⚠️  No hay publicador de galería en marcha; se usa la caché local")
+        return None
+    except ValueError as e:
+        print(f"⚠️  {e}; se usa la caché local")
+        return None
+
+
+def main_multi(args):
+    """Varias puertas en un único proceso"""
+    compartida = galeria(args)
+    runtime = MultiDoorRuntime(gallery=compartida)
+    signal.signal(signal.SIGTERM, lambda signum, frame: runtime.detener())
+
+    try:
+        runtime.iniciar(max_intentos=args.intentos)
+        runtime.esperar()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        runtime.cerrar()
+        if compartida:
+            compartida.cerrar()
+
+
+def main():
+    """Función principal"""
+    args = parse_args()
+    ensure_schema()
+    iniciar_event_writer()
+    threading.Thread(target=aplicar_retencion, daemon=True).start()
+
+    try:
+        if args.multi:
+            main_multi(args)
+        else:
+            main_single(args)
+    finally:
+        detener_event_writer()
+        cerrar_conexiones()
+
+
+def main_single(args):
+    """Una sola puerta"""
+    cap = cv2.VideoCapture(args.camera)
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_WIDTH)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_HEIGHT)
+
+    pin_source = KeypadPinSource(args.keypad) if args.keypad else StdinPinSource()
+    compartida = galeria(args)
+    controller = HeadlessController(cap, pin_source, ConsoleDoorActuator(),
+                                    device=args.device, gallery=compartida)
+
+    # Parada limpia bajo supervisor
+    signal.signal(signal.SIGTERM, lambda signum, frame: controller.detener())
+
+    try:
+        controller.ejecutar(max_intentos=args.intentos)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        controller.cerrar()
+        if compartida:
+            compartida.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,9 @@
 # --------------------------------------------
 
 import tkinter as tk
+import threading
 from gui.access_window import VentanaAcceso
-from core import ensure_schema
+from core import ensure_schema, iniciar_event_writer, aplicar_retencion, iniciar_exportador_metricas
 
 
 def main():
@@ -13,6 +14,15 @@ def main():
     # Asegurar que la BD existe con el esquema correcto
     ensure_schema()
     
+    # Los eventos se escriben en segundo plano por lotes
+    iniciar_event_writer()
+    
+    # Archivar eventos antiguos sin retrasar el arranque
+    threading.Thread(target=aplicar_retencion, daemon=True).start()
+    
+    # Métricas de vídeo en formato Prometheus (si hay fichero o puerto configurado)
+    iniciar_exportador_metricas()
+    
     # Crear ventana principal
     root = tk.Tk()
     app = VentanaAcceso(root)
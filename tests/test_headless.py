@@ -0,0 +1,123 @@
+# tests/test_headless.py
+# --------------------------------------------
+# Controlador sin pantalla con cámara, PIN y actuador simulados
+# --------------------------------------------
+#   python -m unittest discover -s tests
+
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+from core import ensure_schema, insert_user, insert_face, hash_pin_sync, cerrar_conexiones
+from core.db_connection import configurar_ruta, get_connection
+from core.headless import HeadlessController, StubDoorActuator, DoorActuator
+
+PIN = "1234"
+
+
+class CamaraFalsa:
+    """cv2.VideoCapture que devuelve frames con ruido (hay 'movimiento')"""
+
+    def __init__(self):
+        self.rng = np.random.default_rng(0)
+        self.liberada = False
+
+    def read(self):
+        return True, self.rng.integers(0, 255, (48, 64, 3), dtype=np.uint8)
+
+    def release(self):
+        self.liberada = True
+
+
+class ManosFalsas:
+    """MediaPipe Hands que siempre ve una mano"""
+
+    def process(self, imagen):
+        return SimpleNamespace(multi_hand_landmarks=[SimpleNamespace(landmark=[])])
+
+    def close(self):
+        pass
+
+
+class PinsFijos:
+    """Fuente de PIN que devuelve los PINs dados en orden"""
+
+    def __init__(self, pines):
+        self.pines = list(pines)
+        self.pedidos = []
+
+    def leer_pin(self, nombre):
+        self.pedidos.append(nombre)
+        return self.pines.pop(0)
+
+
+class TestHeadlessController(unittest.TestCase):
+
+    def setUp(self):
+        self.carpeta = tempfile.mkdtemp(prefix="test_headless_")
+        configurar_ruta(os.path.join(self.carpeta, "acceso.db"))
+        ensure_schema()
+        self.embedding = [1.0] * 512
+        self.user_id = insert_user("Ana Pérez", hash_pin_sync(PIN))
+        insert_face(self.user_id, self.embedding)
+
+    def tearDown(self):
+        cerrar_conexiones()
+        configurar_ruta(None)
+        shutil.rmtree(self.carpeta, ignore_errors=True)
+
+    def controlador(self, pines):
+        actuador = StubDoorActuator()
+        controller = HeadlessController(
+            CamaraFalsa(), PinsFijos(pines), actuador, device="puerta-test",
+            embed_fn=lambda frame: self.embedding, frames_necesarios=1
+        )
+        controller.pipeline.hands = ManosFalsas()
+        controller.pipeline.detector.verificar_gesto = lambda gesto, landmarks: True
+        self.addCleanup(controller.cerrar)
+        return controller, actuador
+
+    def eventos(self):
+        return get_connection().execute(
+            "SELECT user_id, result, note, device FROM events ORDER BY id"
+        ).fetchall()
+
+    def test_acceso_permitido(self):
+        controller, actuador = self.controlador([PIN])
+        resultado = controller.verificar()
+
+        self.assertEqual(resultado["resultado"], "permitido")
+        self.assertEqual(actuador.aperturas, [(self.user_id, "Ana Pérez")])
+        self.assertEqual(actuador.denegaciones, [])
+        self.assertEqual(controller.pin_source.pedidos, ["Ana Pérez"])
+        eventos = self.eventos()
+        self.assertEqual(len(eventos), 1)
+        user_id, result, note, device = eventos[0]
+        self.assertEqual((user_id, result, device), (self.user_id, "Entrada Permitida", "puerta-test"))
+        self.assertTrue(note.startswith("Acceso Permitido: Ana Pérez"))
+
+    def test_pin_incorrecto(self):
+        controller, actuador = self.controlador(["9999"])
+        resultado = controller.verificar()
+
+        self.assertEqual(resultado["resultado"], "denegado")
+        self.assertEqual(actuador.aperturas, [])
+        self.assertEqual(actuador.denegaciones, ["PIN incorrecto"])
+        self.assertEqual(self.eventos(),
+                         [(self.user_id, "Entrada Denegada", "Pin Incorrecto", "puerta-test")])
+
+    def test_actuador_sin_abrir(self):
+        class SoloDisplay(DoorActuator):
+            def mostrar(self, texto):
+                pass
+
+        with self.assertRaises(TypeError):
+            SoloDisplay()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,5 +4,6 @@
 # --------------------------------------------
 
 from .admin_auth import verificar_admin, configurar_admin
+from .tk_async import al_terminar, drenar_cola
 
-__all__ = ['verificar_admin', 'configurar_admin']
\ No newline at end of file
+__all__ = ['verificar_admin', 'configurar_admin', 'al_terminar', 'drenar_cola']
\ No newline at end of file
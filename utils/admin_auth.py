@@ -5,11 +5,11 @@
 
 import tkinter as tk
 from tkinter import messagebox
-import bcrypt
 import os
 import json
 
 from config import COLOR_PANEL, COLOR_TEXT, COLOR_TEXT_SECONDARY, COLOR_SUCCESS, COLOR_ERROR
+from .tk_async import al_terminar
 
 ADMIN_CONFIG_FILE = "admin_config.json"
 
@@ -28,6 +28,15 @@ def guardar_config_admin(pin_hash):
         json.dump({"pin_hash": pin_hash}, f)
 
 
+def _credenciales():
+    """
+    Servicio de bcrypt. Se importa al usarlo: importar 'core' carga DeepFace
+    y 'utils' no debe depender de ello.
+    """
+    from core.credentials import get_credential_service
+    return get_credential_service()
+
+
 def configurar_admin(parent):
     """Primera configuración del PIN de admin"""
     dialog = tk.Toplevel(parent)
@@ -83,6 +92,9 @@ def configurar_admin(parent):
         pin = entry_pin.get()
         confirm = entry_confirm.get()
         
+        if str(btn_confirmar["state"]) == "disabled":
+            return  # Ya se está calculando el hash
+        
         if not pin or not pin.isdigit() or len(pin) != 4:
             messagebox.showerror("Error", "PIN debe ser 4 dígitos", parent=dialog)
             return
@@ -91,19 +103,30 @@ def configurar_admin(parent):
             messagebox.showerror("Error", "Los PINs no coinciden", parent=dialog)
             return
         
-        pin_hash = bcrypt.hashpw(pin.encode(), bcrypt.gensalt()).decode()
-        guardar_config_admin(pin_hash)
+        # bcrypt en el pool de credenciales (sin bloquear la ventana)
+        btn_confirmar.config(state="disabled")
+        al_terminar(dialog, _credenciales().hash_pin(pin), pin_hasheado)
+    
+    def pin_hasheado(future):
+        btn_confirmar.config(state="normal")
+        try:
+            pin_hash = future.result()
+            guardar_config_admin(pin_hash)
+        except Exception as e:
+            messagebox.showerror("Error", f"No se pudo guardar el PIN: {e}", parent=dialog)
+            return
         resultado["pin_hash"] = pin_hash
         dialog.destroy()
     
-    tk.Button(
+    btn_confirmar = tk.Button(
         dialog,
         text="Confirmar",
         command=confirmar,
         bg=COLOR_SUCCESS,
         fg="white",
         width=15
-    ).pack(pady=20)
+    )
+    btn_confirmar.pack(pady=20)
     
     entry_pin.bind("<Return>", lambda e: entry_confirm.focus())
     entry_confirm.bind("<Return>", lambda e: confirmar())
@@ -154,9 +177,18 @@ def verificar_admin(parent):
     entry_pin.focus()
     
     def verificar():
+        if str(btn_confirmar["state"]) == "disabled":
+            return  # Ya hay una comprobación en curso
         pin = entry_pin.get()
+        btn_confirmar.config(state="disabled")
         
-        if bcrypt.checkpw(pin.encode(), config["pin_hash"].encode()):
+        # bcrypt en el pool de credenciales; el hash se actualiza si cambió el coste
+        future = _credenciales().verificar(pin, config["pin_hash"], guardar_config_admin)
+        al_terminar(dialog, future, resultado_verificacion)
+    
+    def resultado_verificacion(future):
+        btn_confirmar.config(state="normal")
+        if future.result():
             resultado["autenticado"] = True
             dialog.destroy()
         else:
@@ -167,14 +199,15 @@ def verificar_admin(parent):
     frame_btns = tk.Frame(dialog, bg=COLOR_PANEL)
     frame_btns.pack(pady=20)
     
-    tk.Button(
+    btn_confirmar = tk.Button(
         frame_btns,
         text="Confirmar",
         command=verificar,
         bg=COLOR_SUCCESS,
         fg="white",
         width=10
-    ).pack(side="left", padx=5)
+    )
+    btn_confirmar.pack(side="left", padx=5)
     
     tk.Button(
         frame_btns,
@@ -0,0 +1,46 @@
+# utils/tk_async.py
+# --------------------------------------------
+# Esperar Futures y eventos de otros hilos desde Tkinter sin bloquear la ventana
+# --------------------------------------------
+
+import queue
+
+
+def al_terminar(widget, future, callback, intervalo_ms=20):
+    """
+    Llama a callback(future) en el hilo de Tk cuando el future termine,
+    comprobándolo con after() para que la ventana siga respondiendo.
+    Si el widget se destruye antes, el callback no se llama.
+    """
+    def comprobar():
+        if not widget.winfo_exists():
+            return
+        if future.done():
+            callback(future)
+        else:
+            widget.after(intervalo_ms, comprobar)
+    comprobar()
+
+
+def drenar_cola(widget, cola, manejador, intervalo_ms=30):
+    """
+    Entrega a manejador(evento), en el hilo de Tk, los eventos que otros
+    hilos dejan en 'cola' (queue.Queue). Se comprueba con after() mientras
+    el widget exista.
+    """
+    def vaciar():
+        if not widget.winfo_exists():
+            return
+        try:
+            while True:
+                try:
+                    evento = cola.get_nowait()
+                except queue.Empty:
+                    break
+                manejador(evento)
+        finally:
+            # Se reprograma al terminar: un manejador con diálogo modal no
+            # provoca que se procesen eventos dentro de otro
+            if widget.winfo_exists():
+                widget.after(intervalo_ms, vaciar)
+    vaciar()